@@ -5,9 +5,42 @@ from leapp.libraries.stdlib import api
 from leapp.models import DistributionSignedRPM, InstalledRPM, InstalledUnsignedRPM, ThirdPartyRPM
 from leapp.utils.deprecation import suppress_deprecation
 
+_KEY_ID_LABEL = 'Key ID '
+
+_KEY_ID_LENGTH = 16
+
+EXCEPTIONAL_PKG_NAMES = frozenset(('gpg-pubkey',))
+"""
+Names of packages that are always marked as signed, see :func:`is_exceptional`.
+"""
+
+
+def get_key_id(pgpsig):
+    """
+    Get the ID of the key used to sign the package from its pgpsig value
+
+    E.g. '199e2f91fd431d51' from 'RSA/SHA256, Tue 02 Aug 2022 03:12:43 PM CEST, Key ID 199e2f91fd431d51'.
+    When the whole fingerprint is printed instead, the key ID is its suffix.
+
+    :param pgpsig: The pgpsig value of the package, e.g. as stored in the RPM model
+    :type pgpsig: str
+    :return: The lowercase key ID or None if the package is not signed
+    :rtype: Optional[str]
+    """
+    idx = pgpsig.rfind(_KEY_ID_LABEL)
+    if idx == -1:
+        return None
+    return pgpsig[idx + len(_KEY_ID_LABEL):].strip()[-_KEY_ID_LENGTH:].lower()
+
 
 def is_distro_signed(pkg, distro_keys):
-    return any(key in pkg.pgpsig for key in distro_keys)
+    """
+    Check whether the package is signed by any of the given keys
+
+    :param distro_keys: set of IDs of the distribution keys
+    :type distro_keys: frozenset(str)
+    """
+    return get_key_id(pkg.pgpsig) in distro_keys
 
 
 def is_exceptional(pkg, allowlist):
@@ -26,16 +59,19 @@ def is_exceptional(pkg, allowlist):
 
     The allowlist is now used for any other package names that should be marked
     always as signed for the particular upgrade.
+
+    :param allowlist: set of additional package names
+    :type allowlist: frozenset(str)
     """
-    return pkg.name == 'gpg-pubkey' or pkg.name.startswith('katello-ca-consumer') or pkg.name in allowlist
+    return pkg.name in EXCEPTIONAL_PKG_NAMES or pkg.name in allowlist or pkg.name.startswith('katello-ca-consumer')
 
 
 @suppress_deprecation(InstalledUnsignedRPM)
 def process():
     distro = get_source_distro_id()
-    distro_keys = get_distribution_data(distro).get('keys', [])
+    distro_keys = frozenset(get_distribution_data(distro).get('keys', []))
     all_signed = get_env('LEAPP_DEVEL_RPMS_ALL_SIGNED', '0') == '1'
-    rhui_pkgs = rhui.get_all_known_rhui_pkgs_for_current_upg()
+    rhui_pkgs = frozenset(rhui.get_all_known_rhui_pkgs_for_current_upg())
 
     signed_pkgs = DistributionSignedRPM()
     unsigned_pkgs = InstalledUnsignedRPM()
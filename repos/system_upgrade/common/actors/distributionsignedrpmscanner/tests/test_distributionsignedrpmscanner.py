@@ -1,5 +1,7 @@
 import mock
+import pytest
 
+from leapp.libraries.actor import distributionsignedrpmscanner
 from leapp.libraries.common import rpms
 from leapp.libraries.common.config import mock_configs
 from leapp.models import (
@@ -31,6 +33,18 @@ class MockModel(Model):
     int_field = fields.Integer(default=42)
 
 
+@pytest.mark.parametrize('pgpsig, exp', [
+    ('RSA/SHA256, Mon 01 Jan 1970 00:00:00 AM -03, Key ID 199e2f91fd431d51', '199e2f91fd431d51'),
+    ('RSA/SHA256, Mon 01 Jan 1970 00:00:00 AM -03, Key ID 199E2F91FD431D51\n', '199e2f91fd431d51'),
+    ('EdDSA/SHA512, Mon 01 Jan 1970 00:00:00 AM -03, Key ID 567e347ad0044ade55ba8a5f199e2f91fd431d51',
+     '199e2f91fd431d51'),
+    ('SOME_OTHER_SIG_X', None),
+    ('(none)', None),
+])
+def test_get_key_id(pgpsig, exp):
+    assert distributionsignedrpmscanner.get_key_id(pgpsig) == exp
+
+
 def test_no_installed_rpms(current_actor_context):
     current_actor_context.run(config_model=mock_configs.CONFIG)
     assert current_actor_context.consume(DistributionSignedRPM)
@@ -1,5 +1,5 @@
 from leapp.actors import Actor
-from leapp.libraries.common.module import get_enabled_modules
+from leapp.libraries.common.module import get_enabled_modules, shared_dnf_base
 from leapp.models import EnabledModules, Module
 from leapp.tags import FactsPhaseTag, IPUWorkflowTag
 
@@ -15,5 +15,6 @@ class GetEnabledModules(Actor):
     tags = (IPUWorkflowTag, FactsPhaseTag)
 
     def process(self):
-        modules = [Module(name=m.getName(), stream=m.getStream()) for m in get_enabled_modules()]
+        with shared_dnf_base():
+            modules = [Module(name=m.getName(), stream=m.getStream()) for m in get_enabled_modules()]
         self.produce(EnabledModules(modules=modules))
@@ -1,5 +1,5 @@
 from leapp import reporting
-from leapp.libraries.common.gpg import is_nogpgcheck_set
+from leapp.libraries.common.gpg import get_gpg_keys_index, is_nogpgcheck_set
 from leapp.libraries.common.rpms import get_installed_rpms
 from leapp.libraries.stdlib import api
 from leapp.models import TrustedGpgKeys
@@ -114,7 +114,7 @@ def process():
         _report_cannot_check_keys(installed_fps)
         return
 
-    trusted_fps = [key.fingerprint for key in trusted_gpg_keys.items]
+    trusted_fps = get_gpg_keys_index(trusted_gpg_keys)
     unexpected_fps = []
     for fp, packager in installed_fps_tuple:
         if fp not in trusted_fps:
@@ -1,15 +1,23 @@
+import hashlib
 import json
 import os
 import re
 import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
-from six.moves import urllib
+from six.moves import http_client, urllib
 
 from leapp import reporting
 from leapp.exceptions import StopActorExecution, StopActorExecutionError
+from leapp.libraries.common import persistentcache
 from leapp.libraries.common.config.version import get_target_major_version
-from leapp.libraries.common.gpg import get_gpg_fp_from_file, get_path_to_gpg_certs, is_nogpgcheck_set
+from leapp.libraries.common.gpg import (
+    get_gpg_fp_from_file,
+    get_gpg_keys_index,
+    get_path_to_gpg_certs,
+    is_nogpgcheck_set
+)
 from leapp.libraries.stdlib import api
 from leapp.models import (
     DNFWorkaround,
@@ -22,6 +30,17 @@ from leapp.utils.deprecation import suppress_deprecation
 
 FMT_LIST_SEPARATOR = '\n    - '
 
+GPGKEY_DOWNLOAD_TIMEOUT = 30
+"""
+Timeout (in seconds) for blocking operations when downloading a gpgkey.
+"""
+
+_GPGKEY_DOWNLOAD_WORKERS = 8
+
+_GPGKEYS_CACHE_DIR_NAME = 'gpgkeys'
+_GPGKEYS_CACHE_INDEX_NAME = 'gpgkeys-index'
+_GPGKEYS_CACHE_INDEX_VERSION = 1
+
 
 def _expand_vars(path):
     """
@@ -269,6 +288,162 @@ def register_dnfworkaround():
     ))
 
 
+def _get_gpgkeys_cache_dir():
+    return os.path.join(persistentcache.PERSISTENT_CACHE_DIR, _GPGKEYS_CACHE_DIR_NAME)
+
+
+def _download_gpgkey(gpgkey_url, validators=None):
+    """
+    Download the gpgkey unless it has not been changed since the previous download
+
+    The previous download is identified by validators of the cached key - the ETag
+    and Last-Modified values returned by the server. When the server confirms
+    the cached key is still valid (304 Not Modified), nothing is downloaded.
+
+    :param gpgkey_url: The http(s) url of the gpgkey
+    :type gpgkey_url: str
+    :param validators: (etag, last_modified) of the cached key or None if the key is not cached
+    :type validators: Optional[tuple(Optional[str], Optional[str])]
+    :return: The content of the key (None if the cached key is still valid) and new validators
+    :rtype: tuple(Optional[bytes], tuple(Optional[str], Optional[str]))
+    :raises EnvironmentError: if the key cannot be downloaded (including urllib.error.URLError)
+    :raises http_client.HTTPException: if the server response is invalid
+    """
+    headers = {}
+    if validators:
+        etag, last_modified = validators
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+    request = urllib.request.Request(gpgkey_url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=GPGKEY_DOWNLOAD_TIMEOUT) as response:
+            info = response.info()
+            return response.read(), (info.get('ETag'), info.get('Last-Modified'))
+    except urllib.error.HTTPError as err:
+        if err.code == 304 and headers:
+            return None, validators
+        raise
+
+
+def _store_gpgkey(directory, data):
+    """
+    Store the gpgkey into the directory under the name given by the checksum of its content
+
+    :return: Path to the stored gpgkey
+    :raises EnvironmentError: if the key cannot be stored
+    """
+    path = os.path.join(directory, hashlib.sha256(data).hexdigest())
+    if not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.gpgkey.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_path, path)
+    except EnvironmentError:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def _remove_unreferenced_gpgkeys(cache_dir, index):
+    referenced = {entry['checksum'] for entry in index.values()}
+    try:
+        filenames = os.listdir(cache_dir)
+    except OSError:
+        return
+    for filename in filenames:
+        if filename not in referenced:
+            try:
+                os.unlink(os.path.join(cache_dir, filename))
+            except OSError as err:
+                api.current_logger().debug('Cannot remove the cached gpgkey {}: {}'.format(filename, err))
+
+
+def _get_remote_gpgkeys_fps(gpgkey_urls):
+    """
+    Download gpgkeys from the given http(s) urls and get their fingerprints
+
+    The keys are downloaded concurrently and stored in the content-addressed cache
+    inside the persistent cache directory, so keys that have not changed since
+    the previous leapp execution are not downloaded again - their validity is
+    checked by HTTP conditional requests. Keys of urls that are not given
+    are removed from the cache.
+
+    Download failures are logged as warnings.
+
+    :param gpgkey_urls: List of http(s) urls of gpgkeys
+    :type gpgkey_urls: list(str)
+    :return: Map of the gpgkey urls to lists of fingerprints; None for keys that failed to download
+    :rtype: dict(str, Optional[list(str)])
+    """
+    if not gpgkey_urls:
+        return {}
+
+    cache_dir = _get_gpgkeys_cache_dir()
+    cached_index = persistentcache.load(_GPGKEYS_CACHE_INDEX_NAME, _GPGKEYS_CACHE_INDEX_VERSION) or {}
+    # remove the index first, so it's not trusted anymore if anything goes wrong
+    persistentcache.remove(_GPGKEYS_CACHE_INDEX_NAME)
+
+    # only the keys referenced in this run are kept in the index (and in the cache)
+    index = {}
+    validators = {}
+    for gpgkey_url in gpgkey_urls:
+        entry = cached_index.get(gpgkey_url)
+        if not entry:
+            continue
+        checksum = persistentcache.get_file_checksum(os.path.join(cache_dir, entry['checksum']))
+        if checksum == entry['checksum']:
+            validators[gpgkey_url] = (entry['etag'], entry['last_modified'])
+            # keep the entry in case the download fails now
+            index[gpgkey_url] = entry
+
+    with ThreadPoolExecutor(max_workers=_GPGKEY_DOWNLOAD_WORKERS) as executor:
+        jobs = {
+            gpgkey_url: executor.submit(_download_gpgkey, gpgkey_url, validators.get(gpgkey_url))
+            for gpgkey_url in gpgkey_urls
+        }
+
+    result = {}
+    tmpdir = None
+    for gpgkey_url in gpgkey_urls:
+        try:
+            data, new_validators = jobs[gpgkey_url].result()
+        except (EnvironmentError, http_client.HTTPException) as err:
+            api.current_logger().warning(
+                'Failed to download the gpgkey {}: {}'.format(gpgkey_url, str(err)))
+            result[gpgkey_url] = None
+            continue
+
+        if data is None:
+            key_file = os.path.join(cache_dir, index[gpgkey_url]['checksum'])
+        else:
+            index.pop(gpgkey_url, None)
+            try:
+                key_file = _store_gpgkey(cache_dir, data)
+                index[gpgkey_url] = {
+                    'checksum': os.path.basename(key_file),
+                    'etag': new_validators[0],
+                    'last_modified': new_validators[1],
+                }
+            except EnvironmentError as err:
+                api.current_logger().debug('Cannot cache the gpgkey {}: {}'.format(gpgkey_url, err))
+                # delay creating temporary directory until we need it
+                tmpdir = tempfile.mkdtemp() if tmpdir is None else tmpdir
+                key_file = _store_gpgkey(tmpdir, data)
+        result[gpgkey_url] = get_gpg_fp_from_file(key_file)
+
+    if tmpdir:
+        # clean up temporary directory with downloaded gpg keys
+        shutil.rmtree(tmpdir)
+
+    if persistentcache.store(_GPGKEYS_CACHE_INDEX_NAME, _GPGKEYS_CACHE_INDEX_VERSION, index):
+        _remove_unreferenced_gpgkeys(cache_dir, index)
+    return result
+
+
 @suppress_deprecation(TMPTargetRepositoriesFacts)
 def process():
     """
@@ -297,9 +472,9 @@ def process():
     invalid_keys = list()
     repos_missing_keys = list()
 
-    pubkeys = [key.fingerprint for key in trusted_gpg_keys.items]
+    trusted_keys = get_gpg_keys_index(trusted_gpg_keys)
+    gpgkey_urls = []
     processed_gpgkey_urls = set()
-    tmpdir = None
     for repoid in used_target_repos:
         if repoid.repoid not in target_repo_id_to_repositories_facts_map:
             api.current_logger().warning('The target repository {} metadata not available'.format(repoid.repoid))
@@ -311,44 +486,35 @@ def process():
             repos_missing_keys.append(repo.repoid)
             continue
         for gpgkey_url in gpgkeys:
-            if gpgkey_url in processed_gpgkey_urls:
-                continue
-            processed_gpgkey_urls.add(gpgkey_url)
-
-            if gpgkey_url.startswith('file:///'):
-                key_file = _get_abs_file_path(target_userspace, gpgkey_url)
-            elif gpgkey_url.startswith('http://') or gpgkey_url.startswith('https://'):
-                # delay creating temporary directory until we need it
-                tmpdir = tempfile.mkdtemp() if tmpdir is None else tmpdir
-                # FIXME: what to do with dummy? it's fd, that should be closed also
-                dummy, tmp_file = tempfile.mkstemp(dir=tmpdir)
-                try:
-                    urllib.request.urlretrieve(gpgkey_url, tmp_file)
-                    key_file = tmp_file
-                except urllib.error.URLError as err:
-                    api.current_logger().warning(
-                        'Failed to download the gpgkey {}: {}'.format(gpgkey_url, str(err)))
-                    failed_download.append(gpgkey_url)
-                    continue
-            else:
-                unknown_protocol.append(gpgkey_url)
-                api.current_logger().error(
-                    'Skipping unknown protocol for gpgkey {}'.format(gpgkey_url))
-                continue
-            fps = get_gpg_fp_from_file(key_file)
-            if not fps:
-                invalid_keys.append(gpgkey_url)
-                api.current_logger().warning(
-                    'Cannot get any gpg key from the file: {}'.format(gpgkey_url)
-                )
+            if gpgkey_url not in processed_gpgkey_urls:
+                processed_gpgkey_urls.add(gpgkey_url)
+                gpgkey_urls.append(gpgkey_url)
+
+    remote_gpgkey_fps = _get_remote_gpgkeys_fps([
+        url for url in gpgkey_urls if url.startswith('http://') or url.startswith('https://')
+    ])
+    for gpgkey_url in gpgkey_urls:
+        if gpgkey_url.startswith('file:///'):
+            fps = get_gpg_fp_from_file(_get_abs_file_path(target_userspace, gpgkey_url))
+        elif gpgkey_url in remote_gpgkey_fps:
+            fps = remote_gpgkey_fps[gpgkey_url]
+            if fps is None:
+                failed_download.append(gpgkey_url)
                 continue
-            for fp in fps:
-                if fp not in pubkeys and gpgkey_url not in missing_keys:
-                    missing_keys.append(_get_abs_file_path(target_userspace, gpgkey_url))
-
-    if tmpdir:
-        # clean up temporary directory with downloaded gpg keys
-        shutil.rmtree(tmpdir)
+        else:
+            unknown_protocol.append(gpgkey_url)
+            api.current_logger().error(
+                'Skipping unknown protocol for gpgkey {}'.format(gpgkey_url))
+            continue
+        if not fps:
+            invalid_keys.append(gpgkey_url)
+            api.current_logger().warning(
+                'Cannot get any gpg key from the file: {}'.format(gpgkey_url)
+            )
+            continue
+        # the gpgkey urls are unique, so each of them is reported at most once
+        if any(fp not in trusted_keys for fp in fps):
+            missing_keys.append(_get_abs_file_path(target_userspace, gpgkey_url))
 
     # report
     if failed_download:
@@ -3,7 +3,9 @@ from six.moves.urllib.error import URLError
 
 from leapp import reporting
 from leapp.exceptions import StopActorExecution, StopActorExecutionError
+from leapp.libraries.actor import missinggpgkey
 from leapp.libraries.actor.missinggpgkey import process
+from leapp.libraries.common import persistentcache
 from leapp.libraries.common.gpg import get_pubkeys_from_rpms
 from leapp.libraries.common.testutils import create_report_mocked, CurrentActorMocked, logger_mocked, produce_mocked
 from leapp.libraries.stdlib import api
@@ -402,11 +404,11 @@ def get_test_tmptargetrepositoriesfacts_ftp():
     )
 
 
-def _urlretrive_mocked(url, filename=None, reporthook=None, data=None):
-    return filename
+def _download_gpgkey_mocked(gpgkey_url, validators=None):
+    return b'', (None, None)
 
 
-def test_perform_https_gpgkey(monkeypatch):
+def test_perform_https_gpgkey(monkeypatch, tmpdir):
     """
     Executes the "main" function with repositories providing keys over internet
 
@@ -419,7 +421,8 @@ def test_perform_https_gpgkey(monkeypatch):
     monkeypatch.setattr(api, 'current_logger', logger_mocked())
     monkeypatch.setattr(reporting, 'create_report', create_report_mocked())
     monkeypatch.setattr('leapp.libraries.common.gpg._gpg_show_keys', _gpg_show_keys_mocked)
-    monkeypatch.setattr('six.moves.urllib.request.urlretrieve', _urlretrive_mocked)
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(missinggpgkey, '_download_gpgkey', _download_gpgkey_mocked)
 
     process()
     assert api.produce.called == 1
@@ -429,11 +432,11 @@ def test_perform_https_gpgkey(monkeypatch):
     assert "https://example.com/rpm-gpg/key.gpg" in reporting.create_report.reports[0]['summary']
 
 
-def _urlretrive_mocked_urlerror(url, filename=None, reporthook=None, data=None):
+def _download_gpgkey_mocked_urlerror(gpgkey_url, validators=None):
     raise URLError('error')
 
 
-def test_perform_https_gpgkey_urlerror(monkeypatch):
+def test_perform_https_gpgkey_urlerror(monkeypatch, tmpdir):
     """
     Executes the "main" function with repositories providing keys over internet
 
@@ -446,7 +449,8 @@ def test_perform_https_gpgkey_urlerror(monkeypatch):
     monkeypatch.setattr(api, 'current_logger', logger_mocked())
     monkeypatch.setattr(reporting, 'create_report', create_report_mocked())
     monkeypatch.setattr('leapp.libraries.common.gpg._gpg_show_keys', _gpg_show_keys_mocked)
-    monkeypatch.setattr('six.moves.urllib.request.urlretrieve', _urlretrive_mocked_urlerror)
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(missinggpgkey, '_download_gpgkey', _download_gpgkey_mocked_urlerror)
 
     process()
     assert len(api.current_logger.warnmsg) == 1
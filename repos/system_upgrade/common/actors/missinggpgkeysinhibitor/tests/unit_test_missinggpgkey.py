@@ -2,12 +2,16 @@ import os
 import shutil
 import sys
 import tempfile
+import threading
 
 import distro
 import pytest
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 
+from leapp.libraries.actor import missinggpgkey
 from leapp.libraries.actor.missinggpgkey import _expand_vars, _get_abs_file_path, _get_repo_gpgkey_urls
-from leapp.libraries.common.testutils import CurrentActorMocked
+from leapp.libraries.common import persistentcache
+from leapp.libraries.common.testutils import CurrentActorMocked, logger_mocked
 from leapp.libraries.stdlib import api
 from leapp.models import InstalledRPM, RepositoryData, RPM, TargetUserSpaceInfo
 
@@ -70,3 +74,112 @@ def test_get_abs_file_path(monkeypatch, target_userspace, file_url, exists_in_co
     monkeypatch.setattr('os.path.exists', os_path_exists_mocked)
     path = _get_abs_file_path(target_userspace, file_url)
     assert path == exp
+
+
+CUR_DIR = os.path.dirname(os.path.abspath(__file__))
+CENTOS_GPG_DIR = os.path.join(CUR_DIR, '../../../files/distro/centos/rpm-gpg/9')
+
+
+class _GpgKeyServer:
+    """
+    Local HTTP server providing gpgkeys which supports conditional requests by ETag
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                content = server.keys.get(self.path)
+                etag = '"{}"'.format(hash(content))
+                if content is None:
+                    status = 404
+                elif self.headers.get('If-None-Match') == etag:
+                    status = 304
+                else:
+                    status = 200
+                server.requests.append((self.path, status))
+                self.send_response(status)
+                if status == 200:
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                if status == 200:
+                    self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = HTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+
+    def url(self, path):
+        return 'http://127.0.0.1:{}{}'.format(self.httpd.server_address[1], path)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+
+def _read_key(name):
+    with open(os.path.join(CENTOS_GPG_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def test_get_remote_gpgkeys_fps(monkeypatch, tmpdir):
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    cache_dir = os.path.join(str(tmpdir), 'gpgkeys')
+
+    with _GpgKeyServer() as server:
+        server.keys['/key.gpg'] = _read_key('RPM-GPG-KEY-centosofficial')
+        urls = [server.url('/key.gpg'), server.url('/missing.gpg')]
+
+        # the first run downloads the key into the cache
+        result = missinggpgkey._get_remote_gpgkeys_fps(urls)
+        assert result == {urls[0]: ['8483c65d'], urls[1]: None}
+        assert sorted(server.requests) == [('/key.gpg', 200), ('/missing.gpg', 404)]
+        assert len(os.listdir(cache_dir)) == 1
+        assert len(api.current_logger.warnmsg) == 1
+        assert 'Failed to download the gpgkey {}'.format(urls[1]) in api.current_logger.warnmsg[0]
+
+        # the key is unchanged - the cached one is used
+        del server.requests[:]
+        result = missinggpgkey._get_remote_gpgkeys_fps(urls[:1])
+        assert result == {urls[0]: ['8483c65d']}
+        assert server.requests == [('/key.gpg', 304)]
+
+        # the key has changed - it's downloaded again and the outdated one is removed
+        del server.requests[:]
+        server.keys['/key.gpg'] = _read_key('RPM-GPG-KEY-CentOS-SIG-Extras')
+        result = missinggpgkey._get_remote_gpgkeys_fps(urls[:1])
+        assert result == {urls[0]: ['1d997668']}
+        assert server.requests == [('/key.gpg', 200)]
+        assert len(os.listdir(cache_dir)) == 1
+
+        # the cached key is damaged - it's downloaded unconditionally
+        del server.requests[:]
+        with open(os.path.join(cache_dir, os.listdir(cache_dir)[0]), 'wb') as f:
+            f.write(b'garbage')
+        result = missinggpgkey._get_remote_gpgkeys_fps(urls[:1])
+        assert result == {urls[0]: ['1d997668']}
+        assert server.requests == [('/key.gpg', 200)]
+
+        # keys that are not referenced anymore are removed from the cache
+        del server.requests[:]
+        server.keys['/other.gpg'] = _read_key('RPM-GPG-KEY-centosofficial')
+        other_url = server.url('/other.gpg')
+        result = missinggpgkey._get_remote_gpgkeys_fps([other_url])
+        assert result == {other_url: ['8483c65d']}
+        assert server.requests == [('/other.gpg', 200)]
+        assert len(os.listdir(cache_dir)) == 1
+        index = persistentcache.load(missinggpgkey._GPGKEYS_CACHE_INDEX_NAME,
+                                     missinggpgkey._GPGKEYS_CACHE_INDEX_VERSION)
+        assert list(index) == [other_url]
@@ -1,14 +1,15 @@
 import json
 import os
+import re
 from collections import defaultdict, namedtuple
 from enum import IntEnum
 from itertools import chain
 
 from leapp import reporting
 from leapp.exceptions import StopActorExecution
-from leapp.libraries.common import fetch
-from leapp.libraries.common.config import architecture
-from leapp.libraries.common.rpms import get_leapp_packages, LeappComponents
+from leapp.libraries.common import fetch, persistentcache
+from leapp.libraries.common.config import architecture, version
+from leapp.libraries.common.rpms import get_leapp_packages, get_leapp_repository_version, LeappComponents
 from leapp.libraries.stdlib import api
 
 # NOTE(mhecko): The modulestream field contains a set of modulestreams until the very end when we generate a Package
@@ -49,6 +50,17 @@ Event = namedtuple('Event', ['id',            # int
                              ])
 
 
+PES_EVENTS_CACHE_NAME = 'pes-events'
+"""
+Name of the persistent cache holding already parsed PES events relevant for the upgrade.
+"""
+
+_PES_EVENTS_CACHE_FORMAT = 2
+"""
+Version of the cached data layout, bump it whenever the layout or the parsing logic changes.
+"""
+
+
 class Action(IntEnum):
     PRESENT = 0
     REMOVED = 1
@@ -62,11 +74,24 @@ class Action(IntEnum):
 
 def get_pes_events(pes_json_directory, pes_json_filename):
     """
-    Get all the events from the source JSON file exported from PES.
+    Get the events relevant for this IPU from the source JSON file exported from PES.
+
+    The PES data are processed incrementally, entry by entry, and only entries matching the system
+    architecture with a release relevant for this IPU (see :func:`is_relevant_release`) are parsed.
+
+    Parsed events are stored in a persistent cache keyed by the checksum of the PES data file and
+    the version of leapp-repository, so next executions skip the parsing when nothing has changed.
 
     :return: List of Event tuples, where each event contains event type and input/output pkgs
     """
+    arch = api.current_actor().configuration.architecture
+    cache_key = _get_pes_events_cache_key(os.path.join(pes_json_directory, pes_json_filename), arch)
+    cached_events = _load_cached_pes_events(pes_json_filename, cache_key)
+    if cached_events is not None:
+        return cached_events
+
     try:
+        decoder = IncrementalPESDataDecoder(make_pes_entry_filter(arch))
         # NOTE(pstodulk): load_data_assert raises StopActorExecutionError, see
         # the code for more info. Keeping the handling on the framework in such
         # a case as we have no work to do in such a case here.
@@ -74,17 +99,22 @@ def get_pes_events(pes_json_directory, pes_json_filename):
                                             pes_json_filename,
                                             asset_fulltext_name='PES events file',
                                             docs_url='',
-                                            docs_title='')
+                                            docs_title='',
+                                            asset_decoder=decoder)
         if not events_data:
             return None
 
-        if not events_data.get('packageinfo'):
+        if not decoder.entries_count:
             raise ValueError('Found PES data with invalid structure')
 
-        all_events = list(chain(*[parse_entry(entry) for entry in events_data['packageinfo']]))
-        arch = api.current_actor().configuration.architecture
-        events_matching_arch = [e for e in all_events if not e.architectures or arch in e.architectures]
-        return events_matching_arch
+        api.current_logger().debug('Parsing {} out of {} PES entries relevant for the upgrade.'.format(
+            len(events_data['packageinfo']), decoder.entries_count))
+
+        events = list(chain(*[parse_entry(entry) for entry in events_data['packageinfo']]))
+        if cache_key:
+            provided_data_streams = events_data.get(fetch.ASSET_PROVIDED_DATA_STREAMS_FIELD)
+            _store_pes_events_cache(cache_key, provided_data_streams, events)
+        return events
     except (ValueError, KeyError):
         local_path = os.path.join(pes_json_directory, pes_json_filename)
         title = 'Missing/Invalid PES data file ({})'.format(local_path)
@@ -112,6 +142,187 @@ def get_pes_events(pes_json_directory, pes_json_filename):
         raise StopActorExecution()
 
 
+def is_relevant_release(release):
+    """
+    Check whether the given release happened between the source OS version and the target OS version.
+
+    :param release: A tuple representing a release in format (major, minor)
+    """
+    relevant_releases_match_list = [
+        '> {0}'.format(api.current_actor().configuration.version.source),
+        '<= {0}'.format(api.current_actor().configuration.version.target)
+    ]
+    return version.matches_version(relevant_releases_match_list, '{}.{}'.format(*release))
+
+
+def make_pes_entry_filter(arch):
+    """
+    Create a filter for raw PES entries, dropping entries that cannot produce events relevant for this IPU.
+
+    Only cheap checks on the raw entry data are performed, so the packages of irrelevant entries
+    are never parsed. Entries that are malformed are kept, so they are reported by :func:`parse_entry`.
+
+    :param str arch: Architecture of the system
+    :return: A function taking a raw PES entry, returning True if the entry should be parsed
+    """
+    release_relevance = {}
+
+    def is_relevant_entry(entry):
+        if not isinstance(entry, dict):
+            return True
+
+        architectures = entry.get('architectures') or []
+        if architectures and arch not in architectures:
+            return any(entry_arch not in architecture.ARCH_ACCEPTED for entry_arch in architectures)
+
+        release = parse_release(entry.get('release'))
+        if release not in release_relevance:
+            release_relevance[release] = is_relevant_release(release)
+        return release_relevance[release]
+
+    return is_relevant_entry
+
+
+class IncrementalPESDataDecoder:
+    """
+    Decoder of the PES data JSON keeping only relevant entries of the packageinfo array.
+
+    Contrary to json.loads, entries of the packageinfo array are decoded one by one and entries
+    rejected by the entry_filter are dropped immediately, so only the relevant entries are kept
+    in the memory. Other top-level fields are decoded as usual.
+    """
+
+    _WHITESPACE = re.compile(r'\s*')
+    _json_decoder = json.JSONDecoder()
+
+    def __init__(self, entry_filter):
+        self.entry_filter = entry_filter
+        # The total number of decoded packageinfo entries, including the dropped ones
+        self.entries_count = 0
+
+    def _skip_whitespace(self, json_data, idx):
+        return self._WHITESPACE.match(json_data, idx).end()
+
+    def _expect_one_of(self, json_data, idx, chars):
+        idx = self._skip_whitespace(json_data, idx)
+        char = json_data[idx:idx + 1]
+        if not char or char not in chars:
+            raise ValueError('Expected one of "{}" at position {} of the PES data'.format(chars, idx))
+        return char, idx + 1
+
+    def _decode_packageinfo(self, json_data, idx):
+        """Decode the packageinfo array starting at idx (after the opening bracket)."""
+        relevant_entries = []
+        idx = self._skip_whitespace(json_data, idx)
+        if json_data.startswith(']', idx):
+            return relevant_entries, idx + 1
+
+        while True:
+            entry, idx = self._json_decoder.raw_decode(json_data, self._skip_whitespace(json_data, idx))
+            self.entries_count += 1
+            if self.entry_filter(entry):
+                relevant_entries.append(entry)
+
+            char, idx = self._expect_one_of(json_data, idx, ',]')
+            if char == ']':
+                return relevant_entries, idx
+
+    def __call__(self, json_data):
+        idx = self._skip_whitespace(json_data, 0)
+        if not json_data.startswith('{', idx):
+            # Not an object, nothing to process incrementally
+            return json.loads(json_data)
+
+        decoded_data = {}
+        char, idx = self._expect_one_of(json_data, idx + 1, '"}')
+        while char != '}':
+            key, idx = self._json_decoder.raw_decode(json_data, idx - 1)
+            dummy_char, idx = self._expect_one_of(json_data, idx, ':')
+            idx = self._skip_whitespace(json_data, idx)
+            if key == 'packageinfo' and json_data.startswith('[', idx):
+                decoded_data[key], idx = self._decode_packageinfo(json_data, idx + 1)
+            else:
+                decoded_data[key], idx = self._json_decoder.raw_decode(json_data, idx)
+
+            char, idx = self._expect_one_of(json_data, idx, ',}')
+            if char == ',':
+                dummy_char, idx = self._expect_one_of(json_data, idx, '"')
+
+        if self._skip_whitespace(json_data, idx) != len(json_data):
+            raise ValueError('Extra data found after the PES data at position {}'.format(idx))
+        return decoded_data
+
+
+def _get_pes_events_cache_key(pes_json_path, arch):
+    """
+    Get the key identifying cached PES events or None when the events should not be cached.
+    """
+    checksum = persistentcache.get_file_checksum(pes_json_path)
+    if not checksum:
+        return None
+
+    leapp_repository_version = get_leapp_repository_version()
+    if not leapp_repository_version:
+        # E.g. running from the upstream sources, parsing logic could change without changing the version
+        api.current_logger().debug('Unknown version of leapp-repository, PES events will not be cached.')
+        return None
+
+    # Only events relevant for the upgrade path are cached
+    upgrade_path = (api.current_actor().configuration.version.source,
+                    api.current_actor().configuration.version.target)
+    return (_PES_EVENTS_CACHE_FORMAT, checksum, leapp_repository_version, arch, upgrade_path)
+
+
+def _serialize_pkgs(pkgs):
+    return tuple((pkg.name, pkg.repository, pkg.modulestream) for pkg in pkgs)
+
+
+def _deserialize_pkgs(serialized_pkgs):
+    return {Package(*pkg) for pkg in serialized_pkgs}
+
+
+def _store_pes_events_cache(cache_key, provided_data_streams, events):
+    serialized_events = tuple(
+        (event.id, int(event.action), _serialize_pkgs(event.in_pkgs), _serialize_pkgs(event.out_pkgs),
+         event.from_release, event.to_release, tuple(event.architectures))
+        for event in events
+    )
+    persistentcache.store(PES_EVENTS_CACHE_NAME, cache_key, (provided_data_streams, serialized_events))
+
+
+def _load_cached_pes_events(pes_json_filename, cache_key):
+    """
+    Load PES events from the persistent cache, producing ConsumedDataAsset as when the PES data file is loaded.
+
+    :return: List of Event tuples or None when there are no valid cached events
+    """
+    if not cache_key:
+        return None
+
+    cached_data = persistentcache.load(PES_EVENTS_CACHE_NAME, cache_key)
+    if cached_data is None:
+        return None
+
+    try:
+        provided_data_streams, serialized_events = cached_data
+        events = [
+            Event(event_id, Action(action), _deserialize_pkgs(in_pkgs), _deserialize_pkgs(out_pkgs),
+                  tuple(from_release), tuple(to_release), list(architectures))
+            for event_id, action, in_pkgs, out_pkgs, from_release, to_release, architectures in serialized_events
+        ]
+    except (TypeError, ValueError):
+        api.current_logger().warning('The cache of PES events is corrupted, parsing the PES data file instead.')
+        return None
+
+    api.current_logger().debug('Loaded {} PES events from the persistent cache.'.format(len(events)))
+    fetch.produce_consumed_data_asset(pes_json_filename,
+                                      asset_fulltext_name='PES events file',
+                                      docs_url='',
+                                      docs_title='',
+                                      provided_data_streams=provided_data_streams)
+    return events
+
+
 def generate_event_for_ms_mapping_entry(from_ms_to_ms_entry, event):
     from_modulestream, to_modulestreams = from_ms_to_ms_entry
 
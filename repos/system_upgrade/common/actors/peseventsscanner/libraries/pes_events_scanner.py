@@ -4,7 +4,7 @@ from functools import partial
 from leapp import reporting
 from leapp.exceptions import StopActorExecutionError
 from leapp.libraries.actor import peseventsscanner_repomap
-from leapp.libraries.actor.pes_event_parsing import Action, get_pes_events, Package
+from leapp.libraries.actor.pes_event_parsing import Action, get_pes_events, is_relevant_release, Package
 from leapp.libraries.common import rpms
 from leapp.libraries.common.config import get_target_distro_id, version
 from leapp.libraries.stdlib import api
@@ -34,6 +34,12 @@ SKIPPED_PKGS_MSG = (
 
 TransactionConfiguration = namedtuple('TransactionConfiguration', ('to_install', 'to_remove', 'to_keep'))
 
+ReleaseEvents = namedtuple('ReleaseEvents', ('events',                  # A list of events in their original order
+                                             'in_pkgs_index',           # A dict mapping Package to event positions
+                                             'events_without_in_pkgs',  # A list of positions of events without in_pkgs
+                                             'all_in_pkgs'              # A set of in_pkgs of all the events
+                                             ))
+
 
 def get_cloud_provider_name(cloud_provider_variant):
     for cloud_provider_prefix in ('aws', 'azure', 'google'):
@@ -103,14 +109,8 @@ def get_relevant_releases(events):
 
     Relevant release happened between the source OS version and the target OS version.
     """
-    # Collect releases that happened between source OS version and target OS version
-    relevant_releases_match_list = [
-        '> {0}'.format(api.current_actor().configuration.version.source),
-        '<= {0}'.format(api.current_actor().configuration.version.target)
-    ]
     releases = {event.to_release for event in events}
-    releases = [r for r in releases if version.matches_version(relevant_releases_match_list, '{}.{}'.format(*r))]
-    return sorted(releases)
+    return sorted(r for r in releases if is_relevant_release(r))
 
 
 def _get_enabled_modules():
@@ -125,18 +125,97 @@ def _get_enabled_modules():
     return enabled_modules_msg.modules
 
 
-def compute_pkg_changes_between_consequent_releases(source_installed_pkgs,
-                                                    events,
-                                                    release,
+def index_events_by_release(events):
+    """
+    Bucket the given events by their to_release and index them by their input packages.
+
+    The relative order of events within a release is preserved, as the events are applied sequentially.
+
+    :param events: Iterable of PES events
+    :return: A dictionary mapping a release to its ReleaseEvents
+    """
+    events_by_release = {}
+    for event in events:
+        release_events = events_by_release.get(event.to_release)
+        if release_events is None:
+            release_events = ReleaseEvents(events=[], in_pkgs_index=defaultdict(list),
+                                           events_without_in_pkgs=[], all_in_pkgs=set())
+            events_by_release[event.to_release] = release_events
+
+        position = len(release_events.events)
+        release_events.events.append(event)
+        if not event.in_pkgs:
+            release_events.events_without_in_pkgs.append(position)
+        for pkg in event.in_pkgs:
+            release_events.in_pkgs_index[pkg].append(position)
+        release_events.all_in_pkgs.update(event.in_pkgs)
+
+    return events_by_release
+
+
+def _get_candidate_event_positions(release_events, pkgs):
+    """
+    Get sorted positions of the release events that have at least one of their in_pkgs among the given pkgs.
+
+    Events without any in_pkgs are always candidates, as nothing prevents them from being applied.
+    """
+    in_pkgs_index = release_events.in_pkgs_index
+    positions = set(release_events.events_without_in_pkgs)
+
+    # Probe the smaller of the two collections, the lookup cost is the same in both directions
+    if len(pkgs) < len(in_pkgs_index):
+        for pkg in pkgs:
+            positions.update(in_pkgs_index.get(pkg, ()))
+    else:
+        for pkg, pkg_positions in in_pkgs_index.items():
+            if pkg in pkgs:
+                positions.update(pkg_positions)
+
+    return sorted(positions)
+
+
+def _is_event_applicable(event, source_installed_pkgs):
+    if event.action == Action.PRESENT:
+        # PRESENCE events are applied to packages that have been seen, candidate events satisfy this already
+        return True
+    if event.action == Action.DEPRECATED:
+        return not event.in_pkgs.isdisjoint(source_installed_pkgs)
+
+    # All other packages have the same semantics - they remove their in_pkgs from the system with given
+    # from_release and add out_pkgs to the system matching to_release
+    are_all_in_pkgs_present = all(in_pkg in source_installed_pkgs for in_pkg in event.in_pkgs)
+    is_any_in_pkg_present = any(in_pkg in source_installed_pkgs for in_pkg in event.in_pkgs)
+
+    # For MERGE to be relevant it is sufficient for only one of its in_pkgs to be installed
+    return are_all_in_pkgs_present or (event.action == Action.MERGED and is_any_in_pkg_present)
+
+
+def compute_pkg_changes_between_consequent_releases(target_pkgs,
+                                                    release_events,
                                                     seen_pkgs,
                                                     pkgs_to_demodularize):
+    """
+    Apply events of a single release, modifying target_pkgs and pkgs_to_demodularize in place.
+
+    Whether an event is applicable is decided according to the packages present at the beginning
+    of the release, so the outcome does not depend on mutations done by preceding events of the same release.
+
+    :param set target_pkgs: Packages present on the system before the release, updated to the state after it
+    :param ReleaseEvents release_events: Events of the release as created by index_events_by_release
+    :param set seen_pkgs: Packages seen (installed) during the course of the computation, superset of target_pkgs
+    :param set pkgs_to_demodularize: Packages to demodularize, packages touched by the release events are dropped
+    """
     logger = api.current_logger()
-    # Start with the installed packages and modify the set according to release events
-    target_pkgs = set(source_installed_pkgs)
 
-    release_events = [e for e in events if e.to_release == release]
+    # Only events with some in_pkgs among seen packages can be applied - PRESENCE events require their
+    # in_pkgs to be seen, other events require them to be present in target_pkgs (a subset of seen_pkgs).
+    applicable_events = []
+    for position in _get_candidate_event_positions(release_events, seen_pkgs):
+        event = release_events.events[position]
+        if _is_event_applicable(event, target_pkgs):
+            applicable_events.append(event)
 
-    for event in release_events:
+    for event in applicable_events:
         # PRESENCE events have a different semantics than the other events - they add a package to a target state
         # only if it had been seen (installed) during the course of the overall target packages
         if event.action == Action.PRESENT:
@@ -146,39 +225,28 @@ def compute_pkg_changes_between_consequent_releases(source_installed_pkgs,
                     # repository. As the Package class has a custom __hash__ and __eq__ comparing only name
                     # and modulestream, the pkg.repository field is ignore and therefore the add() call
                     # does not update the entry.
-                    if pkg in target_pkgs:
-                        target_pkgs.remove(pkg)
+                    target_pkgs.discard(pkg)
                     target_pkgs.add(pkg)
         elif event.action == Action.DEPRECATED:
-            if event.in_pkgs.intersection(source_installed_pkgs):
-                # Remove packages with old repositories add packages with the new one
-                target_pkgs = target_pkgs.difference(event.in_pkgs)
-                target_pkgs = target_pkgs.union(event.in_pkgs)
+            # Remove packages with old repositories add packages with the new one
+            target_pkgs.difference_update(event.in_pkgs)
+            target_pkgs.update(event.in_pkgs)
         else:
-            # All other packages have the same semantics - they remove their in_pkgs from the system with given
-            # from_release and add out_pkgs to the system matching to_release
-            are_all_in_pkgs_present = all(in_pkg in source_installed_pkgs for in_pkg in event.in_pkgs)
-            is_any_in_pkg_present = any(in_pkg in source_installed_pkgs for in_pkg in event.in_pkgs)
-
-            # For MERGE to be relevant it is sufficient for only one of its in_pkgs to be installed
-            if are_all_in_pkgs_present or (event.action == Action.MERGED and is_any_in_pkg_present):
-                removed_pkgs = target_pkgs.intersection(event.in_pkgs)
-                removed_pkgs_str = ', '.join(str(pkg) for pkg in removed_pkgs) if removed_pkgs else '[]'
-                added_pkgs_str = ', '.join(str(pkg) for pkg in event.out_pkgs) if event.out_pkgs else '[]'
-                logger.debug('Applying event %d (%s): replacing packages %s with %s',
-                             event.id, event.action, removed_pkgs_str, added_pkgs_str)
-
-                # In pkgs are present, event can be applied
-                # Note: We do a .difference(event.out_packages) followed by an .union(event.out_packages) to overwrite
-                # #     repositories of the packages (Package has overwritten __hash__ and __eq__, ignoring
-                # #     the repository field)
-                target_pkgs = target_pkgs.difference(event.in_pkgs)
-                target_pkgs = target_pkgs.difference(event.out_pkgs)
-                target_pkgs = target_pkgs.union(event.out_pkgs)
+            removed_pkgs = target_pkgs.intersection(event.in_pkgs)
+            removed_pkgs_str = ', '.join(str(pkg) for pkg in removed_pkgs) if removed_pkgs else '[]'
+            added_pkgs_str = ', '.join(str(pkg) for pkg in event.out_pkgs) if event.out_pkgs else '[]'
+            logger.debug('Applying event %d (%s): replacing packages %s with %s',
+                         event.id, event.action, removed_pkgs_str, added_pkgs_str)
 
-        pkgs_to_demodularize = pkgs_to_demodularize.difference(event.in_pkgs)
+            # In pkgs are present, event can be applied
+            # Note: We do a .difference_update(event.out_packages) followed by an .update(event.out_packages) to
+            # #     overwrite repositories of the packages (Package has overwritten __hash__ and __eq__, ignoring
+            # #     the repository field)
+            target_pkgs.difference_update(event.in_pkgs)
+            target_pkgs.difference_update(event.out_pkgs)
+            target_pkgs.update(event.out_pkgs)
 
-    return (target_pkgs, pkgs_to_demodularize)
+    pkgs_to_demodularize.difference_update(release_events.all_in_pkgs)
 
 
 def remove_undesired_events(events, relevant_to_releases):
@@ -239,15 +307,19 @@ def compute_packages_on_target_system(source_pkgs, events, releases):
     did_processing_cross_major_version = False
     pkgs_to_demodularize = set()  # Modified by compute_pkg_changes
 
+    events_by_release = index_events_by_release(events)
+
     for release in releases:
         if not did_processing_cross_major_version and release[0] > source_major_version:
             did_processing_cross_major_version = True
             pkgs_to_demodularize = {pkg for pkg in target_pkgs if pkg.modulestream}
 
-        target_pkgs, pkgs_to_demodularize = compute_pkg_changes_between_consequent_releases(target_pkgs, events,
-                                                                                            release, seen_pkgs,
-                                                                                            pkgs_to_demodularize)
-        seen_pkgs = seen_pkgs.union(target_pkgs)
+        release_events = events_by_release.get(release)
+        if not release_events:
+            continue
+
+        compute_pkg_changes_between_consequent_releases(target_pkgs, release_events, seen_pkgs, pkgs_to_demodularize)
+        seen_pkgs.update(target_pkgs)
 
     demodularized_pkgs = {Package(pkg.name, pkg.repository, None) for pkg in pkgs_to_demodularize}
     demodularized_target_pkgs = target_pkgs.difference(pkgs_to_demodularize).union(demodularized_pkgs)
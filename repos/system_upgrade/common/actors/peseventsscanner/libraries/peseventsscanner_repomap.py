@@ -49,11 +49,26 @@ class RepoMapDataHandler:
         :param prio_channel: Prefer repositories with this channel when looking for target equivalents.
         :type prio_channel: str
         """
-        # NOTE: currently I am keeping this default data structure that is not
-        # ideal for work, but there is not any significant impact..
         self.repositories = repo_map.repositories
         self.mapping = repo_map.mapping
 
+        # Index the data for the lookups - the order of repositories in the indexes is kept the same
+        # as in the repositories list, so ties are resolved the same way as when iterating the list.
+        # {(repoid, major_version, distro): [PESIDRepositoryEntry]}
+        self._repos_by_repoid = {}
+        # {(pesid, major_version, distro): [PESIDRepositoryEntry]}
+        self._repos_by_pesid = {}
+        for pesid_repo in self.repositories:
+            self._repos_by_repoid.setdefault(
+                (pesid_repo.repoid, pesid_repo.major_version, pesid_repo.distro), []).append(pesid_repo)
+            self._repos_by_pesid.setdefault(
+                (pesid_repo.pesid, pesid_repo.major_version, pesid_repo.distro), []).append(pesid_repo)
+        # {source_pesid: sorted list of target pesids}
+        target_pesids = {}
+        for repomap in self.mapping:
+            target_pesids.setdefault(repomap.source, set()).update(repomap.target)
+        self._target_pesids = {source: sorted(targets) for source, targets in target_pesids.items()}
+
         self.source_distro = source_distro or get_source_distro_id()
         self.target_distro = target_distro or get_target_distro_id()
         # FIXME(pstodulk): what about default_channel -> fallback_channel
@@ -117,22 +132,15 @@ class RepoMapDataHandler:
                  entry could be found.
         :rtype: Optional[PESIDRepositoryEntry]
         """
-        matching_pesid_repos = []
-        for pesid_repo in self.repositories:
-            # FIXME(pstodulk): Why we do not check actually architecture here?
-            # It seems obvious we should check it, but it's not clear why we
-            # don't and investigation might be required.
-            # For the investigation:
-            # # check repoids matching various architectures
-            # # check repoids without $arch in substring on how many architectures they are present
-            # Investigate and: add a comment with an explanation or fix the
-            # condition.
-            if (
-                pesid_repo.repoid == repoid
-                and pesid_repo.major_version == major_version
-                and pesid_repo.distro == distro
-            ):
-                matching_pesid_repos.append(pesid_repo)
+        # FIXME(pstodulk): Why we do not check actually architecture here?
+        # It seems obvious we should check it, but it's not clear why we
+        # don't and investigation might be required.
+        # For the investigation:
+        # # check repoids matching various architectures
+        # # check repoids without $arch in substring on how many architectures they are present
+        # Investigate and: add a comment with an explanation or fix the
+        # condition.
+        matching_pesid_repos = self._repos_by_repoid.get((repoid, major_version, distro), [])
 
         # FIXME: when a PESID is present for multiple architectures, there
         # are multiple matching repos even though there should really be just
@@ -161,11 +169,7 @@ class RepoMapDataHandler:
         :return: The list of target PES IDs the provided source_pesid is mapped to.
         :rtype: List[PESIDRepositoryEntry]
         """
-        pesids = set()
-        for repomap in self.mapping:
-            if repomap.source == source_pesid:
-                pesids.update(repomap.target)
-        return sorted(pesids)
+        return list(self._target_pesids.get(source_pesid, []))
 
     def get_pesid_repos(self, pesid, major_version, distro):
         """
@@ -181,15 +185,7 @@ class RepoMapDataHandler:
         :return: A list of PESIDRepositoryEntries that match the provided PES ID, OS major version, and OS release ID.
         :rtype: List[PESIDRepositoryEntry]
         """
-        pesid_repos = []
-        for pesid_repo in self.repositories:
-            if (
-                pesid_repo.pesid == pesid
-                and pesid_repo.major_version == major_version
-                and pesid_repo.distro == distro
-            ):
-                pesid_repos.append(pesid_repo)
-        return pesid_repos
+        return list(self._repos_by_pesid.get((pesid, major_version, distro), []))
 
     def get_source_pesid_repos(self, pesid):
         """
@@ -1,3 +1,4 @@
+import json
 import os.path
 from collections import namedtuple
 
@@ -5,17 +6,20 @@ import pytest
 
 from leapp import reporting
 from leapp.exceptions import StopActorExecution
+from leapp.libraries.actor import pes_event_parsing
 from leapp.libraries.actor.pes_event_parsing import (
     Action,
     Event,
     get_pes_events,
+    IncrementalPESDataDecoder,
+    make_pes_entry_filter,
     Package,
     parse_entry,
     parse_packageset,
     parse_pes_events
 )
-from leapp.libraries.common import fetch
-from leapp.libraries.common.testutils import create_report_mocked, CurrentActorMocked
+from leapp.libraries.common import fetch, persistentcache
+from leapp.libraries.common.testutils import create_report_mocked, CurrentActorMocked, produce_mocked
 from leapp.libraries.stdlib import api
 from leapp.models import ConsumedDataAsset
 
@@ -168,3 +172,90 @@ def test_get_pes_events_invalid_data_reported(monkeypatch):
         get_pes_events("doesn't", "matter")
 
     assert created_reports.called
+
+
+def test_get_pes_events_uses_persistent_cache(monkeypatch, tmpdir):
+    pes_events_path = os.path.join(CUR_DIR, 'files/sample04.json')
+    with open(pes_events_path) as f:
+        json_data = f.read()
+
+    load_data_asset_calls = []
+
+    def load_data_asset_mocked(*args, **kwargs):
+        load_data_asset_calls.append(args)
+        return kwargs['asset_decoder'](json_data)
+
+    monkeypatch.setattr(fetch, 'load_data_asset', load_data_asset_mocked)
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(pes_event_parsing, 'get_leapp_repository_version', lambda: '0.23.0-1.el8')
+    monkeypatch.setattr(api, 'current_actor', CurrentActorMocked())
+    monkeypatch.setattr(api, 'produce', produce_mocked())
+
+    parsed_events = get_pes_events(os.path.dirname(pes_events_path), 'sample04.json')
+    assert len(load_data_asset_calls) == 1
+    assert not api.produce.called  # ConsumedDataAsset is produced by load_data_asset
+
+    cached_events = get_pes_events(os.path.dirname(pes_events_path), 'sample04.json')
+    assert len(load_data_asset_calls) == 1
+    assert cached_events == parsed_events
+    assert [e.in_pkgs for e in cached_events] == [e.in_pkgs for e in parsed_events]
+    assert api.produce.called == 1
+    assert isinstance(api.produce.model_instances[0], ConsumedDataAsset)
+
+    # A different version of leapp-repository invalidates the cache
+    monkeypatch.setattr(pes_event_parsing, 'get_leapp_repository_version', lambda: '0.24.0-1.el8')
+    get_pes_events(os.path.dirname(pes_events_path), 'sample04.json')
+    assert len(load_data_asset_calls) == 2
+
+
+@pytest.mark.parametrize('sample_file', ('sample01.json', 'sample02.json', 'sample04.json'))
+def test_incremental_decoder_matches_json_loads(sample_file):
+    with open(os.path.join(CUR_DIR, 'files', sample_file)) as f:
+        json_data = f.read()
+
+    decoder = IncrementalPESDataDecoder(lambda entry: True)
+    assert decoder(json_data) == json.loads(json_data)
+    assert decoder.entries_count == len(json.loads(json_data).get('packageinfo', []))
+
+
+@pytest.mark.parametrize('json_data', (
+    '{"packageinfo": [{"id": 1}, ]}',
+    '{"packageinfo": [{"id": 1}}',
+    '{"packageinfo": []',
+    '{"packageinfo": [], }',
+    '{"packageinfo": []} []',
+    '{packageinfo: []}',
+))
+def test_incremental_decoder_invalid_json(json_data):
+    with pytest.raises(ValueError):
+        IncrementalPESDataDecoder(lambda entry: True)(json_data)
+
+
+def test_pes_entry_filter(monkeypatch):
+    monkeypatch.setattr(api, 'current_actor', CurrentActorMocked(arch='x86_64', src_ver='8.10', dst_ver='9.6'))
+
+    def make_entry(entry_id, release, architectures):
+        return {
+            'id': entry_id,
+            'action': 1,
+            'in_packageset': {'package': [{'name': 'pkg{}'.format(entry_id), 'repository': 'repo'}]},
+            'release': {'major_version': release[0], 'minor_version': release[1]},
+            'architectures': architectures,
+        }
+
+    entries = [
+        make_entry(1, (9, 0), []),
+        make_entry(2, (9, 0), ['x86_64', 's390x']),
+        make_entry(3, (9, 0), ['s390x']),
+        make_entry(4, (8, 10), []),
+        make_entry(5, (9, 7), ['x86_64']),
+        make_entry(6, (9, 6), ['invalid-arch']),
+    ]
+    json_data = json.dumps({'packageinfo': entries, 'provided_data_streams': ['4.0']})
+
+    decoder = IncrementalPESDataDecoder(make_pes_entry_filter('x86_64'))
+    decoded_data = decoder(json_data)
+
+    assert [entry['id'] for entry in decoded_data['packageinfo']] == [1, 2, 6]
+    assert decoded_data['provided_data_streams'] == ['4.0']
+    assert decoder.entries_count == len(entries)
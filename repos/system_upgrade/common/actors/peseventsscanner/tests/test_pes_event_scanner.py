@@ -185,6 +185,95 @@ def test_compute_pkg_state(monkeypatch):
     assert target_pkgs == expected_target_pkgs
 
 
+def test_events_within_release_are_applied_in_order(monkeypatch):
+    """Events of a release are applied sequentially, their applicability is given by the state before the release."""
+    monkeypatch.setattr(api, 'current_actor', CurrentActorMocked())
+    events = [
+        Event(1, Action.REPLACED, {Package('A', 'rhel8-repo', None)}, {Package('B', 'rhel9-repo', None)},
+              (8, 10), (9, 0), []),
+        Event(2, Action.REMOVED, {Package('B', 'rhel8-repo', None)}, set(), (8, 10), (9, 0), []),
+        Event(3, Action.SPLIT, set(), {Package('C', 'rhel9-repo', None)}, (8, 10), (9, 0), []),
+        Event(4, Action.REMOVED, {Package('unrelated', 'rhel8-repo', None)}, set(), (8, 10), (9, 0), []),
+        Event(5, Action.REMOVED, {Package('A', 'rhel9-repo', None)}, set(), (9, 0), (9, 1), []),
+    ]
+
+    events_by_release = pes_events_scanner.index_events_by_release(events)
+    assert sorted(events_by_release) == [(9, 0), (9, 1)]
+    assert [e.id for e in events_by_release[(9, 0)].events] == [1, 2, 3, 4]
+    assert events_by_release[(9, 0)].events_without_in_pkgs == [2]
+
+    installed_pkgs = {Package('A', 'rhel8-repo', None)}
+    target_pkgs, dummy_demodularized_pkgs = compute_packages_on_target_system(installed_pkgs, events, [(9, 0), (9, 1)])
+
+    # B is not removed by the event 2 as it was not present at the beginning of the release
+    assert pkgs_into_tuples(target_pkgs) == {('B', 'rhel9-repo', None), ('C', 'rhel9-repo', None)}
+    assert installed_pkgs == {Package('A', 'rhel8-repo', None)}
+
+
+def test_compute_packages_on_target_system_with_fixed_event_set(monkeypatch):
+    """
+    Check the outcome of applying a fixed set of events spanning multiple releases.
+
+    The expected packages were obtained by the original (non-indexed) event application algorithm.
+    """
+    monkeypatch.setattr(api, 'current_actor', CurrentActorMocked(src_ver='8.10', dst_ver='9.4'))
+
+    installed_pkgs = {
+        Package('present', 'rhel8-BaseOS', None),
+        Package('deprecated', 'rhel8-AppStream', None),
+        Package('split-in', 'rhel8-BaseOS', None),
+        Package('merge-in1', 'rhel8-AppStream', None),
+        Package('replaced-in', 'rhel8-BaseOS', None),
+        Package('removed', 'rhel8-BaseOS', None),
+        Package('renamed-in', 'rhel8-BaseOS', None),
+        Package('untouched', 'rhel8-BaseOS', None),
+        Package('modular', 'rhel8-AppStream', ('perl', '5.26')),
+        Package('modular-replaced', 'rhel8-AppStream', ('nodejs', '10')),
+    }
+    events = [
+        Event(1, Action.PRESENT, {Package('present', 'rhel9-BaseOS', None)}, set(), (8, 10), (9, 0), []),
+        Event(2, Action.DEPRECATED, {Package('deprecated', 'rhel9-AppStream', None)}, set(), (8, 10), (9, 0), []),
+        Event(3, Action.SPLIT, {Package('split-in', 'rhel8-BaseOS', None)},
+              {Package('split-out1', 'rhel9-BaseOS', None), Package('split-out2', 'rhel9-AppStream', None)},
+              (8, 10), (9, 0), []),
+        Event(4, Action.MERGED,
+              {Package('merge-in1', 'rhel8-AppStream', None), Package('merge-in2', 'rhel8-AppStream', None)},
+              {Package('merge-out', 'rhel9-AppStream', None)}, (8, 10), (9, 0), []),
+        Event(5, Action.REPLACED, {Package('replaced-in', 'rhel8-BaseOS', None)},
+              {Package('replaced-out', 'rhel9-BaseOS', None)}, (8, 10), (9, 0), []),
+        Event(6, Action.REMOVED, {Package('removed', 'rhel8-BaseOS', None)}, set(), (8, 10), (9, 0), []),
+        Event(7, Action.RENAMED, {Package('renamed-in', 'rhel8-BaseOS', None)},
+              {Package('renamed-mid', 'rhel9-BaseOS', None)}, (8, 10), (9, 0), []),
+        Event(8, Action.REPLACED, {Package('modular-replaced', 'rhel8-AppStream', ('nodejs', '10'))},
+              {Package('nodejs', 'rhel9-AppStream', None)}, (8, 10), (9, 0), []),
+        Event(9, Action.SPLIT, {Package('not-installed', 'rhel8-BaseOS', None)},
+              {Package('never-added', 'rhel9-BaseOS', None)}, (8, 10), (9, 0), []),
+        Event(10, Action.RENAMED, {Package('renamed-mid', 'rhel9-BaseOS', None)},
+              {Package('renamed-out', 'rhel9-BaseOS', None)}, (9, 0), (9, 2), []),
+        Event(11, Action.REMOVED, {Package('split-out2', 'rhel9-AppStream', None)}, set(), (9, 0), (9, 2), []),
+        Event(12, Action.PRESENT, {Package('split-out2', 'rhel9-AppStream', None)}, set(), (9, 2), (9, 4), []),
+        Event(13, Action.PRESENT, {Package('never-added', 'rhel9-BaseOS', None)}, set(), (9, 2), (9, 4), []),
+    ]
+
+    target_pkgs, demodularized_pkgs = compute_packages_on_target_system(installed_pkgs, events,
+                                                                        [(9, 0), (9, 2), (9, 4)])
+
+    expected_target_pkgs = {
+        ('present', 'rhel9-BaseOS', None),
+        ('deprecated', 'rhel9-AppStream', None),
+        ('split-out1', 'rhel9-BaseOS', None),
+        ('split-out2', 'rhel9-AppStream', None),
+        ('merge-out', 'rhel9-AppStream', None),
+        ('replaced-out', 'rhel9-BaseOS', None),
+        ('renamed-out', 'rhel9-BaseOS', None),
+        ('nodejs', 'rhel9-AppStream', None),
+        ('untouched', 'rhel8-BaseOS', None),
+        ('modular', 'rhel8-AppStream', None),
+    }
+    assert pkgs_into_tuples(target_pkgs) == expected_target_pkgs
+    assert pkgs_into_tuples(demodularized_pkgs) == {('modular', 'rhel8-AppStream', ('perl', '5.26'))}
+
+
 def test_compute_rpm_tasks_from_pkg_set_diff(monkeypatch):
     monkeypatch.setattr(api, 'current_actor', CurrentActorMocked(msgs=[EnabledModules(modules=[])]))
     source_pkgs = {
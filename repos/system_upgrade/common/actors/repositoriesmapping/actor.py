@@ -9,7 +9,9 @@ class RepositoriesMappingScanner(Actor):
     Produces message containing repository mapping based on provided file.
 
     The actor filters out data irrelevant to the current IPU (data with different
-    source/target major versions) from the raw repository mapping data.
+    source/target major versions, distributions or architecture) from the raw
+    repository mapping data. The filtered data are cached persistently, so they
+    are not loaded again until the repository mapping file changes.
     """
 
     name = 'repository_mapping'
@@ -1,10 +1,11 @@
 import os
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 
 from leapp.exceptions import StopActorExecutionError
+from leapp.libraries.common import fetch, persistentcache
+from leapp.libraries.common.config import get_source_distro_id, get_target_distro_id
 from leapp.libraries.common.config.version import get_source_major_version, get_target_major_version
-from leapp.libraries.common.fetch import load_data_asset
-from leapp.libraries.common.rpms import get_leapp_packages, LeappComponents
+from leapp.libraries.common.rpms import get_leapp_packages, get_leapp_repository_version, LeappComponents
 from leapp.libraries.stdlib import api
 from leapp.models import PESIDRepositoryEntry, RepoMapEntry, RepositoriesMapping
 from leapp.models.fields import ModelViolationError
@@ -15,6 +16,51 @@ OLD_REPOMAP_FILE = 'repomap.csv'
 REPOMAP_FILE = 'repomap.json'
 """The name of the new repository mapping file."""
 
+REPOMAP_CACHE_NAME = 'repomap'
+"""
+Name of the persistent cache holding the repository mapping data relevant for the upgrade.
+"""
+
+_REPOMAP_CACHE_FORMAT = 1
+"""
+Version of the cached data layout, bump it whenever the layout or the loading logic changes.
+"""
+
+_PESID_REPO_FIELDS = ('repoid', 'channel', 'rhui', 'repo_type', 'arch', 'major_version', 'pesid', 'distro')
+
+_RepoMapFilter = namedtuple('RepoMapFilter', ['source_major_version',  # str
+                                              'source_distro',         # str
+                                              'target_major_version',  # str
+                                              'target_distro',         # str
+                                              'arch',                  # str
+                                              ])
+
+
+class RepoMapFilter(_RepoMapFilter):
+    """
+    Specification of the repository mapping data relevant for the upgrade path and architecture.
+    """
+
+    def is_relevant_repository(self, data):
+        """
+        Check whether the repository (an entry of a repository family in the JSON data) is relevant.
+
+        Only repositories for the architecture of the system are relevant, matching either the source
+        major version and distro or the target major version and distro.
+        """
+        release = (data['major_version'], data['distro'])
+        if release not in ((self.source_major_version, self.source_distro),
+                           (self.target_major_version, self.target_distro)):
+            return False
+        return data['arch'] == self.arch
+
+    def is_relevant_mapping(self, data):
+        """
+        Check whether the mapping (an item of the mapping list in the JSON data) is relevant.
+        """
+        return (data['source_major_version'] == self.source_major_version
+                and data['target_major_version'] == self.target_major_version)
+
 
 class RepoMapData:
     VERSION_FORMAT = '1.3.0'
@@ -90,7 +136,16 @@ class RepoMapData:
         return map_list
 
     @staticmethod
-    def load_from_dict(data):
+    def load_from_dict(data, repomap_filter=None):
+        """
+        Load the repository mapping data from the given dictionary (parsed JSON data).
+
+        :param data: The repository mapping data as defined by the repository mapping JSON schema.
+        :type data: Dict
+        :param repomap_filter: When specified, only repositories and mappings relevant for it are loaded.
+        :type repomap_filter: Optional[RepoMapFilter]
+        :rtype: RepoMapData
+        """
         if data['version_format'] != RepoMapData.VERSION_FORMAT:
             raise ValueError(
                 'The obtained repomap data has unsupported version of format.'
@@ -105,10 +160,14 @@ class RepoMapData:
         for repo_family in data['repositories']:
             existing_pesids.add(repo_family['pesid'])
             for repo in repo_family['entries']:
+                if repomap_filter and not repomap_filter.is_relevant_repository(repo):
+                    continue
                 repomap.add_repository(repo, repo_family['pesid'])
 
         # Load mappings
         for mapping in data['mapping']:
+            if repomap_filter and not repomap_filter.is_relevant_mapping(mapping):
+                continue
             for entry in mapping['entries']:
                 if not isinstance(entry['target'], list):
                     raise ValueError(
@@ -151,21 +210,95 @@ def _read_repofile(repofile):
     # NOTE(pstodulk): load_data_assert raises StopActorExecutionError, see
     # the code for more info. Keeping the handling on the framework in such
     # a case as we have no work to do in such a case here.
-    repofile_data = load_data_asset(api.current_actor(),
-                                    repofile,
-                                    asset_fulltext_name='Repositories mapping',
-                                    docs_url='',
-                                    docs_title='')
+    repofile_data = fetch.load_data_asset(api.current_actor(),
+                                          repofile,
+                                          asset_fulltext_name='Repositories mapping',
+                                          docs_url='',
+                                          docs_title='')
     return repofile_data
 
 
+def _get_repomap_filter():
+    return RepoMapFilter(
+        source_major_version=get_source_major_version(),
+        source_distro=get_source_distro_id(),
+        target_major_version=get_target_major_version(),
+        target_distro=get_target_distro_id(),
+        arch=api.current_actor().configuration.architecture,
+    )
+
+
+def _get_repomap_cache_key(repomap_path, repomap_filter):
+    """
+    Get the key identifying the cached repository mapping or None when it should not be cached.
+    """
+    checksum = persistentcache.get_file_checksum(repomap_path)
+    if not checksum:
+        return None
+
+    leapp_repository_version = get_leapp_repository_version()
+    if not leapp_repository_version:
+        # E.g. running from the upstream sources, loading logic could change without changing the version
+        api.current_logger().debug('Unknown version of leapp-repository, the repository mapping will not be cached.')
+        return None
+
+    return (_REPOMAP_CACHE_FORMAT, checksum, leapp_repository_version, tuple(repomap_filter))
+
+
+def _store_repomap_cache(cache_key, provided_data_streams, repositories_mapping):
+    serialized_mapping = tuple((entry.source, tuple(entry.target)) for entry in repositories_mapping.mapping)
+    serialized_repositories = tuple(
+        tuple(getattr(repo, field) for field in _PESID_REPO_FIELDS) for repo in repositories_mapping.repositories
+    )
+    persistentcache.store(REPOMAP_CACHE_NAME, cache_key,
+                          (provided_data_streams, serialized_mapping, serialized_repositories))
+
+
+def _load_cached_repomap(cache_key):
+    """
+    Load the repository mapping from the persistent cache, producing ConsumedDataAsset as when the file is loaded.
+
+    :return: RepositoriesMapping or None when there is no valid cached mapping
+    """
+    if not cache_key:
+        return None
+
+    cached_data = persistentcache.load(REPOMAP_CACHE_NAME, cache_key)
+    if cached_data is None:
+        return None
+
+    try:
+        provided_data_streams, serialized_mapping, serialized_repositories = cached_data
+        repositories_mapping = RepositoriesMapping(
+            mapping=[RepoMapEntry(source=source, target=list(target)) for source, target in serialized_mapping],
+            repositories=[
+                PESIDRepositoryEntry(**dict(zip(_PESID_REPO_FIELDS, repo))) for repo in serialized_repositories
+            ],
+        )
+    except (TypeError, ValueError, ModelViolationError):
+        api.current_logger().warning('The cache of the repository mapping is corrupted, loading the file instead.')
+        return None
+
+    api.current_logger().debug('Loaded the repository mapping from the persistent cache.')
+    fetch.produce_consumed_data_asset(REPOMAP_FILE,
+                                      asset_fulltext_name='Repositories mapping',
+                                      docs_url='',
+                                      docs_title='',
+                                      provided_data_streams=provided_data_streams)
+    return repositories_mapping
+
+
 def scan_repositories(read_repofile_func=_read_repofile):
     """
     Scan the repository mapping file and produce RepositoriesMap msg.
 
+    Only the data relevant for the upgrade path, the architecture and the source and target
+    distributions are loaded. The result is stored in a persistent cache keyed by the checksum
+    of the repository mapping file and the version of leapp-repository, so next executions
+    skip the loading when nothing has changed.
+
     See the description of the actor for more details.
     """
-    # TODO: add filter based on the current arch
     # TODO: deprecate the product type and introduce the "channels" ?.. more or less
     # NOTE: product type is changed, now it's channel: eus,e4s,aus,tus,ga,beta
 
@@ -177,16 +310,26 @@ def scan_repositories(read_repofile_func=_read_repofile):
             ' not used anymore.'
         )
 
+    repomap_filter = _get_repomap_filter()
+    cache_key = None
+    if read_repofile_func is _read_repofile:
+        # Data provided by other means (e.g. in tests) are not related to the file on the system
+        cache_key = _get_repomap_cache_key(os.path.join('/etc/leapp/files', REPOMAP_FILE), repomap_filter)
+
+    cached_repositories_mapping = _load_cached_repomap(cache_key)
+    if cached_repositories_mapping is not None:
+        api.produce(cached_repositories_mapping)
+        return
+
     json_data = read_repofile_func(REPOMAP_FILE)
     try:
-        repomap_data = RepoMapData.load_from_dict(json_data)
-        mapping = repomap_data.get_mappings(get_source_major_version(), get_target_major_version())
-
-        valid_major_versions = [get_source_major_version(), get_target_major_version()]
-        api.produce(RepositoriesMapping(
-            mapping=mapping,
-            repositories=repomap_data.get_repositories(valid_major_versions)
-        ))
+        repomap_data = RepoMapData.load_from_dict(json_data, repomap_filter)
+        repositories_mapping = RepositoriesMapping(
+            mapping=repomap_data.get_mappings(repomap_filter.source_major_version,
+                                              repomap_filter.target_major_version),
+            repositories=repomap_data.repositories
+        )
+        api.produce(repositories_mapping)
     except ModelViolationError as err:
         err_message = (
             'The repository mapping file is invalid: '
@@ -200,3 +343,7 @@ def scan_repositories(read_repofile_func=_read_repofile):
     except ValueError as err:
         # The error should contain enough information, so we do not need to clarify it further
         _inhibit_upgrade('The repository mapping file is invalid: {}'.format(err))
+    else:
+        if cache_key:
+            provided_data_streams = json_data.get(fetch.ASSET_PROVIDED_DATA_STREAMS_FIELD)
+            _store_repomap_cache(cache_key, provided_data_streams, repositories_mapping)
@@ -6,10 +6,11 @@ import requests
 
 from leapp.exceptions import StopActorExecutionError
 from leapp.libraries.actor import repositoriesmapping
-from leapp.libraries.common import fetch
+from leapp.libraries.common import fetch, persistentcache
+from leapp.libraries.common.config import architecture
 from leapp.libraries.common.testutils import CurrentActorMocked, produce_mocked
 from leapp.libraries.stdlib import api
-from leapp.models import ConsumedDataAsset, PESIDRepositoryEntry
+from leapp.models import ConsumedDataAsset, PESIDRepositoryEntry, RepositoriesMapping
 
 CUR_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -52,7 +53,7 @@ def test_scan_existing_valid_data(monkeypatch, adjust_cwd):
     # 2. Verify that only repositories valid for the current IPU are produced
     pesid_repos = repo_mapping.repositories
     fail_description = 'Actor produced incorrect number of IPU-relevant pesid repos.'
-    assert len(pesid_repos) == 6, fail_description
+    assert len(pesid_repos) == 3, fail_description
 
     expected_pesid_repos = [
         PESIDRepositoryEntry(
@@ -85,36 +86,6 @@ def test_scan_existing_valid_data(monkeypatch, adjust_cwd):
             rhui='',
             distro='rhel',
         ),
-        PESIDRepositoryEntry(
-            pesid='pesid6',
-            major_version='7',
-            repoid='some-centos-9-repoid1',
-            arch='x86_64',
-            repo_type='rpm',
-            channel='ga',
-            rhui='',
-            distro='centos',
-        ),
-        PESIDRepositoryEntry(
-            pesid='pesid7',
-            major_version='8',
-            repoid='some-centos-10-repoid1',
-            arch='x86_64',
-            repo_type='rpm',
-            channel='ga',
-            rhui='',
-            distro='centos',
-        ),
-        PESIDRepositoryEntry(
-            pesid='pesid8',
-            major_version='8',
-            repoid='some-almalinux-8-repoid1',
-            arch='x86_64',
-            repo_type='rpm',
-            channel='ga',
-            rhui='',
-            distro='almalinux',
-        ),
     ]
 
     fail_description = 'Expected pesid repo is not present in the deserialization output.'
@@ -122,6 +93,74 @@ def test_scan_existing_valid_data(monkeypatch, adjust_cwd):
         assert expected_pesid_repo in pesid_repos, fail_description
 
 
+@pytest.mark.parametrize(('src_distro', 'dst_distro', 'arch', 'expected_repoids'), (
+    ('rhel', 'rhel', architecture.ARCH_X86_64, {'some-rhel-7-repoid', 'some-rhel-8-repoid1', 'some-rhel-8-repoid2'}),
+    ('centos', 'almalinux', architecture.ARCH_X86_64, {'some-centos-9-repoid1', 'some-almalinux-8-repoid1'}),
+    ('centos', 'centos', architecture.ARCH_X86_64, {'some-centos-9-repoid1', 'some-centos-10-repoid1'}),
+    ('rhel', 'rhel', architecture.ARCH_ARM64, set()),
+))
+def test_scan_repositories_filters_repositories(monkeypatch, adjust_cwd, src_distro, dst_distro, arch,
+                                                expected_repoids):
+    """
+    Tests that only repositories for the architecture and the source/target distro and major version are produced.
+    """
+
+    with open('files/repomap_example.json') as repomap_file:
+        data = json.load(repomap_file)
+    monkeypatch.setattr(api, 'current_actor', CurrentActorMocked(src_ver='7.9', dst_ver='8.4', arch=arch,
+                                                                 src_distro=src_distro, dst_distro=dst_distro))
+    monkeypatch.setattr(api, 'produce', produce_mocked())
+
+    repositoriesmapping.scan_repositories(lambda dummy: data)
+
+    assert len(api.produce.model_instances) == 1
+    repo_mapping = api.produce.model_instances[0]
+    assert {pesid_repo.repoid for pesid_repo in repo_mapping.repositories} == expected_repoids
+    assert [(entry.source, entry.target) for entry in repo_mapping.mapping] == [('pesid1', ['pesid2', 'pesid3'])]
+
+
+def test_scan_repositories_cached(monkeypatch, tmpdir, adjust_cwd):
+    """
+    Tests that the loaded repository mapping is cached and reused while the repomap file does not change.
+    """
+
+    with open('files/repomap_example.json') as repomap_file:
+        raw_data = repomap_file.read()
+
+    read_files = []
+
+    def read_or_fetch_mocked(filename, *args, **kwargs):
+        read_files.append(filename)
+        return raw_data
+
+    checksum = ['checksum1']
+    mocked_actor = CurrentActorMocked(src_ver='7.9', dst_ver='8.4')
+    mocked_actor.produces = (ConsumedDataAsset, RepositoriesMapping)
+    monkeypatch.setattr(api, 'current_actor', mocked_actor)
+    monkeypatch.setattr(fetch, 'read_or_fetch', read_or_fetch_mocked)
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(persistentcache, 'get_file_checksum', lambda path: checksum[0])
+    monkeypatch.setattr(repositoriesmapping, 'get_leapp_repository_version', lambda: '0.1.0-1')
+
+    produced_messages = []
+    for dummy_run in range(2):
+        monkeypatch.setattr(api, 'produce', produce_mocked())
+        repositoriesmapping.scan_repositories()
+        produced_messages.append(api.produce.model_instances)
+
+    assert read_files == [repositoriesmapping.REPOMAP_FILE]
+    assert produced_messages[0] == produced_messages[1]
+    assert isinstance(produced_messages[1][0], ConsumedDataAsset)
+    assert isinstance(produced_messages[1][1], RepositoriesMapping)
+
+    # The cached mapping must not be used when the repomap file changes
+    checksum[0] = 'checksum2'
+    monkeypatch.setattr(api, 'produce', produce_mocked())
+    repositoriesmapping.scan_repositories()
+    assert read_files == [repositoriesmapping.REPOMAP_FILE] * 2
+    assert api.produce.model_instances == produced_messages[0]
+
+
 def test_scan_repositories_with_missing_data(monkeypatch):
     """
     Tests whether the scanning process fails gracefully when no data are read.
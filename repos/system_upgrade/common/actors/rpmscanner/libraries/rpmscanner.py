@@ -4,7 +4,7 @@ from leapp.exceptions import StopActorExecutionError
 from leapp.libraries.common import module as module_lib
 from leapp.libraries.common import rpms
 from leapp.libraries.stdlib import api
-from leapp.models import InstalledRPM, RPM
+from leapp.models import InstalledRPM
 
 no_yum = False
 no_yum_warning_msg = "package `yum` is unavailable"
@@ -14,14 +14,6 @@ except ImportError:
     no_yum = True
     warnings.warn(no_yum_warning_msg, ImportWarning)
 
-no_dnf = False
-no_dnf_warning_msg = "package `dnf` is unavailable"
-try:
-    import dnf
-except ImportError:
-    no_dnf = True
-    warnings.warn(no_dnf_warning_msg, ImportWarning)
-
 
 def _get_package_repository_data_yum():
     yum_base = yum.YumBase()
@@ -46,14 +38,13 @@ def _get_package_repository_data_yum():
 
 
 def _get_package_repository_data_dnf():
-    dnf_base = dnf.Base()
     pkg_repos = {}
 
     try:
-        # NOTE: currently we do not initialize/load DNF plugins here as we are
-        # working just with the local stuff (load_system_repo=True)
-        dnf_base.fill_sack(load_system_repo=True, load_available_repos=False)
-        for pkg in dnf_base.sack.query():
+        # NOTE: the DNF base is shared with the module library, so the sack
+        # (and the RPM DB) is loaded just once for the whole actor
+        dnf_base = module_lib.get_dnf_base()
+        for pkg in dnf_base.sack.query().installed():
             pkg_repos[pkg.name] = pkg._from_repo.lstrip('@')
     except ValueError as e:
         if 'locale' not in str(e):  # reraise if error is not related to locales
@@ -77,7 +68,7 @@ def get_package_repository_data():
     """
     if not no_yum:
         return _get_package_repository_data_yum()
-    if not no_dnf:
+    if module_lib.dnf:
         return _get_package_repository_data_dnf()
     raise StopActorExecutionError(message=no_yum_warning_msg)
 
@@ -108,28 +99,13 @@ def map_modular_rpms_to_modules():
 
 # TODO(drehak) unit tests
 def process():
-    output = rpms.get_installed_rpms()
-    pkg_repos = get_package_repository_data()
-    rpm_streams = map_modular_rpms_to_modules()
-
-    result = InstalledRPM()
-    for entry in output:
-        entry = entry.strip()
-        if not entry:
-            continue
-        name, version, release, epoch, packager, arch, pgpsig = entry.split('|')
-        repository = pkg_repos.get(name, '')
-        rpm_key = (name, epoch, version, release, arch)
-        module, stream = rpm_streams.get(rpm_key, (None, None))
-        result.items.append(RPM(
-            name=name,
-            version=version,
-            epoch=epoch,
-            packager=packager,
-            arch=arch,
-            release=release,
-            pgpsig=pgpsig,
-            repository=repository,
-            module=module,
-            stream=stream))
-    api.produce(result)
+    installed_rpms = rpms.get_installed_rpm_items()
+    with module_lib.shared_dnf_base():
+        pkg_repos = get_package_repository_data()
+        rpm_streams = map_modular_rpms_to_modules()
+
+    for pkg in installed_rpms:
+        pkg.repository = pkg_repos.get(pkg.name, '')
+        rpm_key = (pkg.name, pkg.epoch, pkg.version, pkg.release, pkg.arch)
+        pkg.module, pkg.stream = rpm_streams.get(rpm_key, (None, None))
+    api.produce(InstalledRPM(items=installed_rpms))
@@ -108,6 +108,35 @@ def test_actor_execution(monkeypatch, current_actor_context):
     assert current_actor_context.consume(InstalledRPM)[0].items
 
 
+class MockedPackage:
+    def __init__(self, name, from_repo):
+        self.name = name
+        self._from_repo = from_repo
+
+
+class MockedQuery:
+    def __init__(self, pkgs):
+        self.pkgs = pkgs
+
+    def installed(self):
+        return [pkg for pkg in self.pkgs if pkg._from_repo.startswith('@')]
+
+
+class MockedDnfBase:
+    def __init__(self, pkgs):
+        self.sack = self
+        self.pkgs = pkgs
+
+    def query(self):
+        return MockedQuery(self.pkgs)
+
+
+def test_get_package_repository_data_dnf(monkeypatch):
+    pkgs = [MockedPackage('tcpdump', '@repo2'), MockedPackage('passwd', '@anaconda'), MockedPackage('vim', 'repo1')]
+    monkeypatch.setattr(module_lib, 'get_dnf_base', lambda: MockedDnfBase(pkgs))
+    assert rpmscanner._get_package_repository_data_dnf() == {'tcpdump': 'repo2', 'passwd': 'anaconda'}
+
+
 def test_map_modular_rpms_to_modules_empty(monkeypatch):
     monkeypatch.setattr(module_lib, 'get_modules', lambda: [])
     mapping = rpmscanner.map_modular_rpms_to_modules()
@@ -152,10 +181,19 @@ PACKAGE_REPOS = {
 }
 
 
+def _get_installed_rpm_items_mocked():
+    installed_rpms = []
+    for entry in INSTALLED_RPMS:
+        name, version, release, epoch, packager, arch, pgpsig = entry.split('|')
+        installed_rpms.append(RPM(name=name, version=version, release=release, epoch=epoch,
+                                  packager=packager, arch=arch, pgpsig=pgpsig))
+    return installed_rpms
+
+
 def test_process(monkeypatch):
     monkeypatch.setattr(module_lib, 'get_modules', lambda: MODULES)
     monkeypatch.setattr(rpmscanner, 'get_package_repository_data', lambda: PACKAGE_REPOS)
-    monkeypatch.setattr(rpms, 'get_installed_rpms', lambda: INSTALLED_RPMS)
+    monkeypatch.setattr(rpms, 'get_installed_rpm_items', _get_installed_rpm_items_mocked)
     monkeypatch.setattr(api, 'produce', testutils.produce_mocked())
 
     rpmscanner.process()
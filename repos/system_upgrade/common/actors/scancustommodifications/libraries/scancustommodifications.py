@@ -1,14 +1,42 @@
 import ast
+import grp
 import os
+import pwd
+import stat
+from concurrent.futures import ThreadPoolExecutor
 
 from leapp.exceptions import StopActorExecution
 from leapp.libraries.common import rpms
+from leapp.libraries.common.rpms import DEFAULT_DIGEST_ALGORITHM, DIGEST_ALGORITHMS, get_file_digest, rpm, to_str
 from leapp.libraries.stdlib import api, CalledProcessError, run
 from leapp.models import CustomModifications
 
 LEAPP_REPO_DIRS = ['/usr/share/leapp-repository']
 LEAPP_PACKAGES_TO_IGNORE = ['snactor']
 
+VERIFY_MAX_WORKERS = 8
+"""
+Maximal number of threads verifying the files of leapp packages.
+"""
+
+# rpmVerifyAttrs_e and rpmfileAttrs_e values, see rpm/rpmvf.h and rpm/rpmfiles.h
+_RPMVERIFY_FILEDIGEST = 1 << 0
+_RPMVERIFY_FILESIZE = 1 << 1
+_RPMVERIFY_LINKTO = 1 << 2
+_RPMVERIFY_USER = 1 << 3
+_RPMVERIFY_GROUP = 1 << 4
+_RPMVERIFY_MODE = 1 << 6
+_RPMVERIFY_ALL = 0xffffffff
+_RPMFILE_CONFIG = 1 << 0
+_RPMFILE_MISSINGOK = 1 << 3
+_RPMFILE_GHOST = 1 << 6
+_RPMFILE_STATE_NORMAL = 0
+
+_ACTOR_NAMES_CACHE = {}
+"""
+Indexes of actor names by the directory containing the actors, see :func:`_get_actor_names_index`.
+"""
+
 
 def _get_dirs_to_check(component):
     if component == 'repository':
@@ -33,42 +61,80 @@ def deduce_actor_name(a_file):
     if not os.path.exists(a_file):
         return ''
     # NOTE(ivasilev) Actors reside only in actor.py files, so AST processing any other file can be skipped.
-    # In case this function has been called on a non-actor file, let's go straight to recursive call on the assumed
-    # location of the actor file.
     if os.path.basename(a_file) == 'actor.py':
-        data = None
-        with open(a_file) as f:
-            try:
-                data = ast.parse(f.read())
-            except TypeError:
-                api.current_logger().warning('An error occurred while parsing %s, can not deduce actor name', a_file)
-                return ''
-        # NOTE(ivasilev) Making proper syntax analysis is not the goal here, so let's get away with the bare minimum.
-        # An actor file will have an Actor ClassDef with a name attribute and a process function defined
-        actor = next((obj for obj in data.body if isinstance(obj, ast.ClassDef) and obj.name and
-                      any(isinstance(o, ast.FunctionDef) and o.name == 'process' for o in obj.body)), None)
-        # NOTE(ivasilev) obj.name attribute refers only to Class name, so for fetching name attribute need to go
-        # deeper
-        if actor:
-            try:
-                actor_name = next((expr.value.s for expr in actor.body
-                                   if isinstance(expr, ast.Assign) and expr.targets[-1].id == 'name'), None)
-            except (AttributeError, IndexError):
-                api.current_logger().warning("Syntax Analysis for %d has failed", a_file)
-                actor_name = None
-            if actor_name:
-                return actor_name
+        return _get_actor_name(a_file)
 
     # Assuming here we are dealing with a library or a file, so let's discover actor filename and deduce actor name
     # from it. Actor is expected to be found under ../../actor.py
-    def _check_assumed_location(subdir):
+    for subdir in ('libraries', 'files'):
         assumed_actor_file = os.path.join(a_file.split(subdir)[0], 'actor.py')
-        if not os.path.exists(assumed_actor_file):
-            # Nothing more we can do - no actor name mapping, return ''
-            return ''
-        return deduce_actor_name(assumed_actor_file)
+        # Nothing more we can do if the actor file does not exist - no actor name mapping
+        actor_name = _get_actor_name(assumed_actor_file) if os.path.isfile(assumed_actor_file) else ''
+        if actor_name:
+            return actor_name
+    return ''
+
+
+def _get_actor_name(actor_file):
+    """
+    Return the name of the actor defined in the given actor.py file using the index of actor names
+
+    The actor file is parsed only when it is not in the index yet or when its mtime or size has changed.
+    """
+    actor_dir = os.path.dirname(os.path.abspath(actor_file))
+    actors_dir, actor = os.path.split(actor_dir)
+    actor_names = _get_actor_names_index(actors_dir)
+    actor_file_stat = os.stat(actor_file)
+    stamp = (actor_file_stat.st_mtime_ns, actor_file_stat.st_size)
+    if actor_names.get(actor) is None or actor_names[actor][0] != stamp:
+        actor_names[actor] = (stamp, _parse_actor_name(actor_file))
+    return actor_names[actor][1]
+
+
+def _get_actor_names_index(actors_dir):
+    """
+    Return the index of actors in the given directory, mapping the actor directory name to (stamp, actor name)
+
+    The index mirrors the listing of the directory, the entries are filled in lazily by :func:`_get_actor_name`.
+    When the directory has been modified (e.g. an actor has been added or removed), the listing is read again
+    and only the entries of the actors that still exist are kept.
+    """
+    mtime = os.stat(actors_dir).st_mtime_ns
+    if actors_dir in _ACTOR_NAMES_CACHE and _ACTOR_NAMES_CACHE[actors_dir][0] == mtime:
+        return _ACTOR_NAMES_CACHE[actors_dir][1]
+
+    old_actor_names = _ACTOR_NAMES_CACHE.get(actors_dir, (None, {}))[1]
+    actor_names = {entry: old_actor_names.get(entry) for entry in os.listdir(actors_dir)}
+    _ACTOR_NAMES_CACHE[actors_dir] = (mtime, actor_names)
+    return actor_names
+
 
-    return _check_assumed_location('libraries') or _check_assumed_location('files')
+def _parse_actor_name(a_file):
+    """
+    Return the name of the actor defined in the given actor.py file or empty string
+    """
+    data = None
+    with open(a_file) as f:
+        try:
+            data = ast.parse(f.read())
+        except (TypeError, SyntaxError):
+            api.current_logger().warning('An error occurred while parsing %s, can not deduce actor name', a_file)
+            return ''
+    # NOTE(ivasilev) Making proper syntax analysis is not the goal here, so let's get away with the bare minimum.
+    # An actor file will have an Actor ClassDef with a name attribute and a process function defined
+    actor = next((obj for obj in data.body if isinstance(obj, ast.ClassDef) and obj.name and
+                  any(isinstance(o, ast.FunctionDef) and o.name == 'process' for o in obj.body)), None)
+    # NOTE(ivasilev) obj.name attribute refers only to Class name, so for fetching name attribute need to go
+    # deeper
+    if actor:
+        try:
+            actor_name = next((expr.value.s for expr in actor.body
+                               if isinstance(expr, ast.Assign) and expr.targets[-1].id == 'name'), None)
+        except (AttributeError, IndexError):
+            api.current_logger().warning("Syntax Analysis for %d has failed", a_file)
+            actor_name = None
+        return actor_name or ''
+    return ''
 
 
 def _run_command(cmd, warning_to_log, checked=True):
@@ -95,44 +161,214 @@ def _modification_model(filename, change_type, component, rpm_checks_str=''):
                                actor_name=deduce_actor_name(filename), rpm_checks_str=rpm_checks_str)
 
 
+def _get_files_in_dirs(dirs):
+    """
+    Return the list of regular files in the given directories (recursively)
+    """
+    files = []
+    for directory in dirs:
+        if not os.path.isdir(directory):
+            api.current_logger().warning('Could not get a list of leapp files from {}'.format(directory))
+            raise StopActorExecution()
+        for root, dummy_dirs, filenames in os.walk(directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if stat.S_ISREG(os.lstat(path).st_mode):
+                    files.append(path)
+    return files
+
+
+def _get_owner_name(getter, owner_id):
+    try:
+        return getter(owner_id)[0]
+    except KeyError:
+        return None
+
+
+def _verify_file(path, rpm_file):
+    """
+    Verify the file against its metadata stored in the package header, similarly to rpm -V --nomtime
+
+    Size (S), mode (M), digest (5), link target (L), user (U) and group (G) are verified.
+
+    :param path: Path to the file
+    :param rpm_file: The file metadata from the package header as a dict
+    :return: The rpm -V like result string (e.g. 'S.5......' or 'missing') or None if the file is not modified
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None if rpm_file['flags'] & _RPMFILE_MISSINGOK else 'missing'
+
+    verify_flags = rpm_file['verify_flags']
+    # the same as rpm does, verify only attributes relevant for the file type
+    if stat.S_ISDIR(st.st_mode):
+        verify_flags &= ~(_RPMVERIFY_FILEDIGEST | _RPMVERIFY_FILESIZE | _RPMVERIFY_LINKTO)
+    elif stat.S_ISLNK(st.st_mode):
+        verify_flags &= ~(_RPMVERIFY_FILEDIGEST | _RPMVERIFY_FILESIZE | _RPMVERIFY_MODE)
+    elif stat.S_ISREG(st.st_mode):
+        verify_flags &= ~_RPMVERIFY_LINKTO
+    else:
+        verify_flags &= ~(_RPMVERIFY_FILEDIGEST | _RPMVERIFY_FILESIZE | _RPMVERIFY_LINKTO)
+
+    result = ['.'] * 9
+    if verify_flags & _RPMVERIFY_FILESIZE and st.st_size != rpm_file['size']:
+        result[0] = 'S'
+    if verify_flags & _RPMVERIFY_MODE and st.st_mode != rpm_file['mode']:
+        result[1] = 'M'
+    if verify_flags & _RPMVERIFY_FILEDIGEST and rpm_file['digest']:
+        try:
+            if get_file_digest(path, rpm_file['digest_algorithm']) != rpm_file['digest']:
+                result[2] = '5'
+        except EnvironmentError:
+            result[2] = '?'
+    if verify_flags & _RPMVERIFY_LINKTO:
+        try:
+            if os.readlink(path) != rpm_file['linkto']:
+                result[4] = 'L'
+        except OSError:
+            result[4] = '?'
+    if verify_flags & _RPMVERIFY_USER and _get_owner_name(pwd.getpwuid, st.st_uid) != rpm_file['user']:
+        result[5] = 'U'
+    if verify_flags & _RPMVERIFY_GROUP and _get_owner_name(grp.getgrgid, st.st_gid) != rpm_file['group']:
+        result[6] = 'G'
+
+    result = ''.join(result)
+    return None if result == '.' * 9 else result
+
+
+def _get_rpm_files(hdr):
+    """
+    Return the list of files (with their metadata) stored in the package header
+    """
+    def _tag(tag, default=None):
+        values = hdr[tag]
+        return values if values else [default] * len(names)
+
+    names = [to_str(name) for name in hdr[rpm.RPMTAG_FILENAMES]]
+    algorithm = DIGEST_ALGORITHMS.get(hdr[rpm.RPMTAG_FILEDIGESTALGO] or DEFAULT_DIGEST_ALGORITHM)
+    files = []
+    for name, flags, verify_flags, state, digest, mode, size, linkto, user, group in zip(
+            names,
+            _tag(rpm.RPMTAG_FILEFLAGS, 0),
+            _tag(rpm.RPMTAG_FILEVERIFYFLAGS, _RPMVERIFY_ALL),
+            _tag(rpm.RPMTAG_FILESTATES, _RPMFILE_STATE_NORMAL),
+            _tag(rpm.RPMTAG_FILEDIGESTS, ''),
+            _tag(rpm.RPMTAG_FILEMODES, 0),
+            _tag(rpm.RPMTAG_LONGFILESIZES, 0),
+            _tag(rpm.RPMTAG_FILELINKTOS, ''),
+            _tag(rpm.RPMTAG_FILEUSERNAME, ''),
+            _tag(rpm.RPMTAG_FILEGROUPNAME, '')):
+        files.append({
+            'name': name,
+            'flags': flags,
+            # the verification of unknown digest algorithms is skipped
+            'verify_flags': verify_flags if algorithm else verify_flags & ~_RPMVERIFY_FILEDIGEST,
+            'state': state,
+            'digest': to_str(digest),
+            'digest_algorithm': algorithm,
+            'mode': mode & 0xffff,
+            'size': size,
+            'linkto': to_str(linkto),
+            'user': to_str(user),
+            'group': to_str(group),
+        })
+    return files
+
+
+def _verify_rpms_rpmdb(rpms_to_check):
+    """
+    Get files of the given packages and verify them using the rpm python bindings
+
+    The file metadata are read from the package headers and the files on the system
+    are verified (including computing their digests) in a thread pool.
+
+    :return: The list of files of the packages and the list of modifications in the format
+             of the split rpm -V output (e.g. ('S.5......', 'c', '/etc/leapp/files/pes-events.json'))
+    """
+    rpm_files = []
+    ts = rpm.TransactionSet()
+    try:
+        for pkg in rpms_to_check:
+            headers = list(ts.dbMatch('name', pkg))
+            if not headers:
+                api.current_logger().warning('Could not get a list of installed files from rpm {}'.format(pkg))
+                raise StopActorExecution()
+            for hdr in headers:
+                rpm_files.extend(_get_rpm_files(hdr))
+    finally:
+        ts.closeDB()
+
+    files = [rpm_file['name'] for rpm_file in rpm_files]
+    # ghost files and files not installed (e.g. excluded docs) are not verified by rpm -V either
+    to_verify = [
+        rpm_file for rpm_file in rpm_files
+        if rpm_file['state'] == _RPMFILE_STATE_NORMAL and not rpm_file['flags'] & _RPMFILE_GHOST
+    ]
+    with ThreadPoolExecutor(max_workers=VERIFY_MAX_WORKERS) as executor:
+        results = list(executor.map(lambda rpm_file: _verify_file(rpm_file['name'], rpm_file), to_verify))
+
+    modifications = []
+    for rpm_file, result in zip(to_verify, results):
+        if not result:
+            continue
+        if rpm_file['flags'] & _RPMFILE_CONFIG:
+            modifications.append((result, 'c', rpm_file['name']))
+        else:
+            modifications.append((result, rpm_file['name']))
+    return files, modifications
+
+
+def _verify_rpms_cmd(rpms_to_check):
+    """
+    Get files of the given packages and verify them using the rpm command
+
+    See :func:`_verify_rpms_rpmdb`.
+    """
+    files = []
+    for pkg in rpms_to_check:
+        res = _run_command(['rpm', '-ql', pkg], 'Could not get a list of installed files from rpm {}'.format(pkg))
+        files.extend(res)
+
+    modifications = []
+    for pkg in rpms_to_check:
+        res = _run_command(
+                ['rpm', '-V', '--nomtime', pkg], 'Could not check authenticity of the files from {}'.format(pkg),
+                # NOTE(ivasilev) check is False here as in case of any changes found exit code will be 1
+                checked=False)
+        modifications.extend(tuple(modification_str.split()) for modification_str in res)
+    return files, modifications
+
+
 def check_for_modifications(component):
     """
     This will return a list of any untypical files or changes to shipped leapp files discovered on the system.
     An empty list means that no modifications have been found.
     """
-    rpms = _get_rpms_to_check(component)
+    rpms_to_check = _get_rpms_to_check(component)
     dirs = _get_dirs_to_check(component)
-    source_of_truth = []
-    leapp_files = []
-    # Let's collect data about what should have been installed from rpm
-    for rpm in rpms:
-        res = _run_command(['rpm', '-ql', rpm], 'Could not get a list of installed files from rpm {}'.format(rpm))
-        source_of_truth.extend(res)
+    # Let's collect data about what should have been installed from rpm and check for modifications
+    if rpm:
+        source_of_truth, modifications = _verify_rpms_rpmdb(rpms_to_check)
+    else:
+        source_of_truth, modifications = _verify_rpms_cmd(rpms_to_check)
     # Let's collect data about what's really on the system
-    for directory in dirs:
-        res = _run_command(['find', directory, '-type', 'f'],
-                           'Could not get a list of leapp files from {}'.format(directory))
-        leapp_files.extend(res)
+    leapp_files = _get_files_in_dirs(dirs)
     # Let's check for unexpected additions
     custom_files = sorted(set(leapp_files) - set(source_of_truth))
     # Now let's check for modifications
     modified_files = []
     modified_configs = []
-    for rpm in rpms:
-        res = _run_command(
-                ['rpm', '-V', '--nomtime', rpm], 'Could not check authenticity of the files from {}'.format(rpm),
-                # NOTE(ivasilev) check is False here as in case of any changes found exit code will be 1
-                checked=False)
-        if res:
-            api.current_logger().warning('Modifications to leapp files detected!\n%s', res)
-            for modification_str in res:
-                modification = tuple(modification_str.split())
-                if len(modification) == 3 and modification[1] == 'c':
-                    # Dealing with a configuration that will be displayed as ('S.5......', 'c', '/file/path')
-                    modified_configs.append(modification)
-                else:
-                    # Modification of any other rpm file detected
-                    modified_files.append(modification)
+    if modifications:
+        api.current_logger().warning(
+            'Modifications to leapp files detected!\n%s', '\n'.join(' '.join(m) for m in modifications))
+    for modification in modifications:
+        if len(modification) == 3 and modification[1] == 'c':
+            # Dealing with a configuration that will be displayed as ('S.5......', 'c', '/file/path')
+            modified_configs.append(modification)
+        else:
+            # Modification of any other rpm file detected
+            modified_files.append((modification[0], modification[-1]))
     return ([_modification_model(filename=f[1], component=component, rpm_checks_str=f[0], change_type='modified')
              # Let's filter out pyc files not to clutter the output as pyc will be present even in case of
              # a plain open & save-not-changed that we agreed not to react upon.
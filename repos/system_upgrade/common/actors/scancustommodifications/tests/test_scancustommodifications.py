@@ -1,7 +1,14 @@
+import grp
+import hashlib
+import os
+import pwd
+import stat
+
 import pytest
 
+from leapp.exceptions import StopActorExecution
 from leapp.libraries.actor import scancustommodifications
-from leapp.libraries.common.testutils import CurrentActorMocked, produce_mocked
+from leapp.libraries.common.testutils import CurrentActorMocked, logger_mocked, produce_mocked
 from leapp.libraries.stdlib import api
 
 FILES_FROM_RPM = """
@@ -60,9 +67,6 @@ def mocked__run_command(list_of_args, log_message, checked=True):
     if list_of_args == ['rpm', '-ql', 'leapp-upgrade-el8toel9']:
         # get source of truth
         return FILES_FROM_RPM.strip().split('\n')
-    if list_of_args and list_of_args[0] == 'find':
-        # listing files in directory
-        return FILES_ON_SYSTEM.strip().split('\n')
     if list_of_args == ['rpm', '-V', '--nomtime', 'leapp-upgrade-el8toel9']:
         # checking authenticity
         return VERIFIED_FILES.strip().split('\n')
@@ -72,6 +76,9 @@ def mocked__run_command(list_of_args, log_message, checked=True):
 def test_check_for_modifications(monkeypatch):
     monkeypatch.setattr(api, 'current_actor', CurrentActorMocked(arch='x86_64', src_ver='8.9', dst_ver='9.3'))
     monkeypatch.setattr(scancustommodifications, '_run_command', mocked__run_command)
+    monkeypatch.setattr(scancustommodifications, '_get_files_in_dirs',
+                        lambda dirs: FILES_ON_SYSTEM.strip().split('\n'))
+    monkeypatch.setattr(scancustommodifications, 'rpm', None)
     modifications = scancustommodifications.check_for_modifications('repository')
     modified = [m for m in modifications if m.type == 'modified']
     custom = [m for m in modifications if m.type == 'custom']
@@ -85,3 +92,179 @@ def test_check_for_modifications(monkeypatch):
     assert len(configurations) == 1
     assert configurations[0].filename == 'etc/leapp/files/pes-events.json'
     assert configurations[0].rpm_checks_str == 'S.5....T.'
+
+
+def test_deduce_actor_name_cached(monkeypatch, tmpdir):
+    parsed = []
+
+    def parse_actor_name_mocked(a_file):
+        parsed.append(a_file)
+        return os.path.basename(os.path.dirname(a_file))
+
+    monkeypatch.setattr(scancustommodifications, '_ACTOR_NAMES_CACHE', {})
+    monkeypatch.setattr(scancustommodifications, '_parse_actor_name', parse_actor_name_mocked)
+    actors_dir = tmpdir.mkdir('actors')
+    for actor in ('actor1', 'actor2'):
+        actors_dir.mkdir(actor).join('actor.py').write('')
+        actors_dir.join(actor).mkdir('libraries').join('{}.py'.format(actor)).write('')
+    os.utime(str(actors_dir), (0, 0))
+
+    for dummy_i in range(2):
+        for actor in ('actor1', 'actor2'):
+            for a_file in ('actor.py', 'libraries/{}.py'.format(actor)):
+                assert scancustommodifications.deduce_actor_name(str(actors_dir.join(actor, a_file))) == actor
+    assert sorted(parsed) == [str(actors_dir.join('actor1', 'actor.py')), str(actors_dir.join('actor2', 'actor.py'))]
+
+    # a new actor is parsed on its own, the other entries are kept
+    del parsed[:]
+    actors_dir.mkdir('actor3').join('actor.py').write('')
+    for actor in ('actor1', 'actor2', 'actor3'):
+        assert scancustommodifications.deduce_actor_name(str(actors_dir.join(actor, 'actor.py'))) == actor
+    assert parsed == [str(actors_dir.join('actor3', 'actor.py'))]
+
+    # an actor file modified in place is parsed again
+    del parsed[:]
+    actors_dir.join('actor1', 'actor.py').write('# modified')
+    os.utime(str(actors_dir.join('actor1', 'actor.py')), (0, 0))
+    for actor in ('actor1', 'actor2'):
+        assert scancustommodifications.deduce_actor_name(str(actors_dir.join(actor, 'actor.py'))) == actor
+    assert parsed == [str(actors_dir.join('actor1', 'actor.py'))]
+
+    # a removed actor is dropped from the index
+    actors_dir.join('actor2').remove()
+    os.utime(str(actors_dir), (1, 1))
+    assert scancustommodifications.deduce_actor_name(str(actors_dir.join('actor1', 'actor.py'))) == 'actor1'
+    assert sorted(scancustommodifications._ACTOR_NAMES_CACHE[str(actors_dir)][1]) == ['actor1', 'actor3']
+
+
+def _get_rpm_file(path, content, **kwargs):
+    st = os.lstat(path)
+    rpm_file = {
+        'name': path,
+        'flags': 0,
+        'verify_flags': scancustommodifications._RPMVERIFY_ALL,
+        'state': 0,
+        'digest': hashlib.sha256(content).hexdigest() if content is not None else '',
+        'digest_algorithm': 'sha256',
+        'mode': st.st_mode,
+        'size': len(content) if content is not None else st.st_size,
+        'linkto': '',
+        'user': pwd.getpwuid(st.st_uid)[0],
+        'group': grp.getgrgid(st.st_gid)[0],
+    }
+    rpm_file.update(kwargs)
+    return rpm_file
+
+
+def test_verify_file(tmpdir):
+    path = str(tmpdir.join('file'))
+    tmpdir.join('file').write_binary(b'content')
+    link = str(tmpdir.join('link'))
+    os.symlink('file', link)
+
+    assert scancustommodifications._verify_file(path, _get_rpm_file(path, b'content')) is None
+    assert scancustommodifications._verify_file(path, _get_rpm_file(path, b'other content')) == 'S.5......'
+    assert scancustommodifications._verify_file(path, _get_rpm_file(path, b'CONTENT')) == '..5......'
+    assert scancustommodifications._verify_file(
+        path, _get_rpm_file(path, b'CONTENT', verify_flags=0)) is None
+    assert scancustommodifications._verify_file(
+        path, _get_rpm_file(path, b'content', mode=stat.S_IFREG | 0o4755, user='nosuchuser')) == '.M...U...'
+
+    assert scancustommodifications._verify_file(link, _get_rpm_file(link, None, linkto='file')) is None
+    assert scancustommodifications._verify_file(link, _get_rpm_file(link, None, linkto='other')) == '....L....'
+
+    missing_file = _get_rpm_file(path, b'content', name=str(tmpdir.join('missing')))
+    assert scancustommodifications._verify_file(missing_file['name'], missing_file) == 'missing'
+    missing_file['flags'] = scancustommodifications._RPMFILE_MISSINGOK
+    assert scancustommodifications._verify_file(missing_file['name'], missing_file) is None
+
+
+class MockedRpmModule:
+    RPMTAG_FILENAMES = 'filenames'
+    RPMTAG_FILEDIGESTALGO = 'filedigestalgo'
+    RPMTAG_FILEFLAGS = 'fileflags'
+    RPMTAG_FILEVERIFYFLAGS = 'fileverifyflags'
+    RPMTAG_FILESTATES = 'filestates'
+    RPMTAG_FILEDIGESTS = 'filedigests'
+    RPMTAG_FILEMODES = 'filemodes'
+    RPMTAG_LONGFILESIZES = 'longfilesizes'
+    RPMTAG_FILELINKTOS = 'filelinktos'
+    RPMTAG_FILEUSERNAME = 'fileusername'
+    RPMTAG_FILEGROUPNAME = 'filegroupname'
+
+    def __init__(self, headers):
+        self.headers = headers
+        self.opened = 0
+        self.closed = 0
+
+    def TransactionSet(self):
+        self.opened += 1
+        return self
+
+    def dbMatch(self, tag, value):
+        assert tag == 'name'
+        return self.headers.get(value, [])
+
+    def closeDB(self):
+        self.closed += 1
+
+
+def _get_header(files):
+    """
+    Return mocked header of the package providing the given files
+
+    :param files: list of (path, content, flags, state) tuples; the metadata are taken from existing files
+    """
+    header = {tag: [] for tag in (
+        'filenames', 'fileflags', 'filestates', 'filedigests', 'filemodes', 'longfilesizes', 'filelinktos',
+        'fileusername', 'filegroupname')}
+    header['filedigestalgo'] = 8
+    header['fileverifyflags'] = []
+    for path, content, flags, state in files:
+        st = os.lstat(path) if os.path.exists(path) else os.lstat(os.path.dirname(path))
+        header['filenames'].append(path.encode('utf-8'))
+        header['fileflags'].append(flags)
+        header['filestates'].append(state)
+        header['filedigests'].append(hashlib.sha256(content).hexdigest())
+        header['filemodes'].append(stat.S_IFREG | stat.S_IMODE(st.st_mode))
+        header['longfilesizes'].append(len(content))
+        header['filelinktos'].append('')
+        header['fileusername'].append(pwd.getpwuid(st.st_uid)[0].encode('utf-8'))
+        header['filegroupname'].append(grp.getgrgid(st.st_gid)[0])
+    return header
+
+
+def test_verify_rpms_rpmdb(monkeypatch, tmpdir):
+    paths = {name: str(tmpdir.join(name)) for name in ('orig', 'modified', 'config', 'missing', 'ghost', 'excluded')}
+    for name in ('orig', 'config'):
+        tmpdir.join(name).write_binary(b'content')
+    tmpdir.join('modified').write_binary(b'CONTENT')
+
+    mocked_rpm = MockedRpmModule({
+        'pkg1': [_get_header([
+            (paths['orig'], b'content', 0, 0),
+            (paths['modified'], b'content', 0, 0),
+            (paths['config'], b'other content', scancustommodifications._RPMFILE_CONFIG, 0),
+        ])],
+        'pkg2': [_get_header([
+            (paths['missing'], b'content', 0, 0),
+            (paths['ghost'], b'content', scancustommodifications._RPMFILE_GHOST, 0),
+            # e.g. documentation excluded by tsflags=nodocs
+            (paths['excluded'], b'content', 0, 2),
+        ])],
+    })
+    monkeypatch.setattr(scancustommodifications, 'rpm', mocked_rpm)
+
+    files, modifications = scancustommodifications._verify_rpms_rpmdb(['pkg1', 'pkg2'])
+    assert files == [paths[name] for name in ('orig', 'modified', 'config', 'missing', 'ghost', 'excluded')]
+    assert modifications == [
+        ('..5......', paths['modified']),
+        ('S.5......', 'c', paths['config']),
+        ('missing', paths['missing']),
+    ]
+    assert mocked_rpm.opened == mocked_rpm.closed == 1
+
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    with pytest.raises(StopActorExecution):
+        scancustommodifications._verify_rpms_rpmdb(['pkg1', 'nosuchpkg'])
+    assert mocked_rpm.opened == mocked_rpm.closed == 2
@@ -1,6 +1,8 @@
 import os
+import stat
 
 from leapp.libraries.common.config.version import get_source_major_version
+from leapp.libraries.common.rpms import DEFAULT_DIGEST_ALGORITHM, DIGEST_ALGORITHMS, get_file_digest, rpm, to_str
 from leapp.libraries.stdlib import api, CalledProcessError, run
 from leapp.models import FileInfo, TrackedFilesInfoSource
 
@@ -71,7 +73,92 @@ def scan_file(input_file):
     return FileInfo(**data)
 
 
+def _is_modified_by_header(hdr, input_file):
+    """
+    Return True if the file digest differs from the one in the package header (or the file is missing).
+
+    The in-process equivalent of :func:`is_modified` for the given package.
+    """
+    filenames = [to_str(name) for name in hdr[rpm.RPMTAG_FILENAMES]]
+    try:
+        idx = filenames.index(input_file)
+    except ValueError:
+        # seatbelt - the file is owned by the package, so it should not happen
+        return is_modified(input_file)
+
+    if hdr[rpm.RPMTAG_FILEFLAGS][idx] & rpm.RPMFILE_GHOST:
+        # the content of ghost files is not verified
+        return False
+    if not os.path.lexists(input_file):
+        return True
+    return _is_digest_modified(hdr, idx, input_file)
+
+
+def _is_digest_modified(hdr, idx, input_file):
+    """
+    Return True if the digest of the existing file differs from the one of the idx-th file in the package header.
+    """
+    digest = to_str(hdr[rpm.RPMTAG_FILEDIGESTS][idx])
+    if not digest or not stat.S_ISREG(hdr[rpm.RPMTAG_FILEMODES][idx]):
+        # only regular files have digests
+        return False
+    algorithm = DIGEST_ALGORITHMS.get(hdr[rpm.RPMTAG_FILEDIGESTALGO] or DEFAULT_DIGEST_ALGORITHM)
+    if not algorithm:
+        return is_modified(input_file)
+    try:
+        return get_file_digest(input_file, algorithm) != digest
+    except EnvironmentError:
+        # rpm -V reports unreadable files as missing
+        return True
+
+
+def _scan_files_rpmdb(files):
+    """
+    Scan the files using the rpm python bindings
+
+    The RPM DB is opened just once for all files. Owners of files are found
+    using the RPM DB index and digests of files are verified in-process against
+    the digests stored in the package headers.
+
+    :return: List of FileInfo in the same order as the files
+    """
+    result = []
+    ts = rpm.TransactionSet()
+    try:
+        for input_file in files:
+            headers = list(ts.dbMatch(rpm.RPMTAG_BASENAMES, input_file))
+            rpm_names = [to_str(hdr[rpm.RPMTAG_NAME]) for hdr in headers]
+            if len(rpm_names) > 1:
+                # see _get_rpm_name
+                api.current_logger().warning(
+                    'The {} file is owned by multiple rpms: {}.'
+                    .format(input_file, ', '.join(rpm_names))
+                )
+            result.append(FileInfo(
+                path=input_file,
+                exists=os.path.exists(input_file),
+                rpm_name=rpm_names[0] if rpm_names else '',
+                is_modified=any(_is_modified_by_header(hdr, input_file) for hdr in headers),
+            ))
+    finally:
+        ts.closeDB()
+    return result
+
+
 def scan_files(files):
+    """
+    Scan the given files
+
+    All files are processed in batch using the rpm python bindings when available.
+    Otherwise the rpm command is executed for each file.
+
+    :return: List of FileInfo in the same order as the files
+    """
+    if rpm:
+        try:
+            return _scan_files_rpmdb(files)
+        except rpm.error as err:
+            api.current_logger().warning('Cannot query the RPM DB, using the rpm command: {}'.format(err))
     return [scan_file(fname) for fname in files]
 
 
@@ -1,4 +1,6 @@
+import hashlib
 import os
+import stat
 
 import pytest
 
@@ -104,10 +106,97 @@ def test_scan_files(monkeypatch, input_files):
         return FileInfo(path=input_file, **base_data)
 
     monkeypatch.setattr(scansourcefiles, 'scan_file', scan_file_mocked)
+    monkeypatch.setattr(scansourcefiles, 'rpm', None)
     expected_output_list = [FileInfo(path=input_file, **base_data) for input_file in input_files]
     assert scansourcefiles.scan_files(input_files) == expected_output_list
 
 
+class MockedRpmModule:
+    RPMTAG_NAME = 'name'
+    RPMTAG_BASENAMES = 'basenames'
+    RPMTAG_FILENAMES = 'filenames'
+    RPMTAG_FILEFLAGS = 'fileflags'
+    RPMTAG_FILEDIGESTS = 'filedigests'
+    RPMTAG_FILEMODES = 'filemodes'
+    RPMTAG_FILEDIGESTALGO = 'filedigestalgo'
+    RPMFILE_GHOST = 1 << 6
+
+    class error(Exception):
+        pass
+
+    def __init__(self, headers):
+        self.headers = headers
+        self.opened = 0
+        self.closed = 0
+
+    def TransactionSet(self):
+        self.opened += 1
+        return self
+
+    def dbMatch(self, tag, value):
+        assert tag == self.RPMTAG_BASENAMES
+        return [hdr for hdr in self.headers if value in hdr['filenames']]
+
+    def closeDB(self):
+        self.closed += 1
+
+
+def _get_header(name, files):
+    """
+    Return mocked header of the package providing the given files
+
+    :param files: list of (path, content, flags, mode) tuples
+    """
+    return {
+        'name': name,
+        'filenames': [path for path, dummy_content, dummy_flags, dummy_mode in files],
+        'fileflags': [flags for dummy_path, dummy_content, flags, dummy_mode in files],
+        'filedigests': [hashlib.sha256(content).hexdigest() if content is not None else ''
+                        for dummy_path, content, dummy_flags, dummy_mode in files],
+        'filemodes': [mode for dummy_path, dummy_content, dummy_flags, mode in files],
+        'filedigestalgo': 8,
+    }
+
+
+def test_scan_files_rpmdb(monkeypatch, tmpdir):
+    reg = stat.S_IFREG | 0o644
+    paths = {name: str(tmpdir.join(name)) for name in ('orig', 'modified', 'missing', 'ghost', 'link', 'unowned')}
+    for name in ('orig', 'modified', 'ghost', 'unowned'):
+        tmpdir.join(name).write_binary(b'modified' if name == 'modified' else b'content')
+    os.symlink('orig', paths['link'])
+
+    mocked_rpm = MockedRpmModule([
+        _get_header('pkg1', [
+            (paths['orig'], b'content', 0, reg),
+            (paths['modified'], b'content', 0, reg),
+            (paths['missing'], b'content', 0, reg),
+        ]),
+        _get_header('pkg2', [
+            (paths['ghost'], None, MockedRpmModule.RPMFILE_GHOST, reg),
+            (paths['link'], None, 0, stat.S_IFLNK | 0o777),
+            (paths['orig'], b'content', 0, reg),
+        ]),
+    ])
+    monkeypatch.setattr(scansourcefiles, 'rpm', mocked_rpm)
+    monkeypatch.setattr(scansourcefiles, 'run', None)
+    monkeypatch.setattr(api, 'current_logger', testutils.logger_mocked())
+
+    input_files = [paths[name] for name in ('orig', 'modified', 'missing', 'ghost', 'link', 'unowned')]
+    expected = [
+        FileInfo(path=paths['orig'], exists=True, rpm_name='pkg1', is_modified=False),
+        FileInfo(path=paths['modified'], exists=True, rpm_name='pkg1', is_modified=True),
+        FileInfo(path=paths['missing'], exists=False, rpm_name='pkg1', is_modified=True),
+        FileInfo(path=paths['ghost'], exists=True, rpm_name='pkg2', is_modified=False),
+        FileInfo(path=paths['link'], exists=True, rpm_name='pkg2', is_modified=False),
+        FileInfo(path=paths['unowned'], exists=True, rpm_name='', is_modified=False),
+    ]
+    assert scansourcefiles.scan_files(input_files) == expected
+    assert mocked_rpm.opened == mocked_rpm.closed == 1
+    assert api.current_logger.warnmsg == [
+        'The {} file is owned by multiple rpms: pkg1, pkg2.'.format(paths['orig'])
+    ]
+
+
 @pytest.mark.parametrize(
     'rhel_major_version', ['8', '9']
 )
@@ -44,25 +44,98 @@ UDICA_TEMPLATES = {"base_container", "config_container", "home_container", "log_
                    "net_container", "tmp_container", "tty_container", "virt_container", "x_container"}
 
 
-def check_module(name):
-    """
-    Check if given module contains one of removed types and comment out corresponding lines.
+_REMOVED_TYPES_REGEXES = {}
+"""
+Precompiled regular expressions matching removed types as whole words, see :func:`_get_removed_types_regex`.
+"""
+
+_CONTAINER_TYPES_REGEX = re.compile(
+    r'(?<!\w)(?:{})(?!\w)'.format('|'.join(re.escape(container_type) for container_type in CONTAINER_TYPES)))
+"""
+Regular expression matching types, attributes and booleans contained in container-selinux as whole words.
+"""
 
-    The function expects a text file "$name" containing cil policy
-    to be present in the current directory.
 
-    Returns a list of invalid lines.
+def _get_removed_types_regex():
+    """
+    Return a regular expression matching any of the types removed on the current upgrade path as a whole word
     """
     # get removed_types list based on upgrade path
-    removed_types = REMOVED_TYPES_EL7 if version.get_source_major_version() == "7" else REMOVED_TYPES_EL8
+    source_major = version.get_source_major_version()
+    if source_major not in _REMOVED_TYPES_REGEXES:
+        removed_types = REMOVED_TYPES_EL7 if source_major == "7" else REMOVED_TYPES_EL8
+        # the same as "grep -w" - the match can be neither preceded nor followed by a word constituent character
+        _REMOVED_TYPES_REGEXES[source_major] = re.compile(
+            r'(?<!\w)(?:{})(?!\w)'.format('|'.join(re.escape(removed_type) for removed_type in removed_types)))
+    return _REMOVED_TYPES_REGEXES[source_major]
+
+
+def _process_module(name):
+    """
+    Comment out lines of the given module containing one of removed types.
+
+    The module file is read only once and written back only when a line has been commented out.
+
+    Returns a tuple (content, removed) where "content" is the resulting content of the module
+    and "removed" is a list of invalid lines.
+    """
+    removed_types_regex = _get_removed_types_regex()
+    removed = []
+    lines = []
+    with open(name) as cil_file:
+        for line in cil_file:
+            if removed_types_regex.search(line):
+                removed.append(line.rstrip('\n'))
+                # Add ";" at the beginning of invalid lines (comment them out)
+                line = ';' + line
+            lines.append(line)
+
+    content = ''.join(lines)
+    if removed:
+        with open(name, 'w') as cil_file:
+            cil_file.write(content)
+    return (content, removed)
+
+
+def _uses_container_types(modules):
+    """
+    Check if any of the given modules or the "semanage" export uses a type, attribute or boolean of container-selinux
+
+    The export is expected to be stored in the "semanage" file in the current directory.
+    """
+    contents = [module.content for module in modules]
+    try:
+        with open('semanage') as semanage_file:
+            contents.append(semanage_file.read())
+    except (OSError, IOError):
+        pass
+    return any(_CONTAINER_TYPES_REGEX.search(content) for content in contents)
+
+
+def extract_modules(names, priority):
+    """
+    Extract the given modules installed on the given priority into cil files in the current directory
+
+    All modules are extracted using a single semodule invocation. In case it fails, the modules are
+    extracted one by one so that only the modules that could not be extracted are skipped.
 
+    Returns a list of names of the extracted modules.
+    """
+    cmd = ["semodule", "-c", "-X", priority]
+    for name in names:
+        cmd.extend(["-E", name])
     try:
-        removed = run(["grep", "-w", "-E", "|".join(removed_types), name], split=True)
-        # Add ";" at the beginning of invalid lines (comment them out)
-        run(["sed", "-i", "/{}/s/^/;/g".format(r"\|".join(removed_types)), name])
-        return removed.get("stdout", [])
+        run(cmd)
+        return names
     except CalledProcessError:
-        return []
+        if len(names) == 1:
+            api.current_logger().warning("Module {} could not be extracted!".format(names[0]))
+            return []
+
+    extracted = []
+    for name in names:
+        extracted.extend(extract_modules([name], priority))
+    return extracted
 
 
 def list_selinux_modules():
@@ -103,8 +176,6 @@ def get_selinux_modules():
     """
 
     modules = list_selinux_modules()
-    # custom selinux policy modules
-    semodule_list = []
     # udica templates
     template_list = []
     # list of rpms containing policy modules to be installed on RHEL 8
@@ -124,6 +195,8 @@ def get_selinux_modules():
         api.current_logger().warning("Failed to access working directory! Aborting.")
         return ([], [], [])
 
+    # custom modules to be extracted, grouped by priority
+    custom_modules = {}
     for (name, priority) in modules:
         # Udica templates should not be transferred, we only need a list of their
         # names and priorities so that we can reinstall their latest versions
@@ -142,40 +215,37 @@ def get_selinux_modules():
             # 100 - module from selinux-policy-* package
             # 200 - DSP module - installed by an RPM - handled by PES
             continue
-        # extract custom module and save it to SELinuxModule object
-        module_file = name + ".cil"
-        try:
-            run(["semodule", "-c", "-X", priority, "-E", name])
+        custom_modules.setdefault(priority, []).append(name)
+
+    # extract custom modules and save them to SELinuxModule objects
+    # modules on the same priority are extracted at once, as their names cannot clash
+    extracted_modules = {}
+    for priority, names in custom_modules.items():
+        for name in extract_modules(names, priority):
+            module_file = name + ".cil"
             # check if the module contains invalid types and remove them if so
-            removed = check_module(module_file)
-
-            # get content of the module
             try:
-                with open(module_file) as cil_file:
-                    module_content = cil_file.read()
-            except OSError as e:
+                module_content, removed = _process_module(module_file)
+            except (OSError, IOError) as e:
                 api.current_logger().warning("Error reading {}.cil : {}".format(name, e))
                 continue
 
-            semodule_list.append(
-                SELinuxModule(
-                    name=name,
-                    priority=int(priority),
-                    content=module_content,
-                    removed=removed,
-                )
-            )
-        except CalledProcessError:
-            api.current_logger().warning("Module {} could not be extracted!".format(name))
-            continue
-        # rename the cil module file so that it does not clash
-        # with the same module on different priority
-        try:
-            os.rename(module_file, "{}_{}".format(name, priority))
-        except OSError:
-            api.current_logger().warning(
-                "Failed to rename module file {} to include priority.".format(name)
+            extracted_modules[(name, priority)] = SELinuxModule(
+                name=name,
+                priority=int(priority),
+                content=module_content,
+                removed=removed,
             )
+            # rename the cil module file so that it does not clash
+            # with the same module on different priority
+            try:
+                os.rename(module_file, "{}_{}".format(name, priority))
+            except OSError:
+                api.current_logger().warning(
+                    "Failed to rename module file {} to include priority.".format(name)
+                )
+    # keep the order of modules as listed by semodule
+    semodule_list = [extracted_modules[module] for module in modules if module in extracted_modules]
 
     # Udica templates where moved to container-selinux package.
     # Make sure it is installed so that the templates can be reinstalled
@@ -190,14 +260,10 @@ def get_selinux_modules():
         pass
     # Check if modules contain any type, attribute, or boolean contained in container-selinux and install it if so
     # This is necessary since container policy module is part of selinux-policy-targeted in RHEL 7 (but not in RHEL 8)
-    try:
-        run(["grep", "-w", "-r", "-E", "|".join(CONTAINER_TYPES)], split=False)
+    if _uses_container_types(semodule_list):
         # Request "container-selinux" to be installed since container types where used in local customizations
         # and container-selinux policy was removed from selinux-policy-* packages
         install_rpms.append("container-selinux")
-    except CalledProcessError:
-        # expected, ignore exception
-        pass
 
     try:
         os.chdir(wd)
@@ -1,6 +1,11 @@
+import os
+
+import pytest
+
 from leapp.libraries.actor import selinuxcontentscanner
 from leapp.libraries.common.config import version
 from leapp.libraries.stdlib import CalledProcessError
+from leapp.models import SELinuxModule
 
 
 class run_mocked:
@@ -75,3 +80,87 @@ def test_get_selinux_customizations(monkeypatch):
     assert semanage_valid[1] == "port -a -t http_port_t -p udp 81"
     assert semanage_valid[2] == "fcontext -a -f a -t httpd_sys_content_t '/web(/.*)?'"
     assert semanage_removed == ["fcontext -a -f a -t cgdcbxd_exec_t '/ganesha(/.*)?'"]
+
+
+@pytest.mark.parametrize('source_major,removed', [
+    ('7', ['(type cgdcbxd_exec_t)', '(allow ganesha_t self (file (read)))']),
+    ('8', ['(type cgdcbxd_exec_t)', '(typeattributeset file_type (cephfs_t))']),
+])
+def test_process_module(monkeypatch, tmpdir, source_major, removed):
+    monkeypatch.setattr(version, "get_source_major_version", lambda: source_major)
+    monkeypatch.setattr(selinuxcontentscanner, "_REMOVED_TYPES_REGEXES", {})
+    monkeypatch.chdir(str(tmpdir))
+    content = [
+        '(type mock_type_t)',
+        '(type cgdcbxd_exec_t)',
+        '(type cgdcbxd_exec_t_custom)',
+        '(allow ganesha_t self (file (read)))',
+        '(typeattributeset file_type (cephfs_t))',
+    ]
+    tmpdir.join('mock.cil').write('\n'.join(content) + '\n')
+
+    expected_content = ''.join('{}{}\n'.format(';' if line in removed else '', line) for line in content)
+    assert selinuxcontentscanner._process_module('mock.cil') == (expected_content, removed)
+    assert tmpdir.join('mock.cil').read() == expected_content
+    with pytest.raises((OSError, IOError)):
+        selinuxcontentscanner._process_module('missing.cil')
+
+
+def test_uses_container_types(monkeypatch, tmpdir):
+    monkeypatch.chdir(str(tmpdir))
+
+    def module(content):
+        return SELinuxModule(name='mock', priority=400, content=content, removed=[])
+
+    assert selinuxcontentscanner._uses_container_types([module('(allow container_runtime_t self (file (read)))')])
+    assert not selinuxcontentscanner._uses_container_types([module('(type container_runtime_t_custom)')])
+    assert not selinuxcontentscanner._uses_container_types([])
+
+    tmpdir.join('semanage').write('boolean -m -1 container_connect_any\n')
+    assert selinuxcontentscanner._uses_container_types([])
+
+
+class run_mocked_extract:
+    def __init__(self, failing=()):
+        self.extract_calls = []
+        self.failing = failing
+
+    def __call__(self, args, split=False):
+        if args == ['semodule', '-lfull']:
+            return {'stdout': ['400 mock1 cil', '999 mock3 cil', '400 mock2 cil', '200 base_container cil',
+                               '99 mock1 cil', '100 compat cil']}
+        if args[:3] == ['semodule', '-c', '-X'] and args[4:]:
+            self.extract_calls.append(args)
+            names = args[5::2]
+            if any(name in self.failing for name in names):
+                raise CalledProcessError('Mock error', args, {'exit_code': 1})
+            mock_modules_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_modules')
+            for name in names:
+                with open(os.path.join(mock_modules_dir, name + '.cil')) as src, open(name + '.cil', 'w') as dst:
+                    dst.write(src.read())
+            return {'stdout': ''}
+        if args == ['semanage', 'export', '-f', 'semanage']:
+            return {'stdout': ''}
+        assert False, 'run_mocked_extract: Called unexpected cmd not covered by test: {}'.format(args)
+        return None
+
+
+@pytest.mark.parametrize('failing,extract_calls,modules', [
+    ((), 3, [('mock1', 400, 0), ('mock3', 999, 0), ('mock2', 400, 0), ('mock1', 99, 0)]),
+    (('mock2',), 5, [('mock1', 400, 0), ('mock3', 999, 0), ('mock1', 99, 0)]),
+])
+def test_get_selinux_modules(monkeypatch, tmpdir, failing, extract_calls, modules):
+    monkeypatch.setattr(version, "get_source_major_version", lambda: '8')
+    monkeypatch.setattr(selinuxcontentscanner, "WORKING_DIRECTORY", str(tmpdir.join('selinux')))
+    run = run_mocked_extract(failing)
+    monkeypatch.setattr(selinuxcontentscanner, "run", run)
+    monkeypatch.chdir(str(tmpdir))
+
+    semodule_list, template_list, install_rpms = selinuxcontentscanner.get_selinux_modules()
+
+    # modules with the same priority are extracted at once
+    assert len(run.extract_calls) == extract_calls
+    assert [(module.name, module.priority, len(module.removed)) for module in semodule_list] == modules
+    assert all(module.content for module in semodule_list)
+    assert [(module.name, module.priority) for module in template_list] == [('base_container', 200)]
+    assert install_rpms == ['container-selinux']
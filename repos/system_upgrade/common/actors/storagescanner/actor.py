@@ -9,7 +9,7 @@ class StorageScanner(Actor):
     """
     Provides data about storage settings.
 
-    After collecting data from tools like mount, lsblk, pvs, vgs and lvdisplay, and relevant files
+    After collecting data from tools like mount, lsblk and lvm (or pvs, vgs and lvdisplay), and relevant files
     under /proc/partitions and /etc/fstab, a message with relevant data will be produced.
     """
 
@@ -1,6 +1,9 @@
 import functools
+import json
 import os
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pyudev
 
@@ -18,6 +21,16 @@ from leapp.models import (
     VgsEntry
 )
 
+LVM_REPORT_FIELDS = {
+    'pv': ['pv_name', 'vg_name', 'pv_fmt', 'pv_attr', 'pv_size', 'pv_free'],
+    'vg': ['vg_name', 'pv_count', 'lv_count', 'snap_count', 'vg_attr', 'vg_size', 'vg_free'],
+    'lv': ['lv_name', 'vg_name', 'lv_attr', 'lv_size', 'pool_lv', 'origin', 'data_percent', 'metadata_percent',
+           'move_pv', 'mirror_log', 'copy_percent', 'convert_lv'],
+}
+"""
+Fields reported by lvm fullreport - the same as the default columns of the pvs, vgs and lvdisplay -C commands.
+"""
+
 
 def aslist(f):
     """ Decorator used to convert generator to list """
@@ -32,11 +45,11 @@ def _is_file_readable(path):
     return os.path.isfile(path) and os.access(path, os.R_OK)
 
 
-def _get_cmd_output(cmd, delim, expected_len):
-    """ Verify if command exists and return output """
+def _run_cmd(cmd):
+    """ Verify if command exists and return output or None if the command is not found or fails """
     if not any(os.access(os.path.join(path, cmd[0]), os.X_OK) for path in os.environ['PATH'].split(os.pathsep)):
         api.current_logger().warning("'%s': command not found", cmd[0])
-        return
+        return None
 
     try:
         # FIXME: Will keep call to subprocess until our stdlib supports "env" parameter
@@ -50,10 +63,18 @@ def _get_cmd_output(cmd, delim, expected_len):
             " ".join(cmd),
             e.returncode
         )
-        return
+        return None
 
     if bytes is not str:
         output = output.decode('utf-8')
+    return output
+
+
+def _get_cmd_output(cmd, delim, expected_len):
+    """ Verify if command exists and return output """
+    output = _run_cmd(cmd)
+    if output is None:
+        return
 
     for entry in output.split('\n'):
         entry = entry.strip()
@@ -168,37 +189,60 @@ def _get_mount_info(path):
             )
 
 
-def _get_lsblk_info_for_devpath(dev_path):
-    lsblk_cmd = ['lsblk', '-nr', '--output', 'NAME,KNAME,SIZE', dev_path]
-    lsblk_info_for_devpath = next(_get_cmd_output(lsblk_cmd, ' ', 3), None)
+def _get_device_name(dev_path):
+    """
+    Get the device name as printed by lsblk from the device path printed by lsblk -p
 
-    return lsblk_info_for_devpath
+    lsblk -p prints /dev/mapper/<name> for device mapper devices and /dev/<name> for other devices,
+    where '!' in the name (e.g. cciss!c0d0) is replaced by '/'.
+    """
+    if dev_path.startswith('/dev/mapper/'):
+        return dev_path[len('/dev/mapper/'):]
+    if dev_path.startswith('/dev/'):
+        return dev_path[len('/dev/'):].replace('/', '!')
+    return os.path.basename(dev_path)
+
+
+def _get_human_readable_size(bsize):
+    """
+    Convert the size in bytes to the human readable format in the same way as lsblk does (e.g. 39G, 1.5M, 512B)
+    """
+    exp = 0
+    while exp < 60 and bsize >= 1 << (exp + 10):
+        exp += 10
+    dec, frac = divmod(bsize, 1 << exp)
+    if frac:
+        # round to one digit after the decimal point
+        frac = (frac * 1000 // (1 << exp) + 50) // 100
+        if frac == 10:
+            dec += 1
+            frac = 0
+    suffix = 'BKMGTPE'[exp // 10]
+    if frac:
+        return '{}.{}{}'.format(dec, frac, suffix)
+    return '{}{}'.format(dec, suffix)
 
 
 @aslist
 def _get_lsblk_info():
     """ Collect storage info from lsblk command """
-    cmd = ['lsblk', '-pbnr', '--output', 'NAME,MAJ:MIN,RM,SIZE,RO,TYPE,MOUNTPOINT,PKNAME']
-    for entry in _get_cmd_output(cmd, ' ', 8):
-        dev_path, maj_min, rm, bsize, ro, tp, mountpoint, parent_path = entry
-
-        lsblk_info_for_devpath = _get_lsblk_info_for_devpath(dev_path)
-        if not lsblk_info_for_devpath:
-            return
-        name, kname, size = lsblk_info_for_devpath
+    cmd = ['lsblk', '-pbnr', '--output', 'NAME,KNAME,MAJ:MIN,RM,SIZE,RO,TYPE,MOUNTPOINT,PKNAME']
+    entries = list(_get_cmd_output(cmd, ' ', 9))
+    # PKNAME is the kernel name of the parent device, map it to the name of the parent device
+    names = {kname_path: _get_device_name(dev_path) for dev_path, kname_path in (entry[:2] for entry in entries)}
+    for entry in entries:
+        dev_path, kname_path, maj_min, rm, bsize, ro, tp, mountpoint, parent_path = entry
 
         parent_name = ""
         if parent_path:
-            parent_info = _get_lsblk_info_for_devpath(parent_path)
-            if parent_info:
-                parent_name, _, _ = parent_info
+            parent_name = names.get(parent_path) or _get_device_name(parent_path)
 
         yield LsblkEntry(
-            name=name,
-            kname=kname,
+            name=_get_device_name(dev_path),
+            kname=_get_device_name(kname_path),
             maj_min=maj_min,
             rm=rm,
-            size=size,
+            size=_get_human_readable_size(int(bsize)),
             bsize=int(bsize),
             ro=ro,
             tp=tp,
@@ -256,6 +300,83 @@ def _get_lvdisplay_info():
             convert=convert)
 
 
+def _get_lvm_fullreport():
+    """
+    Get the pv, vg and lv reports of all volume groups using a single lvm fullreport command
+
+    :return: A dict mapping the report type (pv, vg, lv) to the list of reported entries
+             or None if the command fails
+    """
+    cmd = ['lvm', 'fullreport', '--reportformat', 'json']
+    for report_type, fields in LVM_REPORT_FIELDS.items():
+        cmd += ['--configreport', report_type, '-o', ','.join(fields)]
+    output = _run_cmd(cmd)
+    if output is None:
+        return None
+    try:
+        reports = json.loads(output)['report']
+    except (ValueError, KeyError, TypeError) as e:
+        api.current_logger().debug('Cannot parse the output of lvm fullreport: %s', e)
+        return None
+
+    result = {report_type: [] for report_type in LVM_REPORT_FIELDS}
+    # the fullreport contains one report per each volume group (and one for orphan PVs)
+    for report in reports:
+        for report_type, entries in result.items():
+            entries.extend(report.get(report_type, []))
+    return result
+
+
+def _get_lvm_info():
+    """
+    Collect storage info from lvm fullreport command
+
+    The same info as provided by the pvs, vgs and lvdisplay commands is returned. In case the fullreport
+    is not available, these commands are used instead.
+
+    :return: A tuple (pvs, vgs, lvdisplay)
+    """
+    report = _get_lvm_fullreport()
+    if report is None:
+        return _get_pvs_info(), _get_vgs_info(), _get_lvdisplay_info()
+
+    def _values(entry, report_type):
+        return [str(entry.get(field, '')) for field in LVM_REPORT_FIELDS[report_type]]
+
+    pvs = []
+    # sorted in the same way as by pvs, vgs and lvdisplay
+    for entry in sorted(report['pv'], key=lambda entry: entry.get('pv_name', '')):
+        pv, vg, fmt, attr, psize, pfree = _values(entry, 'pv')
+        pvs.append(PvsEntry(pv=pv, vg=vg, fmt=fmt, attr=attr, psize=psize, pfree=pfree))
+
+    vgs = []
+    for entry in sorted(report['vg'], key=lambda entry: entry.get('vg_name', '')):
+        vg, pv, lv, sn, attr, vsize, vfree = _values(entry, 'vg')
+        vgs.append(VgsEntry(vg=vg, pv=pv, lv=lv, sn=sn, attr=attr, vsize=vsize, vfree=vfree))
+
+    lvdisplay = []
+    for entry in sorted(report['lv'], key=lambda entry: (entry.get('vg_name', ''), entry.get('lv_name', ''))):
+        lv, vg, attr, lsize, pool, origin, data, meta, move, log, cpy_sync, convert = _values(entry, 'lv')
+        if lv.startswith('['):
+            # hidden (internal) logical volumes are not displayed by lvdisplay
+            continue
+        lvdisplay.append(LvdisplayEntry(
+            lv=lv,
+            vg=vg,
+            attr=attr,
+            lsize=lsize,
+            pool=pool,
+            origin=origin,
+            data=data,
+            meta=meta,
+            move=move,
+            log=log,
+            cpy_sync=cpy_sync,
+            convert=convert))
+
+    return pvs, vgs, lvdisplay
+
+
 @aslist
 def _get_systemd_mount_info():
     """
@@ -280,14 +401,38 @@ def _get_systemd_mount_info():
         )
 
 
+def _timed_probe(name, probe, *args):
+    """ Run the storage probe and log how long it took """
+    start = time.time()
+    try:
+        return probe(*args)
+    finally:
+        api.current_logger().debug('Collecting %s info took %.3fs', name, time.time() - start)
+
+
 def get_storage_info():
     """ Collect multiple info about storage and return it """
+    # Probes calling external commands or udev are independent, so they are executed concurrently.
+    # Files are parsed in the current thread, as it is fast and the fstab parsing can create a report.
+    probes = {
+        'lsblk': _get_lsblk_info,
+        'lvm': _get_lvm_info,
+        'systemd mount': _get_systemd_mount_info,
+    }
+    with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+        futures = {name: executor.submit(_timed_probe, name, probe) for name, probe in probes.items()}
+        partitions = _timed_probe('partitions', _get_partitions_info, '/proc/partitions')
+        fstab = _timed_probe('fstab', _get_fstab_info, '/etc/fstab')
+        mount = _timed_probe('mount', _get_mount_info, '/proc/mounts')
+        results = {name: future.result() for name, future in futures.items()}
+
+    pvs, vgs, lvdisplay = results['lvm']
     return StorageInfo(
-        partitions=_get_partitions_info('/proc/partitions'),
-        fstab=_get_fstab_info('/etc/fstab'),
-        mount=_get_mount_info('/proc/mounts'),
-        lsblk=_get_lsblk_info(),
-        pvs=_get_pvs_info(),
-        vgs=_get_vgs_info(),
-        lvdisplay=_get_lvdisplay_info(),
-        systemdmount=_get_systemd_mount_info())
+        partitions=partitions,
+        fstab=fstab,
+        mount=mount,
+        lsblk=results['lsblk'],
+        pvs=pvs,
+        vgs=vgs,
+        lvdisplay=lvdisplay,
+        systemdmount=results['systemd mount'])
@@ -1,6 +1,8 @@
 import functools
+import json
 import os
 
+import pytest
 import pyudev
 
 from leapp import reporting
@@ -14,6 +16,7 @@ from leapp.models import (
     MountEntry,
     PartitionEntry,
     PvsEntry,
+    StorageInfo,
     SystemdMountEntry,
     VgsEntry
 )
@@ -255,41 +258,21 @@ def test_get_lsblk_info(monkeypatch):
     bytes_per_gb = 1 << 30
 
     def get_cmd_output_mocked(cmd, delim, expected_len):
-        if cmd == ['lsblk', '-pbnr', '--output', 'NAME,MAJ:MIN,RM,SIZE,RO,TYPE,MOUNTPOINT,PKNAME']:
+        if cmd == ['lsblk', '-pbnr', '--output', 'NAME,KNAME,MAJ:MIN,RM,SIZE,RO,TYPE,MOUNTPOINT,PKNAME']:
             output_lines_split_on_whitespace = [
-                ['/dev/vda', '252:0', '0', str(40 * bytes_per_gb), '0', 'disk', '', ''],
-                ['/dev/vda1', '252:1', '0', str(1 * bytes_per_gb), '0', 'part', '/boot', ''],
-                ['/dev/vda2', '252:2', '0', str(39 * bytes_per_gb), '0', 'part', '', ''],
-                ['/dev/mapper/rhel_ibm--p8--kvm--03--guest--02-root', '253:0', '0', str(38 * bytes_per_gb), '0', 'lvm',
-                    '/', ''],
-                ['/dev/mapper/rhel_ibm--p8--kvm--03--guest--02-swap', '253:1', '0', str(1 * bytes_per_gb), '0', 'lvm',
-                    '[SWAP]', ''],
-                ['/dev/mapper/luks-01b60fff-a2a8-4c03-893f-056bfc3f06f6', '254:0', '0', str(38 * bytes_per_gb), '0',
-                    'crypt', '', '/dev/nvme0n1p1'],
-                ['/dev/nvme0n1p1', '259:1', '0', str(39 * bytes_per_gb), '0', 'part', '', '/dev/nvme0n1'],
+                ['/dev/vda', '/dev/vda', '252:0', '0', str(40 * bytes_per_gb), '0', 'disk', '', ''],
+                ['/dev/vda1', '/dev/vda1', '252:1', '0', str(1 * bytes_per_gb), '0', 'part', '/boot', ''],
+                ['/dev/vda2', '/dev/vda2', '252:2', '0', str(39 * bytes_per_gb), '0', 'part', '', ''],
+                ['/dev/mapper/rhel_ibm--p8--kvm--03--guest--02-root', '/dev/kname1', '253:0', '0',
+                    str(38 * bytes_per_gb), '0', 'lvm', '/', ''],
+                ['/dev/mapper/rhel_ibm--p8--kvm--03--guest--02-swap', '/dev/kname2', '253:1', '0',
+                    str(1 * bytes_per_gb), '0', 'lvm', '[SWAP]', ''],
+                ['/dev/mapper/luks-01b60fff-a2a8-4c03-893f-056bfc3f06f6', '/dev/dm-0', '254:0', '0',
+                    str(38 * bytes_per_gb), '0', 'crypt', '', '/dev/nvme0n1p1'],
+                ['/dev/nvme0n1p1', '/dev/nvme0n1p1', '259:1', '0', str(39 * bytes_per_gb), '0', 'part', '',
+                    '/dev/nvme0n1'],
             ]
             yield from output_lines_split_on_whitespace
-        elif len(cmd) == 5 and cmd[:4] == ['lsblk', '-nr', '--output', 'NAME,KNAME,SIZE']:
-            # We cannot have the output in a list, since the command is called per device. Therefore, we have to map
-            # each device path to its output.
-            output_lines_split_on_whitespace_per_device = {
-                '/dev/vda': ['vda', 'vda', '40G'],
-                '/dev/vda1': ['vda1', 'vda1', '1G'],
-                '/dev/vda2': ['vda2', 'vda2', '39G'],
-                '/dev/mapper/rhel_ibm--p8--kvm--03--guest--02-root':
-                    ['rhel_ibm--p8--kvm--03--guest--02-root', 'kname1', '38G'],
-                '/dev/mapper/rhel_ibm--p8--kvm--03--guest--02-swap':
-                    ['rhel_ibm--p8--kvm--03--guest--02-swap', 'kname2', '1G'],
-                '/dev/mapper/luks-01b60fff-a2a8-4c03-893f-056bfc3f06f6':
-                    ['luks-01b60fff-a2a8-4c03-893f-056bfc3f06f6', 'dm-0', '38G'],
-                '/dev/nvme0n1p1': ['nvme0n1p1', 'nvme0n1p1', '39G'],
-                '/dev/nvme0n1': ['nvme0n1', 'nvme0n1', '40G'],
-            }
-            dev_path = cmd[4]
-            if dev_path not in output_lines_split_on_whitespace_per_device:
-                raise ValueError('Attempting to call lsblk on an unexpected device: {}'.format(dev_path))
-            yield output_lines_split_on_whitespace_per_device[dev_path]
-
         else:
             raise ValueError('Attempting to call unexpected command: {}'.format(cmd))
 
@@ -385,6 +368,30 @@ def test_get_lsblk_info(monkeypatch):
     assert expected == actual
 
 
+@pytest.mark.parametrize('bsize,size', [
+    (0, '0B'),
+    (512, '512B'),
+    (1024, '1K'),
+    (1536, '1.5K'),
+    (1048064, '1023.5K'),
+    (1073741312, '1024M'),
+    (521142272, '497M'),
+    (274877906944, '256G'),
+    (2 * (1 << 40) + 100 * (1 << 30), '2.1T'),
+])
+def test_get_human_readable_size(bsize, size):
+    assert storagescanner._get_human_readable_size(bsize) == size
+
+
+@pytest.mark.parametrize('dev_path,name', [
+    ('/dev/vda1', 'vda1'),
+    ('/dev/mapper/rhel-root', 'rhel-root'),
+    ('/dev/cciss/c0d0', 'cciss!c0d0'),
+])
+def test_get_device_name(dev_path, name):
+    assert storagescanner._get_device_name(dev_path) == name
+
+
 def test_get_pvs_info(monkeypatch):
     def get_cmd_output_mocked(cmd, delim, expected_len):
         return [
@@ -457,6 +464,84 @@ def test_get_lvdisplay_info(monkeypatch):
     assert expected == storagescanner._get_lvdisplay_info()
 
 
+LVM_FULLREPORT = {
+    'report': [
+        {
+            'vg': [{'vg_name': 'rhel', 'pv_count': '1', 'lv_count': '2', 'snap_count': '0', 'vg_attr': 'wz--n-',
+                    'vg_size': '<39.00g', 'vg_free': '4.00m'}],
+            'pv': [{'pv_name': '/dev/vda2', 'vg_name': 'rhel', 'pv_fmt': 'lvm2', 'pv_attr': 'a--',
+                    'pv_size': '<39.00g', 'pv_free': '4.00m'}],
+            'lv': [{'lv_name': 'swap', 'vg_name': 'rhel', 'lv_attr': '-wi-ao----', 'lv_size': '1.00g', 'pool_lv': '',
+                    'origin': '', 'data_percent': '', 'metadata_percent': '', 'move_pv': '', 'mirror_log': '',
+                    'copy_percent': '', 'convert_lv': ''},
+                   {'lv_name': '[lvol0_pmspare]', 'vg_name': 'rhel', 'lv_attr': 'ewi-------', 'lv_size': '4.00m',
+                    'pool_lv': '', 'origin': '', 'data_percent': '', 'metadata_percent': '', 'move_pv': '',
+                    'mirror_log': '', 'copy_percent': '', 'convert_lv': ''},
+                   {'lv_name': 'root', 'vg_name': 'rhel', 'lv_attr': '-wi-ao----', 'lv_size': '37.99g', 'pool_lv': '',
+                    'origin': '', 'data_percent': '', 'metadata_percent': '', 'move_pv': '', 'mirror_log': '',
+                    'copy_percent': '', 'convert_lv': ''}],
+            'pvseg': [],
+            'seg': [],
+        },
+        {
+            # orphan PVs
+            'vg': [],
+            'pv': [{'pv_name': '/dev/vdb', 'vg_name': '', 'pv_fmt': 'lvm2', 'pv_attr': '---', 'pv_size': '10.00g',
+                    'pv_free': '10.00g'}],
+            'lv': [],
+            'pvseg': [],
+            'seg': [],
+        },
+    ]
+}
+
+
+def test_get_lvm_info(monkeypatch):
+    def run_cmd_mocked(cmd):
+        assert cmd[:4] == ['lvm', 'fullreport', '--reportformat', 'json']
+        return json.dumps(LVM_FULLREPORT)
+
+    monkeypatch.setattr(storagescanner, '_run_cmd', run_cmd_mocked)
+    pvs, vgs, lvdisplay = storagescanner._get_lvm_info()
+
+    assert pvs == [
+        PvsEntry(pv='/dev/vda2', vg='rhel', fmt='lvm2', attr='a--', psize='<39.00g', pfree='4.00m'),
+        PvsEntry(pv='/dev/vdb', vg='', fmt='lvm2', attr='---', psize='10.00g', pfree='10.00g')]
+    assert vgs == [VgsEntry(vg='rhel', pv='1', lv='2', sn='0', attr='wz--n-', vsize='<39.00g', vfree='4.00m')]
+    # hidden LVs are skipped and LVs are sorted by the name
+    assert [lv.lv for lv in lvdisplay] == ['root', 'swap']
+    assert lvdisplay[0] == LvdisplayEntry(
+        lv='root', vg='rhel', attr='-wi-ao----', lsize='37.99g', pool='', origin='', data='', meta='', move='',
+        log='', cpy_sync='', convert='')
+
+
+@pytest.mark.parametrize('output', [None, 'invalid', '{}'])
+def test_get_lvm_info_fallback(monkeypatch, output):
+    monkeypatch.setattr(storagescanner, '_run_cmd', lambda cmd: output)
+    monkeypatch.setattr(storagescanner, '_get_pvs_info', lambda: ['pvs'])
+    monkeypatch.setattr(storagescanner, '_get_vgs_info', lambda: ['vgs'])
+    monkeypatch.setattr(storagescanner, '_get_lvdisplay_info', lambda: ['lvdisplay'])
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+
+    assert storagescanner._get_lvm_info() == (['pvs'], ['vgs'], ['lvdisplay'])
+
+
+def test_get_storage_info(monkeypatch):
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    monkeypatch.setattr(storagescanner, '_get_partitions_info', lambda path: ['partitions'])
+    monkeypatch.setattr(storagescanner, '_get_fstab_info', lambda path: ['fstab'])
+    monkeypatch.setattr(storagescanner, '_get_mount_info', lambda path: ['mount'])
+    monkeypatch.setattr(storagescanner, '_get_lsblk_info', lambda: ['lsblk'])
+    monkeypatch.setattr(storagescanner, '_get_lvm_info', lambda: (['pvs'], ['vgs'], ['lvdisplay']))
+    monkeypatch.setattr(storagescanner, '_get_systemd_mount_info', lambda: ['systemdmount'])
+
+    assert storagescanner.get_storage_info() == StorageInfo(
+        partitions=['partitions'], fstab=['fstab'], mount=['mount'], lsblk=['lsblk'], pvs=['pvs'], vgs=['vgs'],
+        lvdisplay=['lvdisplay'], systemdmount=['systemdmount'])
+    # every probe is timed
+    assert api.current_logger.dbgmsg.count('Collecting %s info took %.3fs') == 6
+
+
 def test_get_systemd_mount_info(monkeypatch):
 
     class UdevDeviceMocked:
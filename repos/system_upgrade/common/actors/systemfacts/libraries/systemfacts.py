@@ -5,6 +5,7 @@ import logging
 import os
 import pwd
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 import six
 
@@ -115,60 +116,135 @@ def get_system_groups_status():
     return GroupsFacts(groups=_get_system_groups())
 
 
-@aslist
-def _get_active_kernel_modules(logger):
-    lines = run(['lsmod'], split=True)['stdout']
-    for l in lines[1:]:
-        name = l.split(' ')[0]
-
-        # Read parameters of the given module as exposed by the
-        # `/sys` VFS, if there are no parameters exposed we just
-        # take the name of the module
-        base_path = '/sys/module/{module}'.format(module=name)
-        parameters_path = os.path.join(base_path, 'parameters')
-        if not os.path.exists(parameters_path):
-            yield ActiveKernelModule(filename=name, parameters=[])
+_KERNEL_MODULE_PARAMETERS_READ_WORKERS = 4
+
+
+def _get_kernel_module_name_from_path(path):
+    name = os.path.basename(path)
+    for suffix in ('.xz', '.zst', '.gz'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    if name.endswith('.ko'):
+        name = name[:-len('.ko')]
+    return name.replace('-', '_')
+
+
+def _parse_modinfo_output(lines):
+    """
+    Parse the output of `modinfo` called for multiple modules.
+
+    :return: Fields of modules as {module_name: {field: value}}. Multiline
+        values (e.g. signature) are joined into one line.
+    """
+    modules = {}
+    module = None
+    key = None
+    for line in lines:
+        if line[:1].isspace():
+            # continuation of the previous field
+            if module is not None and key:
+                modules[module][key] += line.strip()
             continue
+        key, _, value = line.partition(':')
+        value = value.strip()
+        if key == 'filename':
+            module = _get_kernel_module_name_from_path(value)
+            modules[module] = {}
+        if module is not None and key not in modules[module]:
+            modules[module][key] = value
+    # the name field is more reliable than the name of the file
+    return {fields.get('name', name): fields for name, fields in modules.items()}
+
+
+def _get_kernel_modules_signatures(names):
+    """
+    Get signatures of the given kernel modules using a single `modinfo` call.
 
-        # Use `modinfo` to probe for signature information
-        parameter_dict = {}
-        try:
-            signature = run(['modinfo', '-F', 'signature', name], split=False)['stdout']
-        except CalledProcessError:
-            signature = None
+    :return: The signature of each module without whitespaces, or None if
+        the module is not signed or the information is not available.
+    :rtype: dict[str, Optional[str]]
+    """
+    if not names:
+        return {}
+    # modinfo fails when any of the modules cannot be found, but still prints info about the rest
+    lines = run(['modinfo'] + names, split=True, checked=False)['stdout']
+    modules = _parse_modinfo_output(lines)
+    signatures = {}
+    for name in names:
+        signature = modules.get(name, {}).get('signature')
+        # Remove whitespace from the signature string
+        signatures[name] = re.sub(r"\s+", "", signature, flags=re.UNICODE) if signature else None
+    return signatures
+
+
+def _read_kernel_module_parameter(path):
+    """
+    Read the value of the kernel module parameter.
 
-        signature_string = None
-        if signature:
-            # Remove whitespace from the signature string
-            signature_string = re.sub(r"\s+", "", signature, flags=re.UNICODE)
+    :return: The value or None if the parameter is write-only.
+    """
+    try:
+        with open(path, mode='r') as fp:
+            return fp.read().strip()
+    except IOError as exc:
+        if exc.errno in (errno.EACCES, errno.EPERM):
+            return None
+        raise exc
 
-        # Since we're using the `/sys` VFS we need to use `os.listdir()` to get
-        # all the property names and then just read from all the listed paths
-        parameters = sorted(os.listdir(parameters_path))
-        for param in parameters:
-            try:
-                with open(os.path.join(parameters_path, param), mode='r') as fp:
-                    parameter_dict[param] = fp.read().strip()
-            except IOError as exc:
-                # Some parameters are write-only, in that case we just log the name of parameter
-                # and the module and continue
-                if exc.errno in (errno.EACCES, errno.EPERM):
+
+@aslist
+def _get_active_kernel_modules(logger):
+    lines = run(['lsmod'], split=True)['stdout']
+    names = [l.split(' ')[0] for l in lines[1:]]
+
+    # Read parameters of the given module as exposed by the
+    # `/sys` VFS, if there are no parameters exposed we just
+    # take the name of the module
+    # Since we're using the `/sys` VFS we need to use `os.listdir()` to get
+    # all the property names and then just read from all the listed paths
+    parameters = {}
+    for name in names:
+        parameters_path = os.path.join('/sys/module/{module}'.format(module=name), 'parameters')
+        if os.path.exists(parameters_path):
+            parameters[name] = [
+                (param, os.path.join(parameters_path, param)) for param in sorted(os.listdir(parameters_path))
+            ]
+
+    # Use `modinfo` to probe for signature information
+    signatures = _get_kernel_modules_signatures([name for name in names if name in parameters])
+
+    with ThreadPoolExecutor(max_workers=_KERNEL_MODULE_PARAMETERS_READ_WORKERS) as executor:
+        values = {
+            name: executor.map(_read_kernel_module_parameter, [path for dummy_param, path in params])
+            for name, params in parameters.items()
+        }
+
+        for name in names:
+            if name not in parameters:
+                yield ActiveKernelModule(filename=name, parameters=[])
+                continue
+
+            parameter_dict = {}
+            for (param, dummy_path), value in zip(parameters[name], values[name]):
+                if value is None:
+                    # Some parameters are write-only, in that case we just log the name of parameter
+                    # and the module and continue
                     msg = 'Unable to read parameter "{param}" of kernel module "{name}"'
                     logger.warning(msg.format(param=param, name=name))
-                else:
-                    raise exc
-
-        # Project the dictionary as a list of key values
-        items = [
-            KernelModuleParameter(name=k, value=v)
-            for (k, v) in six.iteritems(parameter_dict)
-        ]
-
-        yield ActiveKernelModule(
-            filename=name,
-            parameters=items,
-            signature=signature_string
-        )
+                    continue
+                parameter_dict[param] = value
+
+            # Project the dictionary as a list of key values
+            items = [
+                KernelModuleParameter(name=k, value=v)
+                for (k, v) in six.iteritems(parameter_dict)
+            ]
+
+            yield ActiveKernelModule(
+                filename=name,
+                parameters=items,
+                signature=signatures[name]
+            )
 
 
 def get_active_kernel_modules_status(logger):
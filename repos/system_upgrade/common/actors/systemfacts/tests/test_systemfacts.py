@@ -4,7 +4,9 @@ import pwd
 import pytest
 
 from leapp.exceptions import StopActorExecutionError
+from leapp.libraries.actor import systemfacts
 from leapp.libraries.actor.systemfacts import (
+    _get_kernel_modules_signatures,
     _get_system_groups,
     _get_system_users,
     anyendswith,
@@ -138,3 +140,47 @@ def test_failed_parsed_repofiles(monkeypatch):
 
     with pytest.raises(StopActorExecutionError):
         get_repositories_status()
+
+
+MODINFO_OUTPUT = """filename:       /lib/modules/4.18.0-553.el8_10.x86_64/kernel/fs/xfs/xfs.ko.xz
+license:        GPL
+description:    SGI XFS with ACLs, security attributes, quota, no debug enabled
+alias:          fs-xfs
+depends:        libcrc32c
+intree:         Y
+name:           xfs
+sig_id:         PKCS#7
+signer:         Red Hat Enterprise Linux kernel signing key
+sig_key:        1B:2C:3D:4E
+sig_hashalgo:   sha256
+signature:      30:65:02:31:00:B2:A3:
+\t\t7F:1E:C0:9D:
+\t\t11:22
+parm:           xfs_params:int
+filename:       /lib/modules/4.18.0-553.el8_10.x86_64/extra/dm-unsigned.ko
+license:        GPL
+name:           dm_unsigned
+parm:           param:int
+filename:       /lib/modules/4.18.0-553.el8_10.x86_64/kernel/drivers/md/dm-log.ko.xz
+license:        GPL
+signature:      AA:BB:
+\t\tCC
+"""
+
+
+def test_get_kernel_modules_signatures(monkeypatch):
+    def run_mocked(cmd, split=False, checked=True):
+        assert cmd == ['modinfo', 'xfs', 'dm_unsigned', 'dm_log', 'missing']
+        assert not checked
+        return {'stdout': MODINFO_OUTPUT.splitlines(), 'exit_code': 1}
+
+    monkeypatch.setattr(systemfacts, 'run', run_mocked)
+
+    signatures = _get_kernel_modules_signatures(['xfs', 'dm_unsigned', 'dm_log', 'missing'])
+
+    assert signatures == {
+        'xfs': '30:65:02:31:00:B2:A3:7F:1E:C0:9D:11:22',
+        'dm_unsigned': None,
+        'dm_log': 'AA:BB:CC',
+        'missing': None,
+    }
@@ -2,11 +2,23 @@ import itertools
 import os
 import re
 import shutil
+import stat
+from concurrent.futures import ThreadPoolExecutor
 
 from leapp import reporting
 from leapp.exceptions import StopActorExecution, StopActorExecutionError
 from leapp.libraries.actor import constants
-from leapp.libraries.common import distro, dnfplugin, mounting, overlaygen, repofileutils, rhsm, utils
+from leapp.libraries.common import (
+    distro,
+    dnfplugin,
+    mounting,
+    overlaygen,
+    persistentcache,
+    repofileutils,
+    rhsm,
+    rpms,
+    utils
+)
 from leapp.libraries.common.config import get_env, get_product_type, get_source_distro_id, get_target_distro_id
 from leapp.libraries.common.config.version import get_target_major_version, get_target_version
 from leapp.libraries.common.gpg import get_path_to_gpg_certs, is_nogpgcheck_set
@@ -57,8 +69,18 @@ from leapp.utils.deprecation import suppress_deprecation
 
 PROD_CERTS_FOLDER = 'prod-certs'
 PERSISTENT_PACKAGE_CACHE_DIR = '/var/lib/leapp/persistent_package_cache'
+TARGET_USERSPACE_MANIFEST_NAME = 'target-userspace-manifest'
+"""
+Name of the persistent cache describing the target userspace container created by the previous leapp execution.
+"""
 DEDICATED_LEAPP_PART_URL = 'https://access.redhat.com/solutions/7011704'
 FMT_LIST_SEPARATOR = '\n    - '
+COPY_DECOUPLE_MAX_WORKERS = 8
+"""
+Maximal number of threads copying file contents in _copy_decouple().
+
+The copying is mostly I/O bound, so a small pool is enough to saturate the storage.
+"""
 
 
 def _check_deprecated_rhsm_skip():
@@ -219,6 +241,9 @@ def prepare_target_userspace(context, userspace_dir, enabled_repos, packages):
     """
     Implement the creation of the target userspace.
     """
+    # The container is going to be changed, do not let any future execution reuse it until it's finished
+    persistentcache.remove(TARGET_USERSPACE_MANIFEST_NAME)
+    overlaygen.invalidate_userspace_size()
     _backup_to_persistent_package_cache(userspace_dir)
 
     run(['rm', '-rf', userspace_dir])
@@ -230,76 +255,83 @@ def prepare_target_userspace(context, userspace_dir, enabled_repos, packages):
         _restore_persistent_package_cache(userspace_dir)
         if not is_nogpgcheck_set():
             _import_gpg_keys(context, install_root_dir, target_major_version)
+        _install_target_userspace_packages(context, install_root_dir, enabled_repos, packages)
 
-        repos_opt = [['--enablerepo', repo] for repo in enabled_repos]
-        repos_opt = list(itertools.chain(*repos_opt))
-        cmd = ['dnf', 'install', '-y']
-        if is_nogpgcheck_set():
-            cmd.append('--nogpgcheck')
-        cmd += [
-            '--setopt=module_platform_id=platform:el{}'.format(target_major_version),
-            '--setopt=keepcache=1',
-            '--releasever', api.current_actor().configuration.version.target,
-            '--installroot', install_root_dir,
-            '--disablerepo', '*'
-            ] + repos_opt + packages
-        if config.is_verbose():
-            cmd.append('-v')
-        if rhsm.skip_rhsm():
-            cmd += ['--disableplugin', 'subscription-manager']
-        try:
-            context.call(cmd, callback_raw=utils.logging_handler)
-        except CalledProcessError as exc:
-            message = 'Unable to install target \'{}\' {} userspace packages.'.format(
-                get_target_distro_id(), target_major_version
-            )
-            details = {'details': str(exc), 'stderr': exc.stderr}
-
-            if 'more space needed on the' in exc.stderr:
-                # The stderr contains this error summary:
-                # Disk Requirements:
-                #   At least <size> more space needed on the <path> filesystem.
-                _handle_transaction_err_msg_size(exc)
-
-            # If a proxy was set in dnf config, it should be the reason why dnf
-            # failed since leapp does not support updates behind proxy yet.
-            for manager_info in api.consume(PkgManagerInfo):
-                if manager_info.configured_proxies:
+
+def _install_target_userspace_packages(context, install_root_dir, enabled_repos, packages):
+    """
+    Install packages into the target userspace mounted inside the context at install_root_dir.
+    """
+    target_major_version = get_target_major_version()
+    repos_opt = [['--enablerepo', repo] for repo in enabled_repos]
+    repos_opt = list(itertools.chain(*repos_opt))
+    cmd = ['dnf', 'install', '-y']
+    if is_nogpgcheck_set():
+        cmd.append('--nogpgcheck')
+    cmd += [
+        '--setopt=module_platform_id=platform:el{}'.format(target_major_version),
+        '--setopt=keepcache=1',
+        '--releasever', api.current_actor().configuration.version.target,
+        '--installroot', install_root_dir,
+        '--disablerepo', '*'
+        ] + repos_opt + packages
+    if config.is_verbose():
+        cmd.append('-v')
+    if rhsm.skip_rhsm():
+        cmd += ['--disableplugin', 'subscription-manager']
+    try:
+        context.call(cmd, callback_raw=utils.logging_handler)
+    except CalledProcessError as exc:
+        message = 'Unable to install target \'{}\' {} userspace packages.'.format(
+            get_target_distro_id(), target_major_version
+        )
+        details = {'details': str(exc), 'stderr': exc.stderr}
+
+        if 'more space needed on the' in exc.stderr:
+            # The stderr contains this error summary:
+            # Disk Requirements:
+            #   At least <size> more space needed on the <path> filesystem.
+            _handle_transaction_err_msg_size(exc)
+
+        # If a proxy was set in dnf config, it should be the reason why dnf
+        # failed since leapp does not support updates behind proxy yet.
+        for manager_info in api.consume(PkgManagerInfo):
+            if manager_info.configured_proxies:
+                details['hint'] = (
+                    'DNF failed to install userspace packages, likely due to the proxy '
+                    'configuration detected in the YUM/DNF configuration file. '
+                    'Make sure the proxy is properly configured in /etc/dnf/dnf.conf. '
+                    'It\'s also possible the proxy settings in the DNF configuration file are '
+                    'incompatible with the target system. A compatible configuration can be '
+                    'placed in /etc/leapp/files/dnf.conf which, if present, will be used during '
+                    'the upgrade instead of /etc/dnf/dnf.conf. '
+                    'In such case the configuration will also be applied to the target system.'
+                )
+
+        # Similarly if a proxy was set specifically for one of the repositories.
+        for repo_facts in api.consume(RepositoriesFacts):
+            for repo_file in repo_facts.repositories:
+                if any(repo_data.proxy and repo_data.enabled for repo_data in repo_file.data):
                     details['hint'] = (
                         'DNF failed to install userspace packages, likely due to the proxy '
-                        'configuration detected in the YUM/DNF configuration file. '
-                        'Make sure the proxy is properly configured in /etc/dnf/dnf.conf. '
-                        'It\'s also possible the proxy settings in the DNF configuration file are '
-                        'incompatible with the target system. A compatible configuration can be '
-                        'placed in /etc/leapp/files/dnf.conf which, if present, will be used during '
-                        'the upgrade instead of /etc/dnf/dnf.conf. '
-                        'In such case the configuration will also be applied to the target system.'
+                        'configuration detected in a repository configuration file.'
                     )
 
-            # Similarly if a proxy was set specifically for one of the repositories.
-            for repo_facts in api.consume(RepositoriesFacts):
-                for repo_file in repo_facts.repositories:
-                    if any(repo_data.proxy and repo_data.enabled for repo_data in repo_file.data):
-                        details['hint'] = (
-                            'DNF failed to install userspace packages, likely due to the proxy '
-                            'configuration detected in a repository configuration file.'
-                        )
-
-            if get_source_distro_id() == 'centos' and get_target_distro_id() == 'rhel':
-                check_rhel_release_hint = (
-                    'When upgrading and converting from Centos Stream to Red Hat Enterprise Linux'
-                    ' (RHEL), the automatically determined latest target version of RHEL \'{}\' might'
-                    ' not yet have been released. If so, specify the latest released RHEL version'
-                    ' manually using the --target-version commandline option.'
-                ).format(get_target_version())
-
-                if details.get('hint'):
-                    # keep the proxy hint, we don't know which one is the problem
-                    details['hint'] = f"{details['hint']}\n\n{check_rhel_release_hint}"
-                else:
-                    details['hint'] = check_rhel_release_hint
+        if get_source_distro_id() == 'centos' and get_target_distro_id() == 'rhel':
+            check_rhel_release_hint = (
+                'When upgrading and converting from Centos Stream to Red Hat Enterprise Linux'
+                ' (RHEL), the automatically determined latest target version of RHEL \'{}\' might'
+                ' not yet have been released. If so, specify the latest released RHEL version'
+                ' manually using the --target-version commandline option.'
+            ).format(get_target_version())
+
+            if details.get('hint'):
+                # keep the proxy hint, we don't know which one is the problem
+                details['hint'] = f"{details['hint']}\n\n{check_rhel_release_hint}"
+            else:
+                details['hint'] = check_rhel_release_hint
 
-            raise StopActorExecutionError(message=message, details=details)
+        raise StopActorExecutionError(message=message, details=details)
 
 
 def _query_rpm_for_pkg_files(context, pkgs):
@@ -309,6 +341,38 @@ def _query_rpm_for_pkg_files(context, pkgs):
     return files_owned_by_rpm
 
 
+def _get_rpm_file_owners(context, filepaths):
+    """
+    Return names of packages owning the given files.
+
+    The ownership of all files is resolved with a single rpm execution. When
+    the output cannot be matched with the files (a file owned by multiple
+    packages prints multiple lines), rpm is executed for each file separately.
+
+    :param context: An instance of a mounting.IsolatedActions class
+    :param filepaths: Absolute paths of the files (inside the context)
+    :return: Sets of names of packages owning the file on the same position, empty if the file is not owned
+    :rtype: list(set(str))
+    """
+    if not filepaths:
+        return []
+    cmd = ['rpm', '-qf', '--queryformat', r'%{NAME}\n']
+    # rpm exits with non-zero code when any of the files is not owned by a package
+    lines = context.call(cmd + filepaths, split=True, checked=False)['stdout']
+    if len(lines) == len(filepaths):
+        # package names cannot contain spaces, unlike "file ... is not owned by any package"
+        return [set() if ' ' in line else {line} for line in lines]
+
+    api.current_logger().debug('Cannot match the owners of files with the files, querying them one by one.')
+    owners = []
+    for filepath in filepaths:
+        try:
+            owners.append(set(context.call(cmd + [filepath], split=True)['stdout']))
+        except CalledProcessError:
+            owners.append(set())
+    return owners
+
+
 def _get_files_owned_by_rpms(context, dirpath, pkgs=None, recursive=False):
     """
     Return the list of file names inside dirpath owned by RPMs.
@@ -348,13 +412,12 @@ def _get_files_owned_by_rpms(context, dirpath, pkgs=None, recursive=False):
     else:
         file_list = os.listdir(searchdir)
 
-    for fname in file_list:
-        try:
-            result = context.call(['rpm', '-qf', os.path.join(dirpath, fname)])
-        except CalledProcessError:
+    file_owners = _get_rpm_file_owners(context, [os.path.join(dirpath, fname) for fname in file_list])
+    for fname, owners in zip(file_list, file_owners):
+        if not owners:
             api.current_logger().debug('SKIP the {} file: not owned by any rpm'.format(fname))
             continue
-        if pkgs and not [pkg for pkg in pkgs if pkg in result['stdout']]:
+        if pkgs and owners.isdisjoint(pkgs):
             api.current_logger().debug('SKIP the {} file: not owned by any searched rpm'.format(fname))
             continue
         api.current_logger().debug('Found the file owned by an rpm: {}.'.format(fname))
@@ -370,13 +433,60 @@ def _mkdir_with_copied_mode(path, mode_from):
     :param path: The directory path to create.
     :param mode_from: A file or directory whose mode we will copy to the
         newly created directory.
-    :raises subprocess.CalledProcessError: mkdir or chmod fails. For instance,
-        the directory already exists, the file to get permissions from does
-        not exist, a parent directory does not exist.
+    :raises OSError: mkdir or chmod fails. For instance, the file to get
+        permissions from does not exist.
+    """
+    parent = os.path.dirname(path)
+    if parent and not os.path.isdir(parent):
+        os.makedirs(parent)
+    try:
+        # Create with maximally restrictive permissions
+        os.mkdir(path, 0)
+    except OSError:
+        # the same as mkdir -p - fine when the directory exists already
+        if not os.path.isdir(path):
+            raise
+    os.chmod(path, stat.S_IMODE(os.stat(mode_from).st_mode))
+
+
+def _copy_metadata(src, dst):
+    """
+    Copy ownership, mode, timestamps and extended attributes (incl. SELinux labels) of src to dst.
+
+    Symlinks are not followed. Extended attributes that cannot be set (e.g. on filesystems
+    without xattr support) are silently skipped, the same as `cp -a` does.
+    """
+    src_stat = os.lstat(src)
+    # Change the ownership before the mode is copied as chown drops the setuid and setgid bits
+    os.lchown(dst, src_stat.st_uid, src_stat.st_gid)
+    shutil.copystat(src, dst, follow_symlinks=False)
+
+
+def _copy_preserving_metadata(src, dst):
+    """
+    Copy the file (or the whole directory tree) like `cp -a` does.
+
+    Symlinks inside the copied tree are copied as symlinks. Special files
+    (devices, fifos, ...) are delegated to cp as they are not expected to be
+    present in the copied trees.
+
+    :raises OSError: when the copy fails
+    :raises CalledProcessError: when the copy of a special file fails
     """
-    # Create with maximally restrictive permissions
-    run(['mkdir', '-m', '0', '-p', path])
-    run(['chmod', '--reference={}'.format(mode_from), path])
+    src_stat = os.lstat(src)
+    if stat.S_ISLNK(src_stat.st_mode):
+        os.symlink(os.readlink(src), dst)
+    elif stat.S_ISDIR(src_stat.st_mode):
+        # Restrict the permissions until the content is copied; mode is set by _copy_metadata
+        os.mkdir(dst, 0o700)
+        for entry in os.listdir(src):
+            _copy_preserving_metadata(os.path.join(src, entry), os.path.join(dst, entry))
+    elif stat.S_ISREG(src_stat.st_mode):
+        shutil.copyfile(src, dst)
+    else:
+        run(['cp', '-a', src, dst])
+        return
+    _copy_metadata(src, dst)
 
 
 def _choose_copy_or_link(symlink, srcdir):
@@ -504,11 +614,10 @@ def _copy_symlinks(symlinks_to_process, srcdir):
             continue
 
         if action == "copy":
-            # Note: source_path could be a directory, so '-a' or '-r' must be
-            # given to cp.
-            run(['cp', '-a', source_path, target_linkpath])
+            # Note: source_path could be a directory
+            _copy_preserving_metadata(source_path, target_linkpath)
         elif action == 'link':
-            run(["ln", "-s", source_path, target_linkpath])
+            os.symlink(source_path, target_linkpath)
         else:
             # This will not happen unless _copy_or_link() has a bug.
             raise RuntimeError("Programming error: _copy_or_link() returned an unknown action:{}".format(action))
@@ -526,47 +635,58 @@ def _copy_decouple(srcdir, dstdir):
 
     .. warning::
         `dstdir` must already exist.
-    """
-    for root, directories, files in os.walk(srcdir):
-        # relative path from srcdir because srcdir is replaced with dstdir for
-        # the copy.
-        relpath = os.path.relpath(root, srcdir)
-
-        # Create all directories with proper permissions for security
-        # reasons (Putting private data into directories that haven't had their
-        # permissions set appropriately may leak the private information.)
-        symlinks_to_process = []
-        for directory in directories:
-            source_dirpath = os.path.join(root, directory)
-            target_dirpath = os.path.join(dstdir, relpath, directory)
-
-            # Defer symlinks until later because we may end up having to copy
-            # the file contents and the directory may not exist yet.
-            if os.path.islink(source_dirpath):
-                symlinks_to_process.append((source_dirpath, target_dirpath))
-                continue
 
-            _mkdir_with_copied_mode(target_dirpath, source_dirpath)
+    :raises OSError: when a file or directory cannot be created or copied
+    :raises CalledProcessError: when the copy of a special file fails
+    """
+    with ThreadPoolExecutor(max_workers=COPY_DECOUPLE_MAX_WORKERS) as executor:
+        copy_jobs = []
+        for root, directories, files in os.walk(srcdir):
+            # relative path from srcdir because srcdir is replaced with dstdir for
+            # the copy.
+            relpath = os.path.relpath(root, srcdir)
+
+            # Create all directories with proper permissions for security
+            # reasons (Putting private data into directories that haven't had their
+            # permissions set appropriately may leak the private information.)
+            # Directories are created by the walking thread, so they always exist
+            # before any file is copied into them.
+            symlinks_to_process = []
+            for directory in directories:
+                source_dirpath = os.path.join(root, directory)
+                target_dirpath = os.path.join(dstdir, relpath, directory)
+
+                # Defer symlinks until later because we may end up having to copy
+                # the file contents and the directory may not exist yet.
+                if os.path.islink(source_dirpath):
+                    symlinks_to_process.append((source_dirpath, target_dirpath))
+                    continue
+
+                _mkdir_with_copied_mode(target_dirpath, source_dirpath)
+
+            # Link or create all directories that were pointed to by symlinks and
+            # then reset symlinks_to_process for use by files.
+            _copy_symlinks(symlinks_to_process, srcdir)
+            symlinks_to_process = []
 
-        # Link or create all directories that were pointed to by symlinks and
-        # then reset symlinks_to_process for use by files.
-        _copy_symlinks(symlinks_to_process, srcdir)
-        symlinks_to_process = []
+            for filename in files:
+                source_filepath = os.path.join(root, filename)
+                target_filepath = os.path.join(dstdir, relpath, filename)
 
-        for filename in files:
-            source_filepath = os.path.join(root, filename)
-            target_filepath = os.path.join(dstdir, relpath, filename)
+                # Defer symlinks until later because we may end up having to copy
+                # the file contents and the directory may not exist yet.
+                if os.path.islink(source_filepath):
+                    symlinks_to_process.append((source_filepath, target_filepath))
+                    continue
 
-            # Defer symlinks until later because we may end up having to copy
-            # the file contents and the directory may not exist yet.
-            if os.path.islink(source_filepath):
-                symlinks_to_process.append((source_filepath, target_filepath))
-                continue
+                # Not a symlink so we can copy it now too
+                copy_jobs.append(executor.submit(_copy_preserving_metadata, source_filepath, target_filepath))
 
-            # Not a symlink so we can copy it now too
-            run(['cp', '-a', source_filepath, target_filepath])
+            _copy_symlinks(symlinks_to_process, srcdir)
 
-        _copy_symlinks(symlinks_to_process, srcdir)
+        # Propagate the first error, if any
+        for job in copy_jobs:
+            job.result()
 
 
 def _copy_certificates(context, target_userspace):
@@ -597,7 +717,13 @@ def _copy_certificates(context, target_userspace):
     _mkdir_with_copied_mode(target_pki, backup_pki)
 
     # Copy source /etc/pki to the container
-    _copy_decouple('/etc/pki', target_pki)
+    try:
+        _copy_decouple('/etc/pki', target_pki)
+    except (OSError, CalledProcessError) as exc:
+        raise StopActorExecutionError(
+            message='Unable to copy certificates from /etc/pki into the target userspace container.',
+            details={'details': str(exc)}
+        )
 
     # Assertion: after running _copy_decouple(), no broken symlinks exist in /etc/pki in the container
     # So any broken symlinks created will be by the installed packages.
@@ -1224,10 +1350,98 @@ def _remove_injected_repofiles_from_our_rhui_packages(target_userspace_ctx, rhui
                 os.remove(dst_in_host)
 
 
+def _get_target_userspace_manifest(packages, files, target_repoids):
+    """
+    Describe the content of the target userspace container to be created.
+
+    The manifest is composed of basic python types so it can be stored in the persistent cache.
+    """
+    return {
+        'leapp_repository_version': rpms.get_leapp_repository_version(),
+        'target_version': api.current_actor().configuration.version.target,
+        'nogpgcheck': is_nogpgcheck_set(),
+        'repos': sorted(target_repoids),
+        'packages': sorted(packages),
+        'files': sorted((f.src, f.dst or f.src) for f in files),
+    }
+
+
+def _reset_target_userspace_post_processing(userspace_dir):
+    """
+    Revert the changes done in the target userspace container after its creation.
+
+    The container mode of RHSM creates symlinks that cannot be created again, and
+    leftovers of an interrupted _prep_repository_access would break the next one.
+    The repository access itself is prepared from scratch again, which restores
+    also repofiles removed previously for RHUI.
+    """
+    for path in ('etc/rhsm-host', 'etc/pki/entitlement-host'):
+        path = os.path.join(userspace_dir, path)
+        if os.path.islink(path):
+            os.unlink(path)
+    for path in ('etc/pki.backup', 'etc/yum.repos.d.backup'):
+        run(['rm', '-rf', os.path.join(userspace_dir, path)])
+
+
+def _reuse_target_userspace(context, userspace_dir, manifest):
+    """
+    Reuse the target userspace container created by the previous leapp execution if possible.
+
+    The container is reused only when LEAPP_DEVEL_REUSE_TARGET_USERSPACE=1 and it has been
+    created for the same manifest by a known version of leapp-repository. When just new
+    packages are required, only these are installed into the container. Any other change
+    requires the creation of a new container.
+
+    :return: True if the container has been reused, False if a new one has to be created
+    :rtype: bool
+    """
+    if get_env('LEAPP_DEVEL_REUSE_TARGET_USERSPACE', '0') != '1':
+        return False
+
+    if not manifest['leapp_repository_version']:
+        api.current_logger().debug(
+            'Cannot reuse the target userspace container: unknown version of leapp-repository.'
+        )
+        return False
+
+    previous_manifest = persistentcache.load(TARGET_USERSPACE_MANIFEST_NAME, userspace_dir)
+    if not previous_manifest or not os.path.isdir(userspace_dir):
+        api.current_logger().debug('No reusable target userspace container found.')
+        return False
+
+    changed = [key for key in sorted(manifest) if key != 'packages' and manifest[key] != previous_manifest.get(key)]
+    if not set(previous_manifest.get('packages', [])).issubset(manifest['packages']):
+        changed.append('packages')
+    if changed:
+        api.current_logger().debug(
+            'Cannot reuse the target userspace container. Changed: {}'.format(', '.join(changed))
+        )
+        return False
+
+    # Do not reuse the container anymore in case the execution fails before the manifest is stored again
+    persistentcache.remove(TARGET_USERSPACE_MANIFEST_NAME)
+    _reset_target_userspace_post_processing(userspace_dir)
+
+    missing_pkgs = sorted(set(manifest['packages']).difference(previous_manifest['packages']))
+    if not missing_pkgs:
+        api.current_logger().info('Reusing the target userspace container created previously.')
+        return True
+
+    api.current_logger().info(
+        'Reusing the target userspace container, installing missing packages: {}'.format(', '.join(missing_pkgs))
+    )
+    install_root_dir = '/el{}target'.format(get_target_major_version())
+    with mounting.BindMount(source=userspace_dir, target=os.path.join(context.base_dir, install_root_dir.lstrip('/'))):
+        _install_target_userspace_packages(context, install_root_dir, manifest['repos'], missing_pkgs)
+    return True
+
+
 def _create_target_userspace(context, indata, packages, files, target_repoids):
     """Create the target userspace."""
     target_path = _get_target_userspace()
-    prepare_target_userspace(context, target_path, target_repoids, list(packages))
+    manifest = _get_target_userspace_manifest(packages, files, target_repoids)
+    if not _reuse_target_userspace(context, target_path, manifest):
+        prepare_target_userspace(context, target_path, target_repoids, list(packages))
     _prep_repository_access(context, target_path)
 
     with mounting.NspawnActions(base_dir=target_path) as target_context:
@@ -1249,6 +1463,11 @@ def _create_target_userspace(context, indata, packages, files, target_repoids):
     with mounting.NspawnActions(_get_target_userspace()) as target_context:
         rhsm.set_container_mode(target_context)
 
+    if get_env('LEAPP_DEVEL_REUSE_TARGET_USERSPACE', '0') == '1':
+        persistentcache.store(TARGET_USERSPACE_MANIFEST_NAME, target_path, manifest)
+    # the size of the container is required later to estimate the space needed by leapp
+    overlaygen.record_userspace_size(target_path)
+
 
 def _apply_rhui_access_preinstall_tasks(context, rhui_setup_info):
     if rhui_setup_info.preinstall_tasks:
@@ -864,6 +864,54 @@ def test_copy_decouple(monkeypatch, temp_directory_layout, initial_structure, ex
         raise
 
 
+def test_copy_decouple_preserves_metadata(tmp_path):
+    srcdir = tmp_path / 'src'
+    private_dir = srcdir / 'private'
+    private_dir.mkdir(parents=True)
+    private_file = private_dir / 'key.pem'
+    private_file.write_text('secret')
+    os.chmod(str(private_file), 0o600)
+    os.utime(str(private_file), (1000000000, 1000000000))
+    os.chmod(str(private_dir), 0o700)
+
+    # The pointee outside of srcdir is copied as a whole tree
+    outside_dir = tmp_path / 'outside'
+    outside_dir.mkdir()
+    (outside_dir / 'cert.pem').write_text('cert')
+    (outside_dir / 'link.pem').symlink_to('cert.pem')
+    (srcdir / 'external').symlink_to(outside_dir)
+
+    dstdir = tmp_path / 'dst'
+    dstdir.mkdir()
+    userspacegen._copy_decouple(str(srcdir), str(dstdir))
+
+    copied_file = dstdir / 'private' / 'key.pem'
+    assert copied_file.read_text() == 'secret'
+    assert oct(os.stat(str(copied_file)).st_mode & 0o7777) == oct(0o600)
+    assert os.stat(str(copied_file)).st_mtime == 1000000000
+    assert oct(os.stat(str(dstdir / 'private')).st_mode & 0o7777) == oct(0o700)
+
+    assert not (dstdir / 'external').is_symlink()
+    assert (dstdir / 'external' / 'cert.pem').read_text() == 'cert'
+    assert os.readlink(str(dstdir / 'external' / 'link.pem')) == 'cert.pem'
+
+
+def test_copy_certificates_copy_error(monkeypatch):
+    def copy_decouple_failing(srcdir, dstdir):
+        raise OSError(13, 'Permission denied')
+
+    monkeypatch.setattr(userspacegen.mounting, 'NspawnActions', MockedMountingBase)
+    monkeypatch.setattr(userspacegen, '_get_files_owned_by_rpms', lambda context, path, recursive=False: [])
+    monkeypatch.setattr(userspacegen, 'run', lambda cmd: None)
+    monkeypatch.setattr(userspacegen, '_mkdir_with_copied_mode', lambda path, mode_from: None)
+    monkeypatch.setattr(userspacegen, '_copy_decouple', copy_decouple_failing)
+    monkeypatch.setattr(userspacegen.api, 'current_logger', logger_mocked())
+
+    with pytest.raises(StopActorExecutionError) as err:
+        userspacegen._copy_certificates(MockedMountingBase(), '/target/userspace')
+    assert 'Unable to copy certificates' in str(err.value)
+
+
 @pytest.mark.parametrize('result,dst_ver,arch,prod_type', [
     (os.path.join(_CERTS_PATH, '8.1', '479.pem'), '8.1', architecture.ARCH_X86_64, 'ga'),
     (os.path.join(_CERTS_PATH, '8.1', '419.pem'), '8.1', architecture.ARCH_ARM64, 'ga'),
@@ -1303,21 +1351,96 @@ def test_perform_ok(monkeypatch, distro, cert_path):
     assert isinstance(userspacegen.api.produce.model_instances[2], models.TargetUserSpaceInfo)
 
 
+_PREVIOUS_MANIFEST = {
+    'leapp_repository_version': 'leapp-upgrade-el8toel9 0.22.0-1.el8',
+    'target_version': '9.6',
+    'nogpgcheck': False,
+    'repos': ['appstream', 'baseos'],
+    'packages': ['dnf', 'util-linux'],
+    'files': [],
+}
+
+
+@pytest.mark.parametrize('reuse_envar,changes,reused,installed_pkgs', [
+    ('0', {}, False, None),
+    ('1', {}, True, None),
+    ('1', {'packages': ['dnf', 'kpatch-dnf', 'util-linux']}, True, ['kpatch-dnf']),
+    ('1', {'packages': ['dnf']}, False, None),
+    ('1', {'repos': ['appstream', 'baseos', 'crb']}, False, None),
+    ('1', {'leapp_repository_version': 'leapp-upgrade-el8toel9 0.23.0-1.el8'}, False, None),
+    ('1', {'files': [('/etc/dnf/dnf.conf', '/etc/dnf/dnf.conf')]}, False, None),
+    ('1', {'leapp_repository_version': None}, False, None),
+])
+def test_reuse_target_userspace(monkeypatch, tmpdir, reuse_envar, changes, reused, installed_pkgs):
+    installed = []
+    monkeypatch.setattr(userspacegen.api, 'current_actor',
+                        CurrentActorMocked(envars={'LEAPP_DEVEL_REUSE_TARGET_USERSPACE': reuse_envar}))
+    monkeypatch.setattr(userspacegen.api, 'current_logger', logger_mocked())
+    monkeypatch.setattr(userspacegen.persistentcache, 'load', lambda name, key: dict(_PREVIOUS_MANIFEST))
+    monkeypatch.setattr(userspacegen.persistentcache, 'remove', lambda name: None)
+    monkeypatch.setattr(userspacegen.mounting, 'BindMount', MockedMountingBase)
+    monkeypatch.setattr(userspacegen, '_install_target_userspace_packages',
+                        lambda context, root, repos, pkgs: installed.append(pkgs))
+    monkeypatch.setattr(userspacegen, 'run', lambda cmd: None)
+
+    manifest = dict(_PREVIOUS_MANIFEST, **changes)
+    context = _MockContext('/var/lib/leapp/scratch/mounts/root_/system_overlay', [])
+
+    assert userspacegen._reuse_target_userspace(context, str(tmpdir), manifest) == reused
+    assert installed == ([installed_pkgs] if installed_pkgs else [])
+
+
+def test_reuse_target_userspace_resets_post_processing(monkeypatch, tmpdir):
+    commands = []
+    monkeypatch.setattr(userspacegen.api, 'current_actor',
+                        CurrentActorMocked(envars={'LEAPP_DEVEL_REUSE_TARGET_USERSPACE': '1'}))
+    monkeypatch.setattr(userspacegen.api, 'current_logger', logger_mocked())
+    monkeypatch.setattr(userspacegen.persistentcache, 'load', lambda name, key: dict(_PREVIOUS_MANIFEST))
+    monkeypatch.setattr(userspacegen.persistentcache, 'remove', lambda name: commands.append(['remove', name]))
+    monkeypatch.setattr(userspacegen, 'run', commands.append)
+
+    tmpdir.mkdir('etc').mkdir('pki')
+    os.symlink('/etc/rhsm', str(tmpdir.join('etc', 'rhsm-host')))
+    os.symlink('/etc/pki/entitlement', str(tmpdir.join('etc', 'pki', 'entitlement-host')))
+    context = _MockContext('/var/lib/leapp/scratch/mounts/root_/system_overlay', [])
+
+    assert userspacegen._reuse_target_userspace(context, str(tmpdir), dict(_PREVIOUS_MANIFEST))
+    assert not os.path.lexists(str(tmpdir.join('etc', 'rhsm-host')))
+    assert not os.path.lexists(str(tmpdir.join('etc', 'pki', 'entitlement-host')))
+    assert commands == [
+        ['remove', userspacegen.TARGET_USERSPACE_MANIFEST_NAME],
+        ['rm', '-rf', str(tmpdir.join('etc', 'pki.backup'))],
+        ['rm', '-rf', str(tmpdir.join('etc', 'yum.repos.d.backup'))],
+    ]
+
+
 class _MockContext():
 
     def __init__(self, base_dir, owned_by_rpms):
         self.base_dir = base_dir
         # list of files owned, no base_dir prefixed
         self.owned_by_rpms = owned_by_rpms
+        # additional owners of the owned files
+        self.extra_owners = {}
+        self.calls = []
 
     def full_path(self, path):
         return os.path.join(self.base_dir, os.path.abspath(path).lstrip('/'))
 
-    def call(self, cmd):
-        assert len(cmd) == 3 and cmd[0] == 'rpm' and cmd[1] == '-qf'
-        if cmd[2] in self.owned_by_rpms:
-            return {'exit_code': 0}
-        raise CalledProcessError("Command failed with exit code 1", cmd, 1)
+    def _get_owners(self, path):
+        if path not in self.owned_by_rpms:
+            return []
+        return ['pkg-{}'.format(self.owned_by_rpms.index(path) % 2)] + self.extra_owners.get(path, [])
+
+    def call(self, cmd, split=False, checked=True):
+        assert cmd[:4] == ['rpm', '-qf', '--queryformat', r'%{NAME}\n'] and split
+        self.calls.append(cmd[4:])
+        stdout = []
+        for path in cmd[4:]:
+            stdout += self._get_owners(path) or ['file {} is not owned by any package'.format(path)]
+        if checked and not all(self._get_owners(path) for path in cmd[4:]):
+            raise CalledProcessError('Command failed with exit code 1', cmd, 1)
+        return {'exit_code': 0, 'stdout': stdout}
 
 
 def test__get_files_owned_by_rpms(monkeypatch):
@@ -1340,6 +1463,18 @@ def test__get_files_owned_by_rpms(monkeypatch):
     out = userspacegen._get_files_owned_by_rpms(context, '/some/path', recursive=False)
     assert sorted(owned) == sorted(out)
 
+    out = userspacegen._get_files_owned_by_rpms(context, '/some/path', pkgs=['pkg-1'], recursive=False)
+    assert out == ['script.sh']
+    # all files are queried by a single rpm execution
+    assert len(context.calls) == 2
+
+    # a file owned by multiple packages, the output does not match the files anymore
+    context.calls = []
+    context.extra_owners = {owned_fullpath[0]: ['pkg-2']}
+    out = userspacegen._get_files_owned_by_rpms(context, '/some/path', pkgs=['pkg-2'], recursive=False)
+    assert out == ['fileA']
+    assert len(context.calls) == 5
+
 
 def test__get_files_owned_by_rpms_recursive(monkeypatch):
     # this is not necessarily accurate, but close enough
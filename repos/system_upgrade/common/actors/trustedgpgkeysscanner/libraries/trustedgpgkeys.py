@@ -1,7 +1,12 @@
 import os
 
 from leapp.exceptions import StopActorExecutionError
-from leapp.libraries.common.gpg import get_gpg_fp_from_file, get_path_to_gpg_certs, get_pubkeys_from_rpms
+from leapp.libraries.common.gpg import (
+    get_gpg_fp_from_file,
+    get_gpg_keys_index,
+    get_path_to_gpg_certs,
+    get_pubkeys_from_rpms
+)
 from leapp.libraries.stdlib import api
 from leapp.models import GpgKey, InstalledRPM, TrustedGpgKeys
 
@@ -10,17 +15,15 @@ def _get_pubkeys(installed_rpms):
     """
     Get pubkeys from installed rpms and the trusted directory
     """
-    pubkeys = get_pubkeys_from_rpms(installed_rpms)
-    db_pubkeys = [key.fingerprint for key in pubkeys]
+    pubkeys = get_gpg_keys_index(get_pubkeys_from_rpms(installed_rpms))
     certs_path = get_path_to_gpg_certs()
     for certname in os.listdir(certs_path):
         key_file = os.path.join(certs_path, certname)
         fps = get_gpg_fp_from_file(key_file)
         for fp in fps:
-            if fp not in db_pubkeys:
-                pubkeys.append(GpgKey(fingerprint=fp, rpmdb=False, filename=key_file))
-                db_pubkeys += fp
-    return pubkeys
+            if fp not in pubkeys:
+                pubkeys[fp] = GpgKey(fingerprint=fp, rpmdb=False, filename=key_file)
+    return list(pubkeys.values())
 
 
 def process():
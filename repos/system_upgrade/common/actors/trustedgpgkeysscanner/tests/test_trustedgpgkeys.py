@@ -69,6 +69,33 @@ def test_get_pubkeys(monkeypatch):
     assert list({pkey.filename for pkey in pubkeys if not pkey.rpmdb})[0] == '/mydir/myfile'
 
 
+def test_get_pubkeys_duplicates(monkeypatch):
+    """
+    Test that each fingerprint is listed just once, preferring keys from RPM DB
+    """
+    rpm_fps = ['9570ff31', '9570ff31', '99900000']
+    installed_rpms = _get_test_installed_rmps(rpm_fps)
+    mocked_gpg_files = MockedGetGpgFromFile([
+        ('/mydir/myfile1', ['0000ff31', '99900000']),
+        ('/mydir/myfile2', ['0000ff31', '0000ff32']),
+    ])
+
+    def _mocked_listdir(dummy):
+        return sorted(os.path.basename(i) for i in mocked_gpg_files.get_files())
+
+    monkeypatch.setattr(trustedgpgkeys.os, 'listdir', _mocked_listdir)
+    monkeypatch.setattr(trustedgpgkeys, 'get_path_to_gpg_certs', lambda: '/mydir/')
+    monkeypatch.setattr(trustedgpgkeys, 'get_gpg_fp_from_file', mocked_gpg_files)
+
+    pubkeys = trustedgpgkeys._get_pubkeys(installed_rpms)
+    assert [(pkey.fingerprint, pkey.rpmdb, pkey.filename) for pkey in pubkeys] == [
+        ('9570ff31', True, None),
+        ('99900000', True, None),
+        ('0000ff31', False, '/mydir/myfile1'),
+        ('0000ff32', False, '/mydir/myfile2'),
+    ]
+
+
 def test_process(monkeypatch):
     """
     Executes the "main" function
@@ -54,6 +54,11 @@ DNF_PLUGIN_DATA_PATH = os.path.join('/var/lib/leapp', DNF_PLUGIN_DATA_NAME)
 DNF_PLUGIN_DATA_LOG_PATH = os.path.join('/var/log/leapp', DNF_PLUGIN_DATA_NAME)
 DNF_DEBUG_DATA_PATH = '/var/log/leapp/dnf-debugdata/'
 
+_USERSPACE_DNF_PATHS = ('/var/cache/dnf', '/var/lib/dnf', '/var/lib/leapp', '/var/log')
+"""
+Directories inside the target userspace changed by DNF transactions (outside of the installroot).
+"""
+
 
 def install(target_basedir):
     """
@@ -355,6 +360,8 @@ def install_initramdisk_requirements(packages, target_userspace_info, used_repos
     Performs the installation of packages into the initram disk
     """
     mount_binds = ['/:/installroot']
+    # the packages are installed into the target userspace itself
+    overlaygen.invalidate_userspace_size()
     with _prepare_transaction(used_repos=used_repos, target_userspace_info=target_userspace_info,
                               binds=mount_binds) as (context, target_repoids, _unused):
         if int(get_target_major_version()) >= 9:
@@ -466,15 +473,18 @@ def _prepare_perform(used_repos, target_userspace_info, xfs_info, storage_info,
     # implicitly
     # noqa: W0135
     reserve_space = overlaygen.get_recommended_leapp_free_space(target_userspace_info.path)
-    with _prepare_transaction(used_repos=used_repos,
-                              target_userspace_info=target_userspace_info
-                              ) as (context, target_repoids, userspace_info):
-        with overlaygen.create_source_overlay(mounts_dir=userspace_info.mounts, scratch_dir=userspace_info.scratch,
-                                              xfs_info=xfs_info, storage_info=storage_info,
-                                              mount_target=os.path.join(context.base_dir, 'installroot'),
-                                              scratch_reserve=reserve_space) as overlay:
-            with mounting.mount_upgrade_iso_to_root_dir(target_userspace_info.path, target_iso):
-                yield context, overlay, target_repoids
+    # DNF stores its cache, logs and data inside the target userspace
+    with overlaygen.userspace_size_accounting(target_userspace_info.path, _USERSPACE_DNF_PATHS):
+        with _prepare_transaction(used_repos=used_repos,
+                                  target_userspace_info=target_userspace_info
+                                  ) as (context, target_repoids, userspace_info):
+            with overlaygen.create_source_overlay(mounts_dir=userspace_info.mounts,
+                                                  scratch_dir=userspace_info.scratch,
+                                                  xfs_info=xfs_info, storage_info=storage_info,
+                                                  mount_target=os.path.join(context.base_dir, 'installroot'),
+                                                  scratch_reserve=reserve_space) as overlay:
+                with mounting.mount_upgrade_iso_to_root_dir(target_userspace_info.path, target_iso):
+                    yield context, overlay, target_repoids
 
 
 def perform_transaction_check(target_userspace_info,
@@ -146,7 +146,8 @@ def load_data_asset(actor_requesting_asset,
                     asset_filename,
                     asset_fulltext_name,
                     docs_url,
-                    docs_title):
+                    docs_title,
+                    asset_decoder=json.loads):
     """
     Load the content of the data asset with given asset_filename
     and produce :class:`leapp.model.ConsumedDataAsset` message.
@@ -158,6 +159,9 @@ def load_data_asset(actor_requesting_asset,
     :param str asset_fulltext_name: A human readable asset name to display in error messages.
     :param str docs_url: Docs url to provide if an asset is malformed or outdated.
     :param str docs_title: Title of the documentation to where `docs_url` points to.
+    :param callable asset_decoder: Function decoding the raw JSON text of the asset, json.loads by default.
+                                   Allows to process large assets incrementally, it is expected to raise
+                                   ValueError when the text is not a valid JSON.
     :returns: A dict with asset contents (a parsed JSON), or None if the asset was outdated.
     :raises StopActorExecutionError: In following cases:
         * ConsumedDataAsset is not specified in the produces tuple of the actor_requesting_asset actor
@@ -184,7 +188,7 @@ def load_data_asset(actor_requesting_asset,
     try:
         # The asset family ID has the form (major, minor), include only `major` in the URL
         raw_asset_contents = read_or_fetch(asset_filename, data_stream=data_stream_major, allow_download=False)
-        asset_contents = json.loads(raw_asset_contents)
+        asset_contents = asset_decoder(raw_asset_contents)
     except ValueError:
         msg = 'The {0} file (at {1}) does not contain a valid JSON object.'.format(asset_fulltext_name, asset_filename)
         raise StopActorExecutionError(msg, details=error_hint)
@@ -195,6 +199,24 @@ def load_data_asset(actor_requesting_asset,
         raise StopActorExecutionError(msg.format(asset_fulltext_name, asset_filename), details=error_hint)
 
     provided_data_streams = asset_contents.get(ASSET_PROVIDED_DATA_STREAMS_FIELD)
+    produce_consumed_data_asset(asset_filename, asset_fulltext_name, docs_url, docs_title, provided_data_streams)
+
+    return asset_contents
+
+
+def produce_consumed_data_asset(asset_filename, asset_fulltext_name, docs_url, docs_title, provided_data_streams):
+    """
+    Produce :class:`leapp.model.ConsumedDataAsset` message for the given asset.
+
+    Intended for actors that load the asset without :func:`load_data_asset`, e.g. from a persistent cache
+    of previously processed asset content.
+
+    :param str asset_filename: The file name of the asset.
+    :param str asset_fulltext_name: A human readable asset name to display in error messages.
+    :param str docs_url: Docs url to provide if an asset is malformed or outdated.
+    :param str docs_title: Title of the documentation to where `docs_url` points to.
+    :param list provided_data_streams: Data streams provided by the asset as stated in its content.
+    """
     if provided_data_streams and not isinstance(provided_data_streams, list):
         provided_data_streams = []  # The asset will be later reported as malformed
 
@@ -203,5 +225,3 @@ def load_data_asset(actor_requesting_asset,
                                          docs_url=docs_url,
                                          docs_title=docs_title,
                                          provided_data_streams=provided_data_streams))
-
-    return asset_contents
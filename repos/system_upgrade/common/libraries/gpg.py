@@ -1,4 +1,9 @@
+import base64
+import binascii
+import hashlib
 import os
+import re
+import struct
 
 from leapp.libraries.common import config
 from leapp.libraries.common.config.version import get_source_major_version, get_target_major_version
@@ -7,6 +12,22 @@ from leapp.models import GpgKey
 
 GPG_CERTS_FOLDER = 'rpm-gpg'
 
+_PUBLIC_KEY_PACKET_TAG = 6
+
+_ARMORED_BLOCK_RE = re.compile(
+    r'-----BEGIN PGP PUBLIC KEY BLOCK-----\r?\n(.*?)-----END PGP PUBLIC KEY BLOCK-----',
+    re.DOTALL
+)
+
+_GPG_FP_CACHE = {}
+"""
+Fingerprints read from key files, indexed by (path, mtime, size) of the file.
+"""
+
+
+class _OpenPGPParseError(Exception):
+    pass
+
 
 def get_pubkeys_from_rpms(installed_rpms):
     """
@@ -24,6 +45,26 @@ def get_pubkeys_from_rpms(installed_rpms):
     return [GpgKey(fingerprint=pkg.version, rpmdb=True) for pkg in installed_rpms.items if pkg.name == 'gpg-pubkey']
 
 
+def get_gpg_keys_index(gpg_keys):
+    """
+    Return the index of the given GPG keys by their fingerprints
+
+    Use it for lookups of trusted keys (see the TrustedGpgKeys model) instead of
+    searching through the list of keys. When multiple keys share the fingerprint,
+    the first one is indexed (keys from RPM DB are listed first in TrustedGpgKeys).
+
+    :param gpg_keys: TrustedGpgKeys message or list of GPG keys
+    :type gpg_keys: Union[leapp.models.TrustedGpgKeys, list(leapp.models.GpgKey)]
+    :return: GPG keys indexed by their fingerprints
+    :rtype: dict(str, leapp.models.GpgKey)
+    """
+    items = getattr(gpg_keys, 'items', gpg_keys)
+    index = {}
+    for key in items:
+        index.setdefault(key.fingerprint, key)
+    return index
+
+
 def _gpg_show_keys(key_path):
     """
     Show keys in given file in version-agnostic manner
@@ -85,10 +126,130 @@ def _parse_fp_from_gpg(output):
     return gpg_fps
 
 
+def _dearmor(data):
+    """
+    Return binary OpenPGP data of all armored public key blocks in the data.
+
+    Return None if the data do not contain any armored block.
+    """
+    blocks = _ARMORED_BLOCK_RE.findall(data.decode('ascii', errors='replace'))
+    if not blocks:
+        return None
+    binary = b''
+    for block in blocks:
+        # armor headers are separated from the base64 body by an empty line
+        lines = block.splitlines()
+        if '' in [line.strip() for line in lines]:
+            lines = lines[[line.strip() for line in lines].index('') + 1:]
+        # skip the CRC24 checksum
+        body = ''.join(line.strip() for line in lines if not line.startswith('='))
+        try:
+            binary += base64.b64decode(body)
+        except (binascii.Error, ValueError) as e:
+            raise _OpenPGPParseError('Invalid armored data: {}'.format(e))
+    return binary
+
+
+def _iter_openpgp_packets(data):
+    """
+    Yield (tag, body) of OpenPGP packets in the binary data (RFC 4880, section 4.2).
+    """
+    pos = 0
+    while pos < len(data):
+        header = data[pos]
+        pos += 1
+        if not header & 0x80:
+            raise _OpenPGPParseError('Invalid packet header at offset {}'.format(pos - 1))
+        if header & 0x40:
+            # new packet format
+            tag = header & 0x3f
+            body = b''
+            while True:
+                if pos >= len(data):
+                    raise _OpenPGPParseError('Truncated packet length')
+                first = data[pos]
+                if first < 192:
+                    length, pos = first, pos + 1
+                elif first < 224:
+                    length, pos = ((first - 192) << 8) + data[pos + 1] + 192, pos + 2
+                elif first == 255:
+                    length, pos = struct.unpack('>I', data[pos + 1:pos + 5])[0], pos + 5
+                else:
+                    # partial body length, more parts follow
+                    length = 1 << (first & 0x1f)
+                    body += data[pos + 1:pos + 1 + length]
+                    pos += 1 + length
+                    continue
+                body += data[pos:pos + length]
+                pos += length
+                break
+        else:
+            # old packet format
+            tag = (header >> 2) & 0x0f
+            length_type = header & 0x03
+            if length_type == 3:
+                length = len(data) - pos
+            else:
+                size = 1 << length_type
+                length = int.from_bytes(data[pos:pos + size], 'big')
+                pos += size
+            body = data[pos:pos + length]
+            pos += length
+        if pos > len(data):
+            raise _OpenPGPParseError('Truncated packet with tag {}'.format(tag))
+        yield tag, body
+
+
+def _get_key_id(key_packet):
+    """
+    Return the key ID of the public key packet as a hex string (RFC 4880, section 12.2).
+    """
+    version = key_packet[0]
+    if version == 4:
+        header = b'\x99' + struct.pack('>H', len(key_packet))
+        return hashlib.sha1(header + key_packet).hexdigest()[-16:]
+    if version in (2, 3):
+        # the key ID is the low 64 bits of the RSA modulus
+        modulus_bits = struct.unpack('>H', key_packet[8:10])[0]
+        modulus = key_packet[10:10 + (modulus_bits + 7) // 8]
+        return binascii.hexlify(modulus[-8:]).decode('ascii')
+    raise _OpenPGPParseError('Unsupported public key packet version {}'.format(version))
+
+
+def _read_fp_from_file(key_path):
+    """
+    Read short fingerprints of public keys stored in the file without gnupg.
+
+    Both, armored and binary, formats are supported.
+
+    :raises _OpenPGPParseError: if the file does not contain valid OpenPGP data
+        (or data not supported by this parser)
+    :raises EnvironmentError: if the file cannot be read
+    """
+    with open(key_path, 'rb') as f:
+        data = f.read()
+    binary = _dearmor(data)
+    if binary is None:
+        binary = data
+
+    fps = []
+    for tag, body in _iter_openpgp_packets(binary):
+        if tag == _PUBLIC_KEY_PACKET_TAG:
+            if not body:
+                raise _OpenPGPParseError('Empty public key packet')
+            fps.append(_get_key_id(body)[8:])
+    if not fps:
+        raise _OpenPGPParseError('No public key found')
+    return fps
+
+
 def get_gpg_fp_from_file(key_path):
     """
     Return the list of public key fingerprints from the given file
 
+    The file is parsed in-process. Only when it's not possible (e.g. unknown format
+    of data), gpg2 is used instead. Results are cached per file content (path, mtime, size).
+
     Log warning in case no OpenPGP data found in the given file or it is not
     readable for some reason.
 
@@ -97,12 +258,26 @@ def get_gpg_fp_from_file(key_path):
     :return: List of public key fingerprints from the given file
     :rtype: list(str)
     """
-    res = _gpg_show_keys(key_path)
-    fp = _parse_fp_from_gpg(res)
-    if not fp:
-        error_msg = 'Unable to read OpenPGP keys from {}: {}'.format(key_path, res['stderr'])
-        api.current_logger().warning(error_msg)
-    return fp
+    try:
+        key_stat = os.stat(key_path)
+        cache_key = (key_path, key_stat.st_mtime, key_stat.st_size)
+    except OSError:
+        cache_key = None
+    if cache_key in _GPG_FP_CACHE:
+        return list(_GPG_FP_CACHE[cache_key])
+
+    try:
+        fp = _read_fp_from_file(key_path)
+    except (_OpenPGPParseError, EnvironmentError, IndexError, struct.error) as e:
+        api.current_logger().debug('Cannot parse OpenPGP keys from {}, using gpg2: {}'.format(key_path, e))
+        res = _gpg_show_keys(key_path)
+        fp = _parse_fp_from_gpg(res)
+        if not fp:
+            error_msg = 'Unable to read OpenPGP keys from {}: {}'.format(key_path, res.get('stderr'))
+            api.current_logger().warning(error_msg)
+    if cache_key and fp:
+        _GPG_FP_CACHE[cache_key] = fp
+    return list(fp)
 
 
 # TODO when a need for the same function for source arises, or when there is
@@ -1,3 +1,4 @@
+import contextlib
 import warnings
 
 from leapp.libraries.common.config.version import get_source_major_version
@@ -14,39 +15,92 @@ except ImportError:
     hawkey = None
     warnings.warn('Could not import the `hawkey` python module.', ImportWarning)
 
+_DNF_BASE = None
+"""
+DNF base with the filled sack shared within the process, see :func:`get_dnf_base`.
+"""
+
+
+def _create_dnf_base():
+    # The DNF command reads /etc/yum/vars/releasever, but the DNF library does not. It parses redhat-release
+    # package to retrieve system's major version which it then uses as $releasever. However, some systems might
+    # have repositories only for the exact system version (including the minor number). In a case when
+    # /etc/yum/vars/releasever is present, read its contents so that we can access repositores on such systems.
+    conf = dnf.conf.Conf()
+
+    # preload releasever from what we know, this will be our fallback
+    conf.substitutions['releasever'] = get_source_major_version()
+
+    # dnf on EL7 doesn't load vars from /etc/yum, so we need to help it a bit
+    if get_source_major_version() == '7':
+        try:
+            with open('/etc/yum/vars/releasever') as releasever_file:
+                conf.substitutions['releasever'] = releasever_file.read().strip()
+        except IOError:
+            pass
+
+    # load all substitutions from etc
+    conf.substitutions.update_from_etc('/')
+
+    base = dnf.Base(conf=conf)
+    base.conf.read()
+    base.init_plugins()
+    base.read_all_repos()
+    # configure plugins after the repositories are loaded
+    # e.g. the amazon-id plugin requires loaded repositories
+    # for the proper configuration.
+    base.configure_plugins()
+    base.fill_sack()
+    return base
+
+
+def get_dnf_base():
+    """
+    Return the DNF base with the filled sack shared within the current process.
+
+    The base is created and its sack filled (which includes reading the whole
+    RPM DB) on the first call only. All functions in this library use this
+    base unless another one is passed explicitly, so do the actors that need
+    to query the DNF sack. Use :func:`shared_dnf_base` to limit the lifetime
+    of the base, so the memory is released when it's not needed anymore.
+
+    :return: The shared DNF base
+    :rtype: dnf.Base
+    """
+    global _DNF_BASE  # pylint: disable=global-statement
+    if _DNF_BASE is None:
+        _DNF_BASE = _create_dnf_base()
+    return _DNF_BASE
+
+
+def release_dnf_base():
+    """
+    Close the DNF base shared within the current process (if created) and drop it.
+
+    The next call of :func:`get_dnf_base` creates a new base.
+    """
+    global _DNF_BASE  # pylint: disable=global-statement
+    if _DNF_BASE is not None:
+        _DNF_BASE.close()
+        _DNF_BASE = None
+
+
+@contextlib.contextmanager
+def shared_dnf_base():
+    """
+    Context manager releasing the shared DNF base on exit.
+
+    The base itself is still created lazily by :func:`get_dnf_base` - only when
+    something within the context needs it.
+    """
+    try:
+        yield
+    finally:
+        release_dnf_base()
+
 
 def _create_or_get_dnf_base(base=None):
-    if not base:
-        # The DNF command reads /etc/yum/vars/releasever, but the DNF library does not. It parses redhat-release
-        # package to retrieve system's major version which it then uses as $releasever. However, some systems might
-        # have repositories only for the exact system version (including the minor number). In a case when
-        # /etc/yum/vars/releasever is present, read its contents so that we can access repositores on such systems.
-        conf = dnf.conf.Conf()
-
-        # preload releasever from what we know, this will be our fallback
-        conf.substitutions['releasever'] = get_source_major_version()
-
-        # dnf on EL7 doesn't load vars from /etc/yum, so we need to help it a bit
-        if get_source_major_version() == '7':
-            try:
-                with open('/etc/yum/vars/releasever') as releasever_file:
-                    conf.substitutions['releasever'] = releasever_file.read().strip()
-            except IOError:
-                pass
-
-        # load all substitutions from etc
-        conf.substitutions.update_from_etc('/')
-
-        base = dnf.Base(conf=conf)
-        base.conf.read()
-        base.init_plugins()
-        base.read_all_repos()
-        # configure plugins after the repositories are loaded
-        # e.g. the amazon-id plugin requires loaded repositories
-        # for the proper configuration.
-        base.configure_plugins()
-        base.fill_sack()
-    return base
+    return base if base else get_dnf_base()
 
 
 def get_modules(base=None):
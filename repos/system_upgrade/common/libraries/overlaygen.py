@@ -3,9 +3,10 @@ import os
 import shutil
 import sys
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 from leapp.exceptions import StopActorExecutionError
-from leapp.libraries.common import mounting, utils
+from leapp.libraries.common import mounting, persistentcache, utils
 from leapp.libraries.common.config import get_env
 from leapp.libraries.common.config.version import get_target_major_version
 from leapp.libraries.stdlib import api, CalledProcessError, run
@@ -68,6 +69,31 @@ or close to that size, stay always with this minimal protected size defined by
 this constant.
 """
 
+_USERSPACE_SIZE_CACHE_NAME = 'userspace-size'
+"""
+Name of the persistent cache recording the size of the target userspace container.
+
+See record_userspace_size() and userspace_size_accounting() for more details.
+"""
+
+_DISK_IMAGES_DIR_NAME = 'diskimages'
+
+_DISK_IMAGES_LAYOUT_CACHE_NAME = 'overlay-disk-images'
+"""
+Name of the persistent cache describing disk images kept for the next leapp execution.
+
+The disk images are kept only when LEAPP_DEVEL_REUSE_DISK_IMGS=1.
+"""
+
+_MAX_DISK_IMAGE_WORKERS = 8
+"""
+Maximal number of disk images created and formatted at the same time.
+
+Creation of disk images is dominated by mkfs, which is mostly waiting for I/O,
+so processing several images at once speeds up systems with many mountpoints.
+The number is bounded to not overload the storage hosting the scratch directory.
+"""
+
 _MAX_DISK_IMAGE_SIZE_MB = 2**20  # 1*TB
 """
 Maximum size of the created (sparse) images.
@@ -131,12 +157,8 @@ def get_recommended_leapp_free_space(userspace_path=None):
     if not userspace_path or not os.path.exists(userspace_path):
         return min_cont_size
     try:
-        # ignore symlinks and other partitions to be sure we calculate the space
-        # in reasonable time
-        cont_size = run(['du', '-sPmx', userspace_path])['stdout'].split()[0]
-        # the obtained number is in KiB. But we want to work with MiBs rather.
-        cont_size = int(cont_size)
-    except (OSError, CalledProcessError):
+        cont_size = _get_userspace_size(userspace_path)
+    except OSError:
         # do not care about failed cmd, in such a case, just act like userspace_path
         # has not been set
         api.current_logger().warning(
@@ -163,6 +185,135 @@ def get_recommended_leapp_free_space(userspace_path=None):
     return prot_size
 
 
+def get_dir_size(path):
+    """
+    Return the disk space consumed by the directory tree in MiBs.
+
+    The result is the same as the one of `du -sPmx`: symlinks are not followed,
+    directories on other file systems are skipped and hard links are counted
+    just once. The value is rounded up to whole MiBs.
+
+    :param path: Path to the directory
+    :type path: str
+    :raises OSError: when the directory tree cannot be read
+    :rtype: int
+    """
+    root_stat = os.lstat(path)
+    size = root_stat.st_blocks * 512
+    seen_hardlinks = set()
+    dirs = [path]
+    while dirs:
+        with os.scandir(dirs.pop()) as entries:
+            for entry in entries:
+                entry_stat = entry.stat(follow_symlinks=False)
+                if entry_stat.st_dev != root_stat.st_dev:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                elif entry_stat.st_nlink > 1:
+                    if entry_stat.st_ino in seen_hardlinks:
+                        continue
+                    seen_hardlinks.add(entry_stat.st_ino)
+                size += entry_stat.st_blocks * 512
+    return -(-size // (1024 * 1024))
+
+
+def _get_userspace_size_key(userspace_path):
+    # The recorded size is valid only for the same instance of the directory
+    userspace_stat = os.stat(userspace_path)
+    return (userspace_path, userspace_stat.st_dev, userspace_stat.st_ino)
+
+
+def record_userspace_size(userspace_path, size=None):
+    """
+    Record the size of the userspace container, so it does not need to be computed again.
+
+    The recorded size is kept updated by code changing the content of the container
+    using userspace_size_accounting(), which makes queries for the size of
+    the container cheap.
+
+    :param userspace_path: Path to the userspace container.
+    :type userspace_path: str
+    :param size: The size of the container in MiBs. Computed by get_dir_size() if not set.
+    :type size: Optional[int]
+    """
+    try:
+        if size is None:
+            size = get_dir_size(userspace_path)
+        persistentcache.store(_USERSPACE_SIZE_CACHE_NAME, _get_userspace_size_key(userspace_path), size)
+    except OSError as e:
+        api.current_logger().debug('Cannot record the size of {}: {}'.format(userspace_path, e))
+
+
+def invalidate_userspace_size():
+    """
+    Drop the recorded size of the userspace container.
+
+    Use it when the content of the container is going to be changed in a way
+    that cannot be accounted.
+    """
+    persistentcache.remove(_USERSPACE_SIZE_CACHE_NAME)
+
+
+def _get_userspace_size(userspace_path):
+    """
+    Return the recorded size of the container in MiBs, computing and recording it if needed.
+    """
+    size = persistentcache.load(_USERSPACE_SIZE_CACHE_NAME, _get_userspace_size_key(userspace_path))
+    if size is None:
+        size = get_dir_size(userspace_path)
+        record_userspace_size(userspace_path, size)
+    return size
+
+
+def _get_userspace_dirs_size(userspace_path, paths):
+    size = 0
+    for path in paths:
+        full_path = os.path.join(userspace_path, path.lstrip('/'))
+        if os.path.isdir(full_path):
+            size += get_dir_size(full_path)
+    return size
+
+
+@contextlib.contextmanager
+def userspace_size_accounting(userspace_path, paths):
+    """
+    Account changes of the given directories inside the container into the recorded userspace size.
+
+    Only the given directories are traversed (before and after the execution of the block),
+    so the whole container does not need to be traversed again. The caller is responsible
+    for specifying all directories inside the container changed during the execution.
+
+    :param userspace_path: Path to the userspace container.
+    :type userspace_path: str
+    :param paths: Absolute paths of directories inside the container changed during the execution.
+    :type paths: List[str]
+    """
+    # noqa: W0135; pylint: disable=bad-option-value,contextmanager-generator-missing-cleanup
+    # NOTE(pstodulk): the pylint check is not valid in this case - finally is covered
+    # implicitly
+    try:
+        size_before = _get_userspace_dirs_size(userspace_path, paths)
+    except OSError:
+        size_before = None
+    try:
+        yield
+    finally:
+        size = None
+        try:
+            if size_before is not None:
+                size = persistentcache.load(_USERSPACE_SIZE_CACHE_NAME, _get_userspace_size_key(userspace_path))
+            if size is not None:
+                size += _get_userspace_dirs_size(userspace_path, paths) - size_before
+        except OSError:
+            size = None
+        if size is not None and size >= 0:
+            record_userspace_size(userspace_path, size)
+        else:
+            # the size will be computed again when needed
+            invalidate_userspace_size()
+
+
 def _get_fspace(path, convert_to_mibs=False, coefficient=1):
     """
     Return the free disk space on given path.
@@ -252,7 +403,83 @@ def _get_scratch_mountpoint(mount_points, dir_path):
     return None  # making pylint happy; this is basically dead code
 
 
-def _prepare_required_mounts(scratch_dir, mounts_dir, storage_info, scratch_reserve):
+def _is_disk_images_reuse_enabled():
+    return get_env('LEAPP_DEVEL_REUSE_DISK_IMGS', '0') == '1'
+
+
+def _get_disk_images_layout_key(disk_images_directory, xfs_info):
+    """
+    Return the key of the disk images layout covering everything shared by all disk images.
+    """
+    img_fs = 'ext4' if get_env('LEAPP_OVL_IMG_FS_EXT4', '0') == '1' else 'xfs'
+    xfs_key = None
+    if xfs_info:
+        xfs_key = (xfs_info.present, xfs_info.without_ftype, tuple(sorted(xfs_info.mountpoints_without_ftype)))
+    return (disk_images_directory, img_fs, xfs_key)
+
+
+def _get_fstab_signatures(storage_info):
+    return {entry.fs_file: (entry.fs_spec, entry.fs_vfstype) for entry in storage_info.fstab}
+
+
+def _get_reusable_disk_images(disk_images_directory, storage_info, xfs_info):
+    """
+    Get disk images kept by the previous leapp execution that are still valid.
+
+    A disk image is valid when it has been created for the same storage
+    device and file system type of the mountpoint, the same XFS setup and
+    the same file system of the disk images. Content of the disk images does
+    not matter as upper layers of overlays are always discarded when
+    the overlays are mounted.
+
+    :return: Sizes (in MiBs) of reusable disk images per mountpoint
+    :rtype: dict[str, int]
+    """
+    key = _get_disk_images_layout_key(disk_images_directory, xfs_info)
+    layout = persistentcache.load(_DISK_IMAGES_LAYOUT_CACHE_NAME, key)
+    # Do not trust the layout anymore until all disk images are prepared
+    persistentcache.remove(_DISK_IMAGES_LAYOUT_CACHE_NAME)
+    if not layout:
+        return {}
+
+    fstab_signatures = _get_fstab_signatures(storage_info)
+    reusable = {}
+    for mountpoint, (fstab_signature, disk_size) in layout.items():
+        diskimage_path = os.path.join(disk_images_directory, _mount_name(mountpoint))
+        if fstab_signatures.get(mountpoint) != fstab_signature or not os.path.isfile(diskimage_path):
+            api.current_logger().debug('The disk image for {} is stale.'.format(mountpoint))
+            continue
+        reusable[mountpoint] = disk_size
+    return reusable
+
+
+def _get_disk_image_allocated_size(diskimage_path):
+    """
+    Return the space allocated by the (sparse) disk image in MiBs, 0 if it cannot be determined.
+    """
+    try:
+        return os.stat(diskimage_path).st_blocks * 512 // (1024 * 1024)
+    except OSError:
+        return 0
+
+
+def _remove_stale_disk_images(disk_images_directory, reusable_images):
+    kept_images = {_mount_name(mountpoint) for mountpoint in reusable_images}
+    for image in os.listdir(disk_images_directory):
+        if image not in kept_images:
+            run(['rm', '-rf', os.path.join(disk_images_directory, image)])
+
+
+def _store_disk_images_layout(disk_images_directory, storage_info, xfs_info, disk_sizes):
+    fstab_signatures = _get_fstab_signatures(storage_info)
+    layout = {
+        mountpoint: (fstab_signatures.get(mountpoint), disk_size) for mountpoint, disk_size in disk_sizes.items()
+    }
+    key = _get_disk_images_layout_key(disk_images_directory, xfs_info)
+    persistentcache.store(_DISK_IMAGES_LAYOUT_CACHE_NAME, key, layout)
+
+
+def _prepare_required_mounts(scratch_dir, mounts_dir, storage_info, scratch_reserve, xfs_info=None):
     """
     Create disk images and loop mount them.
 
@@ -280,15 +507,22 @@ def _prepare_required_mounts(scratch_dir, mounts_dir, storage_info, scratch_rese
     :type storage_info: leapp.models.StorageInfo
     :param scratch_reserve: Number of MB that should be extra reserved in a partition hosting the scratch_dir.
     :type scratch_reserve: Optional[int]
+    :param xfs_info: The XFSPresence message.
+    :type xfs_info: Optional[leapp.models.XFSPresence]
     """
     mount_points = sorted([mp.fs_file for mp in _get_mountpoints(storage_info)])
     scratch_mp = _get_scratch_mountpoint(mount_points, scratch_dir)
-    disk_images_directory = os.path.join(scratch_dir, 'diskimages')
+    disk_images_directory = os.path.join(scratch_dir, _DISK_IMAGES_DIR_NAME)
 
     # Ensure we cleanup old disk images before we check for space constraints.
-    # NOTE(pstodulk): Could we improve the process so we create imgs & calculate
-    # the required disk space just once during each leapp (pre)upgrade run?
-    run(['rm', '-rf', disk_images_directory])
+    # Valid disk images are kept when their reuse is enabled, see LEAPP_DEVEL_REUSE_DISK_IMGS.
+    reusable_images = {}
+    if _is_disk_images_reuse_enabled() and os.path.isdir(disk_images_directory):
+        reusable_images = _get_reusable_disk_images(disk_images_directory, storage_info, xfs_info)
+    if reusable_images:
+        _remove_stale_disk_images(disk_images_directory, reusable_images)
+    else:
+        run(['rm', '-rf', disk_images_directory])
     _create_diskimages_dir(scratch_dir, disk_images_directory)
 
     # TODO(pstodulk): update the calculation for bind mounted mount_points (skip)
@@ -301,8 +535,15 @@ def _prepare_required_mounts(scratch_dir, mounts_dir, storage_info, scratch_rese
     # as disk images are cleaned in the end of this functions,
     # but we want to reserve some space in advance.
     scratch_disk_size = _get_fspace(scratch_dir, convert_to_mibs=True) - scratch_reserve
+    # Kept disk images are stored on the partition hosting the scratch dir. Their space would be free
+    # if they were created again, so count it as free. Otherwise the free space would be lower on every
+    # execution and the disk image for this partition would never be reused.
+    scratch_disk_size += sum(
+        _get_disk_image_allocated_size(os.path.join(disk_images_directory, _mount_name(mountpoint)))
+        for mountpoint in reusable_images
+    )
 
-    result = {}
+    disk_sizes = {}
     for mountpoint in mount_points:
         # keep the info about the free space rather 5% lower than the real value
         disk_size = _get_fspace(mountpoint, convert_to_mibs=True, coefficient=0.95)
@@ -314,15 +555,79 @@ def _prepare_required_mounts(scratch_dir, mounts_dir, storage_info, scratch_rese
                    'but we truncate it to %d MB to avoid bumping to max file limits.')
             api.current_logger().info(msg, mountpoint, disk_size, _MAX_DISK_IMAGE_SIZE_MB)
             disk_size = _MAX_DISK_IMAGE_SIZE_MB
+        disk_sizes[mountpoint] = disk_size
 
-        image = _create_mount_disk_image(disk_images_directory, mountpoint, disk_size)
+    images = {}
+    for mountpoint in mount_points:
+        # Disk image larger than the current free space could lead to consumption of the whole space
+        if mountpoint in reusable_images and reusable_images[mountpoint] <= disk_sizes[mountpoint]:
+            api.current_logger().debug('Reusing the disk image for {}'.format(mountpoint))
+            images[mountpoint] = os.path.join(disk_images_directory, _mount_name(mountpoint))
+            disk_sizes[mountpoint] = reusable_images[mountpoint]
+    images.update(_create_mount_disk_images(
+        disk_images_directory,
+        {mountpoint: disk_size for mountpoint, disk_size in disk_sizes.items() if mountpoint not in images}
+    ))
+    if _is_disk_images_reuse_enabled():
+        _store_disk_images_layout(disk_images_directory, storage_info, xfs_info, disk_sizes)
+
+    # NOTE: the order of items matters - mountpoints are mounted in this order later
+    result = {}
+    for mountpoint in mount_points:
         result[mountpoint] = mounting.LoopMount(
-            source=image,
+            source=images[mountpoint],
             target=_mount_dir(mounts_dir, mountpoint)
         )
     return result
 
 
+def _create_mount_disk_images(disk_images_directory, disk_sizes):
+    """
+    Create disk images for all given mountpoints concurrently.
+
+    Failures are collected for all mountpoints and reported together, so
+    the user can see all problems at once.
+
+    :param disk_images_directory: Path to the directory where disk images should be stored.
+    :type disk_images_directory: str
+    :param disk_sizes: Apparent sizes of the disk images in MiBs per mountpoint.
+    :type disk_sizes: dict[str, int]
+    :return: Paths to created disk images per mountpoint.
+    :rtype: dict[str, str]
+    :raises StopActorExecutionError: when creation of any disk image fails
+    """
+    with ThreadPoolExecutor(max_workers=_MAX_DISK_IMAGE_WORKERS) as executor:
+        jobs = {
+            mountpoint: executor.submit(_create_mount_disk_image, disk_images_directory, mountpoint, disk_size)
+            for mountpoint, disk_size in disk_sizes.items()
+        }
+
+    images = {}
+    failures = {}
+    for mountpoint in sorted(jobs):
+        try:
+            images[mountpoint] = jobs[mountpoint].result()
+        except StopActorExecutionError as e:
+            failures[mountpoint] = e
+
+    if len(failures) == 1:
+        raise next(iter(failures.values()))
+    if failures:
+        details = {
+            'details': '\n'.join(
+                '{}: {}'.format(mountpoint, e.message) for mountpoint, e in sorted(failures.items())
+            )
+        }
+        hints = sorted({e.details['hint'] for e in failures.values() if e.details and e.details.get('hint')})
+        if hints:
+            details['hint'] = '\n'.join(hints)
+        raise StopActorExecutionError(
+            message='Failed to create disk images for {} mountpoints.'.format(len(failures)),
+            details=details
+        )
+    return images
+
+
 @contextlib.contextmanager
 def _build_overlay_mount(root_mount, mounts):
     # noqa: W0135; pylint: disable=bad-option-value,contextmanager-generator-missing-cleanup
@@ -371,14 +676,25 @@ def cleanup_scratch(scratch_dir, mounts_dir):
     if get_env('LEAPP_DEVEL_KEEP_DISK_IMGS', None) == '1':
         # NOTE(pstodulk): From time to time, it helps me with some experiments
         return
+    if _is_disk_images_reuse_enabled() and os.path.isdir(scratch_dir):
+        # Keep disk images for the next execution; remove just the rest
+        api.current_logger().debug('Removing scratch directory %s except disk images.', scratch_dir)
+        for entry in os.listdir(scratch_dir):
+            if entry != _DISK_IMAGES_DIR_NAME:
+                _rmtree(os.path.join(scratch_dir, entry))
+        return
     api.current_logger().debug('Recursively removing scratch directory %s.', scratch_dir)
+    _rmtree(scratch_dir)
+    api.current_logger().debug('Recursively removed scratch directory %s.', scratch_dir)
+
+
+def _rmtree(path):
     if sys.version_info >= (3, 12):
         # NOTE(mmatuska): The pylint suppressions are required because of a bug in pylint:
         # (https://github.com/pylint-dev/pylint/issues/9622)
-        shutil.rmtree(scratch_dir, onexc=utils.report_and_ignore_shutil_rmtree_error)  # noqa: E501; pylint: disable=unexpected-keyword-arg
+        shutil.rmtree(path, onexc=utils.report_and_ignore_shutil_rmtree_error)  # noqa: E501; pylint: disable=unexpected-keyword-arg
     else:
-        shutil.rmtree(scratch_dir, onerror=utils.report_and_ignore_shutil_rmtree_error)  # noqa: E501; pylint: disable=deprecated-argument
-    api.current_logger().debug('Recursively removed scratch directory %s.', scratch_dir)
+        shutil.rmtree(path, onerror=utils.report_and_ignore_shutil_rmtree_error)  # noqa: E501; pylint: disable=deprecated-argument
 
 
 def _format_disk_image_ext4(diskimage_path):
@@ -627,7 +943,7 @@ def create_source_overlay(
     try:
         _create_mounts_dir(scratch_dir, mounts_dir)
         if get_env('LEAPP_OVL_LEGACY', '0') != '1':
-            mounts = _prepare_required_mounts(scratch_dir, mounts_dir, storage_info, scratch_reserve)
+            mounts = _prepare_required_mounts(scratch_dir, mounts_dir, storage_info, scratch_reserve, xfs_info)
         else:
             # fallback to the deprecated OVL solution
             mounts = _prepare_required_mounts_old(scratch_dir, mounts_dir, _get_mountpoints(storage_info), xfs_info)
@@ -0,0 +1,117 @@
+import errno
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+
+from leapp.libraries.stdlib import api
+
+PERSISTENT_CACHE_DIR = '/var/lib/leapp/cache'
+"""
+Directory hosting data cached between leapp executions.
+
+The cached data are always just an optimization - they can be removed anytime and they are
+re-created on the next run.
+"""
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def get_file_checksum(path):
+    """
+    Get the sha256 checksum of the given file.
+
+    :param str path: Path to the file
+    :return: Hex digest of the file content or None if the file cannot be read
+    :rtype: Optional[str]
+    """
+    checksum = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                checksum.update(chunk)
+    except EnvironmentError:
+        return None
+    return checksum.hexdigest()
+
+
+def _get_cache_path(name):
+    return os.path.join(PERSISTENT_CACHE_DIR, name)
+
+
+def _make_full_key(key):
+    # The marshal format is specific for the python version
+    return (tuple(sys.version_info[:2]), key)
+
+
+def load(name, key):
+    """
+    Load data stored in the persistent cache under the given name.
+
+    The data are returned only when they were stored with the same key, so the key should
+    cover everything the cached data are derived from (e.g. checksums of data files or versions).
+
+    :param str name: Name of the cache file
+    :param key: A key composed of basic python types (tuples, strings, numbers, ...)
+    :return: The cached data or None if the cache is missing, invalid or outdated
+    """
+    path = _get_cache_path(name)
+    try:
+        with open(path, 'rb') as f:
+            cached_key, data = marshal.load(f)
+    except (EnvironmentError, EOFError, ValueError, TypeError):
+        api.current_logger().debug('No valid persistent cache found at {}'.format(path))
+        return None
+
+    if cached_key != _make_full_key(key):
+        api.current_logger().debug('The persistent cache {} is outdated'.format(path))
+        return None
+    return data
+
+
+def store(name, key, data):
+    """
+    Store data in the persistent cache under the given name.
+
+    The data are written atomically, so concurrent readers see either the previous or the new content.
+    Failures are logged and otherwise ignored as the cache is just an optimization.
+
+    :param str name: Name of the cache file
+    :param key: A key composed of basic python types identifying the data, see :func:`load`
+    :param data: Data composed of basic python types (these have to be serializable by marshal)
+    :return: True if the data have been stored, False otherwise
+    :rtype: bool
+    """
+    path = _get_cache_path(name)
+    tmp_path = None
+    try:
+        if not os.path.isdir(PERSISTENT_CACHE_DIR):
+            os.makedirs(PERSISTENT_CACHE_DIR, mode=0o700)
+        fd, tmp_path = tempfile.mkstemp(dir=PERSISTENT_CACHE_DIR, prefix='.{}.'.format(name))
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump((_make_full_key(key), data), f)
+        os.rename(tmp_path, path)
+    except (EnvironmentError, ValueError) as e:
+        api.current_logger().warning('Cannot store the persistent cache {}: {}'.format(path, e))
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        return False
+    return True
+
+
+def remove(name):
+    """
+    Remove data stored in the persistent cache under the given name.
+
+    Use it when the cached data cannot be trusted anymore, e.g. when the data
+    they describe are being changed.
+
+    :param str name: Name of the cache file
+    """
+    path = _get_cache_path(name)
+    try:
+        os.unlink(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            api.current_logger().warning('Cannot remove the persistent cache {}: {}'.format(path, e))
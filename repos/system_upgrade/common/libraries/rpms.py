@@ -1,6 +1,17 @@
+import hashlib
+import os
+import warnings
+
 from leapp.libraries import stdlib
+from leapp.libraries.common import persistentcache
 from leapp.libraries.common.config.version import get_source_major_version
-from leapp.models import InstalledRPM
+from leapp.models import InstalledRPM, RPM
+
+try:
+    import rpm
+except ImportError:
+    rpm = None
+    warnings.warn('Could not import the `rpm` python module.', ImportWarning)
 
 
 class LeappComponents:
@@ -48,21 +59,237 @@ GET_LEAPP_PACKAGES_DEFAULT_COMPONENTS = frozenset((LeappComponents.FRAMEWORK,
                                                    LeappComponents.TOOLS))
 
 
-def get_installed_rpms():
-    rpm_cmd = [
-        '/bin/rpm',
-        '-qa',
-        '--queryformat',
-        r'%{NAME}|%{VERSION}|%{RELEASE}|%|EPOCH?{%{EPOCH}}:{0}||%|PACKAGER?{%{PACKAGER}}:{(none)}||%|'
-        r'ARCH?{%{ARCH}}:{}||%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{(none)}|}|\n'
-    ]
+_INSTALLED_RPMS_CACHE = {}
+"""
+Data of installed packages read from the RPM DB, keyed by the stamp of the RPM DB (see _get_rpmdb_stamp).
+
+Every actor runs in its own process, so the data are also stored in the persistent cache
+under _INSTALLED_RPMS_CACHE_NAME to share a single RPM DB scan between actors.
+"""
+
+_INSTALLED_RPMS_CACHE_NAME = 'installed-rpms'
+
+_RPMDB_DEFAULT_PATH = '/var/lib/rpm'
+
+_RPMDB_FILES = ('rpmdb.sqlite', 'Packages', 'Packages.db')
+"""
+Main RPM DB files of the sqlite, bdb and ndb backends.
+
+Other files in the RPM DB directory (e.g. __db.* regions of bdb, -shm and -wal files of sqlite)
+are modified even when the RPM DB is just opened, so they are not part of the RPM DB stamp.
+rpm checkpoints the sqlite write-ahead log into rpmdb.sqlite when it closes the RPM DB
+after a modification.
+"""
+
+_PGPSIG_QUERYFORMAT = r'%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{(none)}|}|'
+
+_RPM_QUERYFORMAT = (
+    r'%{NAME}|%{VERSION}|%{RELEASE}|%|EPOCH?{%{EPOCH}}:{0}||%|PACKAGER?{%{PACKAGER}}:{(none)}||%|'
+    r'ARCH?{%{ARCH}}:{}||' + _PGPSIG_QUERYFORMAT + r'\n'
+)
+
+
+DIGEST_ALGORITHMS = {1: 'md5', 2: 'sha1', 8: 'sha256', 9: 'sha384', 10: 'sha512', 11: 'sha224'}
+"""
+Map of the rpm (OpenPGP) hash algorithm IDs to hashlib names.
+"""
+
+DEFAULT_DIGEST_ALGORITHM = 1
+"""
+The hash algorithm ID of file digests in package headers without the FILEDIGESTALGO tag.
+"""
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def to_str(value):
+    """
+    Convert a value read from a package header to str
+
+    The rpm python bindings return bytes for string tags on some systems.
+    """
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'surrogateescape')
+    return value
+
+
+def get_file_digest(path, algorithm):
+    """
+    Compute the hex digest of the given file
+
+    :param path: Path to the file
+    :param algorithm: The hashlib name of the algorithm, see DIGEST_ALGORITHMS
+    :raises EnvironmentError: When the file cannot be read
+    """
+    checksum = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def _get_rpmdb_stamp():
+    """
+    Get a value which changes whenever the RPM DB is modified
+
+    :return: Tuple of (name, inode, mtime, size) of the main RPM DB files or None if no such file is found
+    """
+    dbpath = rpm.expandMacro('%{_dbpath}') if rpm else _RPMDB_DEFAULT_PATH
+    stamp = []
+    for name in _RPMDB_FILES:
+        try:
+            stat = os.stat(os.path.join(dbpath, name))
+        except OSError:
+            continue
+        stamp.append((name, stat.st_ino, stat.st_mtime_ns, stat.st_size))
+    if not stamp:
+        return None
+    return (dbpath, tuple(stamp))
+
+
+def _read_installed_rpms_rpmdb():
+    """
+    Read the installed packages from the RPM DB using the rpm python bindings
+
+    :return: List of (name, version, release, epoch, packager, arch, pgpsig) tuples
+             or None if the RPM DB cannot be read
+    """
+    result = []
+    ts = rpm.TransactionSet()
     try:
-        return stdlib.run(rpm_cmd, split=True)['stdout']
+        for hdr in ts.dbMatch():
+            epoch = hdr[rpm.RPMTAG_EPOCH]
+            packager = hdr[rpm.RPMTAG_PACKAGER]
+            arch = hdr[rpm.RPMTAG_ARCH]
+            result.append((
+                to_str(hdr[rpm.RPMTAG_NAME]),
+                to_str(hdr[rpm.RPMTAG_VERSION]),
+                to_str(hdr[rpm.RPMTAG_RELEASE]),
+                '0' if epoch is None else str(epoch),
+                '(none)' if packager is None else to_str(packager),
+                '' if arch is None else to_str(arch),
+                to_str(hdr.format(_PGPSIG_QUERYFORMAT)),
+            ))
+    except rpm.error as err:
+        stdlib.api.current_logger().error('Unable to read installed packages from the RPM DB: {}'.format(err))
+        return None
+    finally:
+        ts.closeDB()
+    return result
+
+
+def _read_installed_rpms_cmd():
+    """
+    Read the installed packages using the rpm command
+
+    Used when the rpm python bindings are not available.
+
+    :return: List of (name, version, release, epoch, packager, arch, pgpsig) tuples
+             or None if the command fails
+    """
+    rpm_cmd = ['/bin/rpm', '-qa', '--queryformat', _RPM_QUERYFORMAT]
+    try:
+        output = stdlib.run(rpm_cmd, split=True)['stdout']
     except stdlib.CalledProcessError as err:
         error = 'Execution of {CMD} returned {RC}. Unable to find installed packages.'.format(CMD=err.command,
                                                                                               RC=err.exit_code)
         stdlib.api.current_logger().error(error)
-        return []
+        return None
+
+    result = []
+    for line in output:
+        line = line.strip()
+        if not line:
+            continue
+        fields = line.split('|')
+        if len(fields) != 7:
+            stdlib.api.current_logger().warning('Could not parse rpm: {}, skipping'.format(line))
+            continue
+        result.append(tuple(fields))
+    return result
+
+
+def _get_installed_rpms_data():
+    """
+    Get data of installed packages as tuples (name, version, release, epoch, packager, arch, pgpsig)
+
+    The data are cached in memory and in the persistent cache, both keyed by the stamp
+    of the RPM DB. So the RPM DB is scanned just once for all actors asking for installed
+    packages until it is modified.
+    """
+    stamp = _get_rpmdb_stamp()
+    if stamp and stamp in _INSTALLED_RPMS_CACHE:
+        return _INSTALLED_RPMS_CACHE[stamp]
+
+    data = persistentcache.load(_INSTALLED_RPMS_CACHE_NAME, stamp) if stamp else None
+    if data is None:
+        data = _read_installed_rpms_rpmdb() if rpm else _read_installed_rpms_cmd()
+        if data is None:
+            return []
+        # the stamp is checked again, so the data are not cached when the RPM DB has been modified meanwhile
+        if not stamp or stamp != _get_rpmdb_stamp():
+            return data
+        persistentcache.store(_INSTALLED_RPMS_CACHE_NAME, stamp, data)
+
+    _INSTALLED_RPMS_CACHE.clear()
+    _INSTALLED_RPMS_CACHE[stamp] = data
+    return data
+
+
+def get_installed_rpm_items():
+    """
+    Get the list of installed packages
+
+    The RPM DB is read by the rpm python bindings (or the rpm command when
+    they are not available). The result is cached until the RPM DB is
+    modified, so the function is cheap to call from multiple actors.
+
+    Note that the repository, module and stream fields of the returned items
+    are not set. Consume the InstalledRPM message when these are needed.
+
+    :return: Installed packages
+    :rtype: list(leapp.models.RPM)
+    """
+    return [
+        RPM(name=name, version=version, release=release, epoch=epoch, packager=packager, arch=arch, pgpsig=pgpsig)
+        for name, version, release, epoch, packager, arch, pgpsig in _get_installed_rpms_data()
+    ]
+
+
+def get_installed_rpms():
+    """
+    Get the list of installed packages as strings
+
+    Each string has the "name|version|release|epoch|packager|arch|pgpsig" format.
+    Prefer :func:`get_installed_rpm_items` which does not need any parsing.
+
+    :rtype: list(str)
+    """
+    return ['|'.join(fields) for fields in _get_installed_rpms_data()]
+
+
+def get_leapp_repository_version():
+    """
+    Get the version of the installed leapp-repository package.
+
+    :return: The VERSION-RELEASE string of the installed leapp-repository rpm
+             or None when it cannot be determined (e.g. leapp-repository is not installed from an rpm).
+    :rtype: Optional[str]
+    """
+    pkgs = get_leapp_packages(component=LeappComponents.REPOSITORY)
+    rpm_cmd = ['/bin/rpm', '-q', '--queryformat', r'%{NAME} %{VERSION}-%{RELEASE}\n'] + pkgs
+    try:
+        # rpm returns non-zero exit code when any of the queried packages is not installed
+        output = stdlib.run(rpm_cmd, split=True, checked=False)['stdout']
+    except OSError as err:
+        stdlib.api.current_logger().warning('Cannot determine the version of leapp-repository: {}'.format(err))
+        return None
+
+    for line in output:
+        fields = line.split()
+        if len(fields) == 2 and fields[0] in pkgs:
+            return fields[1]
+    return None
 
 
 def create_lookup(model, field, keys, context=stdlib.api):
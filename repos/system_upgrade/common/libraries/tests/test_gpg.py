@@ -6,9 +6,9 @@ import distro
 import pytest
 
 from leapp.libraries.common import gpg
-from leapp.libraries.common.testutils import CurrentActorMocked
+from leapp.libraries.common.testutils import CurrentActorMocked, logger_mocked
 from leapp.libraries.stdlib import api
-from leapp.models import GpgKey, InstalledRPM, RPM
+from leapp.models import GpgKey, InstalledRPM, RPM, TrustedGpgKeys
 
 
 @pytest.mark.parametrize('target, product_type, distro, exp', [
@@ -130,6 +130,56 @@ def test_parse_fp_from_gpg(res, exp):
     assert fp == exp
 
 
+_DISTRO_FILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'files', 'distro')
+
+
+@pytest.mark.parametrize('key_file, exp', [
+    ('rhel/rpm-gpg/8/RPM-GPG-KEY-redhat-release', ['fd431d51', 'd4082792']),
+    ('rhel/rpm-gpg/9/RPM-GPG-KEY-redhat-release', ['fd431d51', '5a6340b3']),
+    ('rhel/rpm-gpg/9beta/RPM-GPG-KEY-redhat-beta', ['f21541eb']),
+    ('centos/rpm-gpg/9/RPM-GPG-KEY-centosofficial', ['8483c65d']),
+    ('almalinux/rpm-gpg/10/RPM-GPG-KEY-AlmaLinux-10', ['c2a1e572']),
+])
+def test_read_fp_from_file(tmpdir, key_file, exp):
+    key_path = os.path.join(_DISTRO_FILES_PATH, key_file)
+    assert gpg._read_fp_from_file(key_path) == exp
+
+    # the same keys in the binary format
+    with open(key_path, 'rb') as f:
+        binary_key_path = tmpdir.join('key.gpg')
+        binary_key_path.write_binary(gpg._dearmor(f.read()))
+    assert gpg._read_fp_from_file(str(binary_key_path)) == exp
+
+
+def test_get_gpg_fp_from_file_fallback_and_cache(monkeypatch, tmpdir):
+    gpg_calls = []
+
+    def gpg_show_keys_mocked(key_path):
+        gpg_calls.append(key_path)
+        return {'stdout': ['pub:-:4096:1:5054E4A45A6340B3:1646863006:::-:::scSC::::::23::0:'],
+                'stderr': '', 'exit_code': 0}
+
+    monkeypatch.setattr(gpg, '_gpg_show_keys', gpg_show_keys_mocked)
+    monkeypatch.setattr(gpg, '_GPG_FP_CACHE', {})
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+
+    key_path = os.path.join(_DISTRO_FILES_PATH, 'rhel/rpm-gpg/9beta/RPM-GPG-KEY-redhat-beta')
+    assert gpg.get_gpg_fp_from_file(key_path) == ['f21541eb']
+    assert not gpg_calls
+
+    # gpg2 is used for data the parser cannot handle; results are cached per file
+    unknown_key_path = tmpdir.join('unknown-key')
+    unknown_key_path.write('not an OpenPGP data')
+    assert gpg.get_gpg_fp_from_file(str(unknown_key_path)) == ['5a6340b3']
+    assert gpg.get_gpg_fp_from_file(str(unknown_key_path)) == ['5a6340b3']
+    assert gpg_calls == [str(unknown_key_path)]
+
+    # the file has been changed
+    unknown_key_path.write('still not an OpenPGP data')
+    assert gpg.get_gpg_fp_from_file(str(unknown_key_path)) == ['5a6340b3']
+    assert len(gpg_calls) == 2
+
+
 def test_pubkeys_from_rpms():
     installed_rpms = InstalledRPM(
         items=[
@@ -150,3 +200,14 @@ def test_pubkeys_from_rpms():
         ],
     )
     assert gpg.get_pubkeys_from_rpms(installed_rpms) == [GpgKey(fingerprint='9570ff31', rpmdb=True)]
+
+
+def test_get_gpg_keys_index():
+    rpmdb_key = GpgKey(fingerprint='9570ff31', rpmdb=True)
+    file_keys = [
+        GpgKey(fingerprint='9570ff31', rpmdb=False, filename='/path/to/key1'),
+        GpgKey(fingerprint='0000ff31', rpmdb=False, filename='/path/to/key1'),
+    ]
+    index = gpg.get_gpg_keys_index(TrustedGpgKeys(items=[rpmdb_key] + file_keys))
+    assert index == {'9570ff31': rpmdb_key, '0000ff31': file_keys[1]}
+    assert gpg.get_gpg_keys_index(file_keys) == {'9570ff31': file_keys[0], '0000ff31': file_keys[1]}
@@ -0,0 +1,34 @@
+from leapp.libraries.common import module
+
+
+class MockedDnfBase:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_shared_dnf_base(monkeypatch):
+    created = []
+
+    def mocked_create_dnf_base():
+        created.append(MockedDnfBase())
+        return created[-1]
+
+    monkeypatch.setattr(module, '_create_dnf_base', mocked_create_dnf_base)
+    monkeypatch.setattr(module, '_DNF_BASE', None)
+
+    with module.shared_dnf_base():
+        # the base is created lazily
+        assert not created
+        base = module.get_dnf_base()
+        assert module.get_dnf_base() is base
+        assert module._create_or_get_dnf_base() is base
+        assert len(created) == 1
+
+    assert base.closed
+    assert module.get_dnf_base() is not base
+    assert len(created) == 2
+    module.release_dnf_base()
+    assert created[1].closed
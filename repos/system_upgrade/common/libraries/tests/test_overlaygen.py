@@ -0,0 +1,167 @@
+import os
+import subprocess
+
+import pytest
+
+from leapp.exceptions import StopActorExecutionError
+from leapp.libraries.common import overlaygen, persistentcache
+from leapp.libraries.common.testutils import logger_mocked
+from leapp.libraries.stdlib import api
+from leapp.models import FstabEntry, StorageInfo, XFSPresence
+
+
+def _create_mount_disk_image_mocked(failing_mountpoints):
+    def create_mount_disk_image(disk_images_directory, path, disk_size):
+        if path in failing_mountpoints:
+            raise StopActorExecutionError(
+                message='Cannot create XFS filesystem for {}'.format(path),
+                details={'hint': 'Check the free space.'}
+            )
+        return '{}/{}-{}'.format(disk_images_directory, overlaygen._mount_name(path), disk_size)
+    return create_mount_disk_image
+
+
+def test_create_mount_disk_images(monkeypatch):
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    monkeypatch.setattr(overlaygen, '_create_mount_disk_image', _create_mount_disk_image_mocked(set()))
+    disk_sizes = {'/var/log': 200, '/': 1000, '/opt/db': 300}
+
+    images = overlaygen._create_mount_disk_images('/scratch/diskimages', disk_sizes)
+
+    assert images == {
+        '/': '/scratch/diskimages/root_-1000',
+        '/opt/db': '/scratch/diskimages/root_opt_db-300',
+        '/var/log': '/scratch/diskimages/root_var_log-200',
+    }
+
+
+def test_create_mount_disk_images_single_failure(monkeypatch):
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    monkeypatch.setattr(overlaygen, '_create_mount_disk_image', _create_mount_disk_image_mocked({'/var/log'}))
+
+    with pytest.raises(StopActorExecutionError) as err:
+        overlaygen._create_mount_disk_images('/scratch/diskimages', {'/': 1000, '/var/log': 200})
+    assert err.value.message == 'Cannot create XFS filesystem for /var/log'
+
+
+def test_create_mount_disk_images_failures_reported_together(monkeypatch):
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    failing = {'/opt/db', '/var/log'}
+    monkeypatch.setattr(overlaygen, '_create_mount_disk_image', _create_mount_disk_image_mocked(failing))
+
+    with pytest.raises(StopActorExecutionError) as err:
+        overlaygen._create_mount_disk_images('/scratch/diskimages', {'/': 1000, '/var/log': 200, '/opt/db': 300})
+
+    assert err.value.message == 'Failed to create disk images for 2 mountpoints.'
+    assert err.value.details['details'] == (
+        '/opt/db: Cannot create XFS filesystem for /opt/db\n'
+        '/var/log: Cannot create XFS filesystem for /var/log'
+    )
+    assert err.value.details['hint'] == 'Check the free space.'
+
+
+def _fstab_entry(fs_spec, fs_file, fs_vfstype='xfs'):
+    return FstabEntry(fs_spec=fs_spec, fs_file=fs_file, fs_vfstype=fs_vfstype,
+                      fs_mntops='defaults', fs_freq='0', fs_passno='0')
+
+
+def _prepare_required_mounts(monkeypatch, tmpdir, fstab, free_space_mib, reuse='1'):
+    created = {}
+
+    def create_mount_disk_images(disk_images_directory, disk_sizes):
+        created.update(disk_sizes)
+        images = {}
+        for mountpoint in disk_sizes:
+            images[mountpoint] = str(tmpdir.join('scratch', 'diskimages', overlaygen._mount_name(mountpoint)))
+            tmpdir.join('scratch', 'diskimages', overlaygen._mount_name(mountpoint)).write('')
+        return images
+
+    monkeypatch.setattr(overlaygen, 'get_env', lambda name, default=None: reuse if 'REUSE' in name else default)
+    monkeypatch.setattr(overlaygen, '_get_mountpoints',
+                        lambda storage_info: [overlaygen.MountPoints(e.fs_file, e.fs_vfstype) for e in fstab])
+    monkeypatch.setattr(overlaygen, '_get_fspace', lambda path, convert_to_mibs, coefficient=1: free_space_mib)
+    monkeypatch.setattr(overlaygen, '_ensure_enough_diskimage_space', lambda *args: None)
+    monkeypatch.setattr(overlaygen, '_create_mount_disk_images', create_mount_disk_images)
+    monkeypatch.setattr(overlaygen.mounting, 'LoopMount', lambda source, target: source)
+
+    mounts = overlaygen._prepare_required_mounts(
+        str(tmpdir.join('scratch')), str(tmpdir.join('mounts')), StorageInfo(fstab=fstab), 0, XFSPresence()
+    )
+    assert list(mounts.keys()) == sorted(e.fs_file for e in fstab)
+    return created
+
+
+def test_prepare_required_mounts_reuses_valid_images(monkeypatch, tmpdir):
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir.join('cache')))
+    fstab = [_fstab_entry('/dev/sda1', '/'), _fstab_entry('/dev/sda2', '/var/log')]
+
+    created = _prepare_required_mounts(monkeypatch, tmpdir, fstab, 1000)
+    assert created == {'/': 1000, '/var/log': 1000}
+
+    # Nothing changed - everything is reused
+    assert not _prepare_required_mounts(monkeypatch, tmpdir, fstab, 1000)
+
+    # The device of /var/log changed, new mountpoint added and less free space for the root image
+    fstab = [_fstab_entry('/dev/sda1', '/'), _fstab_entry('/dev/sdb1', '/var/log'), _fstab_entry('/dev/sdc1', '/opt')]
+    created = _prepare_required_mounts(monkeypatch, tmpdir, fstab, 900)
+    assert created == {'/': 900, '/var/log': 900, '/opt': 900}
+
+
+def test_prepare_required_mounts_reuses_scratch_image(monkeypatch, tmpdir):
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir.join('cache')))
+    monkeypatch.setattr(overlaygen, '_get_disk_image_allocated_size', lambda path: 150)
+    fstab = [_fstab_entry('/dev/sda1', '/')]
+
+    assert _prepare_required_mounts(monkeypatch, tmpdir, fstab, 1000) == {'/': 1000}
+
+    # The kept disk image consumes the free space of the partition hosting the scratch dir
+    assert not _prepare_required_mounts(monkeypatch, tmpdir, fstab, 850)
+
+    # Less free space than the kept disk image would consume
+    assert _prepare_required_mounts(monkeypatch, tmpdir, fstab, 700) == {'/': 850}
+
+
+def test_prepare_required_mounts_without_reuse(monkeypatch, tmpdir):
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir.join('cache')))
+    fstab = [_fstab_entry('/dev/sda1', '/')]
+
+    assert _prepare_required_mounts(monkeypatch, tmpdir, fstab, 1000, reuse='0') == {'/': 1000}
+    assert _prepare_required_mounts(monkeypatch, tmpdir, fstab, 1000, reuse='0') == {'/': 1000}
+
+
+def _du_size(path):
+    return int(subprocess.check_output(['du', '-sPmx', path]).split()[0])
+
+
+def test_get_dir_size(tmpdir):
+    tmpdir.join('dir', 'subdir').ensure(dir=True)
+    tmpdir.join('dir', 'subdir', 'data').write('x' * 3 * 1024 * 1024)
+    tmpdir.join('dir', 'small').write('x')
+    os.link(str(tmpdir.join('dir', 'subdir', 'data')), str(tmpdir.join('dir', 'hardlink')))
+    os.symlink(str(tmpdir.join('dir', 'subdir')), str(tmpdir.join('dir', 'symlink')))
+
+    assert overlaygen.get_dir_size(str(tmpdir)) == _du_size(str(tmpdir))
+
+
+def test_userspace_size_accounting(monkeypatch, tmpdir):
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir.join('cache')))
+    userspace = tmpdir.join('userspace').ensure(dir=True)
+    userspace.join('var', 'cache', 'dnf').ensure(dir=True)
+    dir_sizes = {'dnf': 10, 'userspace': 300}
+    monkeypatch.setattr(overlaygen, 'get_dir_size', lambda path: dir_sizes[os.path.basename(path)])
+
+    overlaygen.record_userspace_size(str(userspace))
+    # changes outside of the accounted directories (e.g. disk images of the overlay) are ignored
+    with overlaygen.userspace_size_accounting(str(userspace), ['/var/cache/dnf', '/var/log']):
+        dir_sizes['dnf'] += 200
+    assert overlaygen._get_userspace_size(str(userspace)) == 500
+
+    # The size is computed again when the recorded one is not valid
+    overlaygen.invalidate_userspace_size()
+    with overlaygen.userspace_size_accounting(str(userspace), ['/var/cache/dnf']):
+        dir_sizes['dnf'] += 200
+    assert overlaygen._get_userspace_size(str(userspace)) == 300
@@ -0,0 +1,57 @@
+import os
+
+from leapp.libraries.common import persistentcache
+from leapp.libraries.common.testutils import logger_mocked
+from leapp.libraries.stdlib import api
+
+
+def test_store_and_load(monkeypatch, tmpdir):
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir.join('cache')))
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+
+    data = ({'streams': ['1.0']}, (('pkg', 'repo', None), ('pkg', 'repo', ('module', 'stream'))))
+    assert persistentcache.store('test-cache', ('checksum', '1.0'), data)
+
+    assert persistentcache.load('test-cache', ('checksum', '1.0')) == data
+    assert persistentcache.load('test-cache', ('checksum', '1.1')) is None
+    assert persistentcache.load('missing-cache', ('checksum', '1.0')) is None
+    # No leftover temporary files
+    assert os.listdir(persistentcache.PERSISTENT_CACHE_DIR) == ['test-cache']
+
+
+def test_load_corrupted_cache(monkeypatch, tmpdir):
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    tmpdir.join('test-cache').write_binary(b'\x00garbage')
+
+    assert persistentcache.load('test-cache', 'key') is None
+
+
+def test_store_unserializable_data(monkeypatch, tmpdir):
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+
+    assert not persistentcache.store('test-cache', 'key', object())
+    assert not os.listdir(str(tmpdir))
+    assert api.current_logger.warnmsg
+
+
+def test_remove(monkeypatch, tmpdir):
+    monkeypatch.setattr(persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    assert persistentcache.store('test-cache', 'key', 'data')
+
+    persistentcache.remove('test-cache')
+    assert persistentcache.load('test-cache', 'key') is None
+    # Removing a missing cache is fine
+    persistentcache.remove('test-cache')
+    assert not api.current_logger.warnmsg
+
+
+def test_get_file_checksum(tmpdir):
+    data_file = tmpdir.join('data.json')
+    data_file.write('{}')
+
+    checksum = persistentcache.get_file_checksum(str(data_file))
+    assert checksum == '44136fa355b3678a1146ad16f7e8649e94fb4fc21fe77e8310c060f61caaff8a'
+    assert persistentcache.get_file_checksum(str(tmpdir.join('missing.json'))) is None
@@ -1,7 +1,8 @@
 import pytest
 
+from leapp.libraries.common import rpms
 from leapp.libraries.common.rpms import _parse_config_modification, get_leapp_dep_packages, get_leapp_packages
-from leapp.libraries.common.testutils import CurrentActorMocked
+from leapp.libraries.common.testutils import CurrentActorMocked, logger_mocked
 from leapp.libraries.stdlib import api
 
 
@@ -95,3 +96,80 @@ def test_get_leapp_dep_packages(major_version, component, result, monkeypatch):
         kwargs["component"] = component
 
     assert frozenset(get_leapp_dep_packages(**kwargs)) == frozenset(result)
+
+
+@pytest.mark.parametrize('rpm_output,expected_version', [
+    (['leapp-upgrade-el8toel9 0.23.0-1.el8', 'package leapp-upgrade-el8toel9-fapolicyd is not installed'],
+     '0.23.0-1.el8'),
+    (['package leapp-upgrade-el8toel9 is not installed',
+      'package leapp-upgrade-el8toel9-fapolicyd is not installed'], None),
+])
+def test_get_leapp_repository_version(monkeypatch, rpm_output, expected_version):
+    monkeypatch.setattr(api, 'current_actor', CurrentActorMocked(arch='x86_64', src_ver='8.10', dst_ver='9.6'))
+    monkeypatch.setattr(rpms.stdlib, 'run', lambda *args, **kwargs: {'stdout': rpm_output})
+
+    assert rpms.get_leapp_repository_version() == expected_version
+
+
+def test_get_installed_rpms_cached(monkeypatch, tmpdir):
+    rpm_output = [
+        ('tcpdump|4.9.3|2.fc31|14|Fedora Project|x86_64|'
+         'RSA/SHA256, Wed 22 Jul 2020 12:25:15 PM CEST, Key ID 50cb390b3c3359c4'),
+        'gpg-pubkey|9570ff31|5e3006fb|0|Fedora (33) <fedora-33-primary@fedoraproject.org>||(none)',
+        'broken|entry',
+        '',
+    ]
+    run_calls = []
+    stamp = ['stamp1']
+
+    def mocked_run(cmd, split=False):
+        run_calls.append(cmd)
+        return {'stdout': rpm_output}
+
+    monkeypatch.setattr(rpms, '_INSTALLED_RPMS_CACHE', {})
+    monkeypatch.setattr(rpms.persistentcache, 'PERSISTENT_CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(api, 'current_logger', logger_mocked())
+    monkeypatch.setattr(rpms, 'rpm', None)
+    monkeypatch.setattr(rpms, '_get_rpmdb_stamp', lambda: stamp[0])
+    monkeypatch.setattr(rpms.stdlib, 'run', mocked_run)
+
+    assert rpms.get_installed_rpms() == rpm_output[:2]
+    assert len(run_calls) == 1
+    assert api.current_logger.warnmsg == ['Could not parse rpm: broken|entry, skipping']
+
+    # the RPM DB has not been changed, so the cached data are used
+    items = rpms.get_installed_rpm_items()
+    assert len(run_calls) == 1
+    assert [(pkg.name, pkg.epoch, pkg.arch, pkg.pgpsig) for pkg in items] == [
+        ('tcpdump', '14', 'x86_64', 'RSA/SHA256, Wed 22 Jul 2020 12:25:15 PM CEST, Key ID 50cb390b3c3359c4'),
+        ('gpg-pubkey', '0', '', '(none)'),
+    ]
+
+    # another actor (process) uses the persistent cache
+    monkeypatch.setattr(rpms, '_INSTALLED_RPMS_CACHE', {})
+    assert rpms.get_installed_rpms() == rpm_output[:2]
+    assert len(run_calls) == 1
+
+    # the RPM DB has been changed
+    stamp[0] = 'stamp2'
+    rpm_output.pop(0)
+    assert rpms.get_installed_rpms() == rpm_output[:1]
+    assert len(run_calls) == 2
+
+
+def test_get_rpmdb_stamp(monkeypatch, tmpdir):
+    monkeypatch.setattr(rpms, 'rpm', None)
+    monkeypatch.setattr(rpms, '_RPMDB_DEFAULT_PATH', str(tmpdir))
+    assert rpms._get_rpmdb_stamp() is None
+
+    tmpdir.join('rpmdb.sqlite').write('data')
+    stamp = rpms._get_rpmdb_stamp()
+    assert stamp
+
+    # files modified when the RPM DB is just opened are ignored
+    tmpdir.join('rpmdb.sqlite-shm').write('shm')
+    tmpdir.join('rpmdb.sqlite-wal').write('wal')
+    assert rpms._get_rpmdb_stamp() == stamp
+
+    tmpdir.join('rpmdb.sqlite').write('modified data')
+    assert rpms._get_rpmdb_stamp() != stamp